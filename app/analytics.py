@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .models import AppUser, Car, Owner
+from .sync import current_version
+
+# ==================== SNAPSHOT ====================
+# Фоновая задача analytics_rebuild считает все разделы разом; эндпоинты
+# отдают снимок, пока он моложе ANALYTICS_SNAPSHOT_TTL и версия журнала
+# изменений не сдвинулась (ни одной записи car/owner ни в одном воркере),
+# иначе считают на лету
+
+ANALYTICS_SNAPSHOT_TTL = float(os.getenv("ANALYTICS_SNAPSHOT_TTL", "300"))
+
+_snapshot: dict = {}
+_snapshot_at = 0.0
+_snapshot_version: Optional[int] = None
+_snapshot_lock = threading.Lock()
+
+def cached_section(db: Session, name: str) -> Optional[object]:
+    """Раздел из последнего снимка или None, если снимка нет, он устарел или данные изменились"""
+    with _snapshot_lock:
+        if name not in _snapshot or time.monotonic() - _snapshot_at >= ANALYTICS_SNAPSHOT_TTL:
+            return None
+        section, version = _snapshot[name], _snapshot_version
+    return section if current_version(db) == version else None
+
+def rebuild(db: Session, progress=None) -> dict:
+    """Пересчитать все разделы и сохранить снимок"""
+    global _snapshot, _snapshot_at, _snapshot_version
+    # Версия читается до разделов: снимок не старше ее
+    version = current_version(db)
+    sections = (("overview", overview), ("cars_by_year", cars_by_year), ("owners_stats", owners_stats))
+    snapshot = {}
+    for done, (name, compute) in enumerate(sections, start=1):
+        snapshot[name] = compute(db)
+        if progress:
+            progress(done, len(sections), f"Посчитан раздел {name}")
+    with _snapshot_lock:
+        _snapshot, _snapshot_at, _snapshot_version = snapshot, time.monotonic(), version
+    return snapshot
+
+# ==================== SECTIONS ====================
+
+def overview(db: Session) -> dict:
+    """Общая аналитика системы"""
+    # Подсчитываем статистику
+    total_cars = db.query(Car).count()
+    total_owners = db.query(Owner).count()
+    total_users = db.query(AppUser).count()
+
+    # Средняя цена автомобилей
+    avg_price_result = db.query(func.avg(Car.price)).scalar()
+    avg_price = float(avg_price_result) if avg_price_result else 0
+
+    # Самый дорогой автомобиль
+    most_expensive_car = db.query(Car).order_by(Car.price.desc()).first()
+
+    # Статистика по владельцам
+    owners_with_cars = db.query(Owner).join(Car).distinct().count()
+
+    return {
+        "total_cars": total_cars,
+        "total_owners": total_owners,
+        "total_users": total_users,
+        "average_car_price": round(avg_price, 2),
+        "most_expensive_car": {
+            "brand": most_expensive_car.brand if most_expensive_car else None,
+            "model": most_expensive_car.model if most_expensive_car else None,
+            "price": most_expensive_car.price if most_expensive_car else 0
+        } if most_expensive_car else None,
+        "owners_with_cars": owners_with_cars,
+        "owners_without_cars": total_owners - owners_with_cars
+    }
+
+def cars_by_year(db: Session) -> list:
+    """Статистика автомобилей по годам"""
+    # Группируем автомобили по годам
+    year_stats = db.query(
+        Car.modelYear,
+        func.count(Car.id).label('count'),
+        func.avg(Car.price).label('avg_price')
+    ).group_by(Car.modelYear).order_by(Car.modelYear).all()
+
+    return [
+        {
+            "year": stat.modelYear,
+            "count": stat.count,
+            "average_price": round(float(stat.avg_price), 2) if stat.avg_price else 0
+        }
+        for stat in year_stats
+    ]
+
+def owners_stats(db: Session) -> list:
+    """Статистика владельцев"""
+    # Владельцы с количеством автомобилей
+    owner_stats = db.query(
+        Owner.ownerid,
+        Owner.firstname,
+        Owner.lastname,
+        func.count(Car.id).label('car_count')
+    ).outerjoin(Car).group_by(Owner.ownerid, Owner.firstname, Owner.lastname).all()
+
+    return [
+        {
+            "owner_id": stat.ownerid,
+            "name": f"{stat.firstname} {stat.lastname}",
+            "car_count": stat.car_count
+        }
+        for stat in owner_stats
+    ]
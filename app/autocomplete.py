@@ -0,0 +1,215 @@
+import heapq
+import logging
+import os
+import threading
+from bisect import bisect_left, insort
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, select
+from .db import SessionLocal
+from .models import Car, Owner
+from .sync import current_version
+
+log = logging.getLogger(__name__)
+
+# ==================== CONFIG ====================
+
+# Как часто проверять журнал изменений и перестраивать индекс, если были записи
+# (подхватывает записи других воркеров; 0 - только при старте)
+AUTOCOMPLETE_REFRESH_INTERVAL = float(os.getenv("AUTOCOMPLETE_REFRESH_INTERVAL", "60"))
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+CAR_FIELDS = ("brand", "model", "color")
+FIELDS = CAR_FIELDS + ("owner",)
+
+# Результаты для префиксов до этой длины кэшируются: у них самые длинные диапазоны
+_CACHED_PREFIX_LEN = 2
+_MAX_CHAR = "\U0010ffff"
+_folded_key = itemgetter(0)
+
+# ==================== PREFIX INDEX ====================
+
+class PrefixIndex:
+    """Различные значения одного поля с частотами.
+
+    Отсортированный массив (casefold, значение): все значения с префиксом
+    лежат подряд и находятся двумя bisect. Вставка нового значения - insort
+    (сдвиг массива), изменение частоты существующего - O(1).
+    """
+
+    def __init__(self, counts: Optional[Dict[str, int]] = None):
+        self._counts: Dict[str, int] = {}
+        self._entries: List[Tuple[str, str]] = []
+        self._top: Dict[str, List[Tuple[str, int]]] = {}
+        if counts:
+            self._counts = {value: count for value, count in counts.items() if value and count > 0}
+            self._entries = sorted((value.casefold(), value) for value in self._counts)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, value: Optional[str], n: int = 1) -> None:
+        if not value:
+            return
+        if value in self._counts:
+            self._counts[value] += n
+        else:
+            self._counts[value] = n
+            insort(self._entries, (value.casefold(), value))
+        self._forget(value)
+
+    def remove(self, value: Optional[str], n: int = 1) -> None:
+        count = self._counts.get(value)
+        if count is None:
+            return
+        if count > n:
+            self._counts[value] = count - n
+        else:
+            del self._counts[value]
+            entry = (value.casefold(), value)
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+        self._forget(value)
+
+    def top(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        """До limit значений с префиксом (без учета регистра), частые первыми"""
+        folded = prefix.casefold()
+        if len(folded) > _CACHED_PREFIX_LEN:
+            return self._scan(folded, limit)
+        cached = self._top.get(folded)
+        if cached is None:
+            cached = self._top[folded] = self._scan(folded, AUTOCOMPLETE_MAX_LIMIT)
+        return cached[:limit]
+
+    def _scan(self, folded: str, limit: int) -> List[Tuple[str, int]]:
+        low = bisect_left(self._entries, folded, key=_folded_key)
+        high = bisect_left(self._entries, folded + _MAX_CHAR, key=_folded_key)
+        counts = self._counts
+        # nlargest стабилен: при равной частоте значения идут по алфавиту
+        values = heapq.nlargest(limit, (self._entries[i][1] for i in range(low, high)), key=counts.__getitem__)
+        return [(value, counts[value]) for value in values]
+
+    def _forget(self, value: str) -> None:
+        folded = value.casefold()
+        for length in range(min(len(folded), _CACHED_PREFIX_LEN) + 1):
+            self._top.pop(folded[:length], None)
+
+# ==================== AUTOCOMPLETE INDEX ====================
+
+def _value(row, field: str):
+    # ORM-объект, Row или dict из bulk_create
+    return row.get(field) if isinstance(row, dict) else getattr(row, field, None)
+
+def owner_name(row) -> Optional[str]:
+    name = f"{_value(row, 'firstname') or ''} {_value(row, 'lastname') or ''}".strip()
+    return name or None
+
+class AutocompleteIndex:
+    """Префиксные индексы brand, model, color и имен владельцев в памяти процесса.
+
+    Строится из БД при старте, дальше обновляется методами car_*/owner_*
+    из CarCRUD/OwnerCRUD после COMMIT. Записи других воркеров (и все, что
+    прошло мимо CRUD) подхватывает перестройка раз в AUTOCOMPLETE_REFRESH_INTERVAL.
+    """
+
+    def __init__(self, refresh_interval: float = AUTOCOMPLETE_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._indexes: Dict[str, PrefixIndex] = {field: PrefixIndex() for field in FIELDS}
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def suggest(self, field: str, prefix: str, limit: int = 10) -> List[dict]:
+        with self._lock:
+            items = self._indexes[field].top(prefix, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+        return [{"value": value, "count": count} for value, count in items]
+
+    def sizes(self) -> Dict[str, int]:
+        return {field: len(index) for field, index in self._indexes.items()}
+
+    def rebuild(self) -> None:
+        """Перечитать различные значения и частоты из БД и подменить индексы"""
+        with SessionLocal() as db:
+            version = current_version(db)
+            indexes = {}
+            for field in CAR_FIELDS:
+                column = getattr(Car, field)
+                indexes[field] = PrefixIndex(dict(db.execute(select(column, func.count()).group_by(column)).all()))
+            names = db.execute(
+                select(Owner.firstname, Owner.lastname, func.count()).group_by(Owner.firstname, Owner.lastname)
+            ).all()
+        owners: Dict[str, int] = {}
+        for firstname, lastname, count in names:
+            name = owner_name({"firstname": firstname, "lastname": lastname})
+            if name:
+                owners[name] = owners.get(name, 0) + count
+        indexes["owner"] = PrefixIndex(owners)
+        with self._lock:
+            self._indexes = indexes
+            self._version = version
+        log.debug("Autocomplete index rebuilt: %s", self.sizes())
+
+    # ==================== WRITE PATHS ====================
+
+    def car_added(self, car) -> None:
+        with self._lock:
+            for field in CAR_FIELDS:
+                self._indexes[field].add(_value(car, field))
+
+    def car_removed(self, car, n: int = 1) -> None:
+        with self._lock:
+            for field in CAR_FIELDS:
+                self._indexes[field].remove(_value(car, field), n)
+
+    def car_changed(self, old: dict, car) -> None:
+        with self._lock:
+            for field in CAR_FIELDS:
+                if old.get(field) != _value(car, field):
+                    self._indexes[field].remove(old.get(field))
+                    self._indexes[field].add(_value(car, field))
+
+    def owner_added(self, owner) -> None:
+        with self._lock:
+            self._indexes["owner"].add(owner_name(owner))
+
+    def owner_removed(self, owner) -> None:
+        with self._lock:
+            self._indexes["owner"].remove(owner_name(owner))
+
+    def owner_changed(self, old: dict, owner) -> None:
+        if owner_name(old) != owner_name(owner):
+            with self._lock:
+                self._indexes["owner"].remove(owner_name(old))
+                self._indexes["owner"].add(owner_name(owner))
+
+    # ==================== REFRESHER ====================
+
+    def start(self) -> None:
+        try:
+            self.rebuild()
+        except Exception as e:
+            log.error("Could not build autocomplete index: %s", e)
+        if self.refresh_interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="autocomplete-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                with SessionLocal() as db:
+                    version = current_version(db)
+                if version != self._version:
+                    self.rebuild()
+            except Exception as e:
+                log.warning("Autocomplete refresh failed: %s", e)
+
+autocomplete_index = AutocompleteIndex()
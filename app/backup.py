@@ -0,0 +1,329 @@
+import gzip
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+from sqlalchemy import Column, MetaData, Table, delete, func, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from core.migrations import backfill_registration_keys
+from .autocomplete import autocomplete_index
+from .distributions import price_distributions
+from .pivot import pivot_engine
+from .change_feed import broadcast_reset
+from .crud import invalidate_facets
+from .models import AppUser, Car, Owner
+from .pagination import invalidate_counts
+from .sync import mark_reset
+
+# Без zstandard архив пишется в gzip (медленнее и крупнее, но без зависимостей)
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+# ==================== CONFIG ====================
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+# Строк в одном файле-чанке; столько же строк держит в памяти server-side cursor
+BACKUP_CHUNK_SIZE = int(os.getenv("BACKUP_CHUNK_SIZE", "50000"))
+BACKUP_ZSTD_LEVEL = int(os.getenv("BACKUP_ZSTD_LEVEL", "3"))
+# Параллельных загрузчиков чанков одной таблицы при восстановлении
+RESTORE_WORKERS = int(os.getenv("RESTORE_WORKERS", "4"))
+
+# Порядок важен: родительские таблицы раньше дочерних (внешние ключи)
+BACKUP_TABLES: List[Table] = [AppUser.__table__, Owner.__table__, Car.__table__]
+
+MANIFEST = "manifest.json"
+# Префикс промежуточных таблиц восстановления
+STAGING_PREFIX = "restore_"
+FORMAT_VERSION = 1
+
+# ==================== HELPERS ====================
+
+def _codec() -> str:
+    return "zst" if zstandard is not None else "gz"
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return zstandard.ZstdCompressor(level=BACKUP_ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        if zstandard is None:
+            raise RuntimeError("Для восстановления .zst архива нужен пакет zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковый RSS процесса (МБ) или None, если недоступно"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux - килобайты, macOS - байты
+    return round(peak / 1024 / (1024 if os.uname().sysname == "Darwin" else 1), 1)
+
+def new_backup_id() -> str:
+    """Имя архива: известно до запуска задачи бэкапа"""
+    return f"backup_{datetime.utcnow():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}"
+
+def backup_path(backup_id: str) -> str:
+    if not backup_id or os.sep in backup_id or backup_id.startswith("."):
+        raise ValueError("Некорректный backup_id")
+    return os.path.join(BACKUP_DIR, backup_id)
+
+def list_backups() -> List[dict]:
+    """Манифесты архивов из BACKUP_DIR, новые первыми"""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    manifests = []
+    for name in os.listdir(BACKUP_DIR):
+        path = os.path.join(BACKUP_DIR, name, MANIFEST)
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                manifests.append(json.load(f))
+    return sorted(manifests, key=lambda m: m["created_at"], reverse=True)
+
+def _snapshot_connection(engine: Engine) -> Connection:
+    """Соединение, в котором все таблицы читаются из одного снимка"""
+    conn = engine.connect()
+    if engine.dialect.name == "postgresql":
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        conn.begin()
+        conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+    elif engine.dialect.name == "mysql":
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        conn.begin()
+    else:
+        conn.begin()
+    return conn
+
+def _iter_chunks(conn: Connection, table: Table, chunk_size: int) -> Iterator[list]:
+    """Строки таблицы чанками через server-side cursor (yield_per)"""
+    stmt = select(table).order_by(*table.primary_key.columns).execution_options(yield_per=chunk_size)
+    for partition in conn.execute(stmt).partitions():
+        yield partition
+
+# ==================== BACKUP ====================
+
+def create_backup(
+    engine: Engine, chunk_size: int = BACKUP_CHUNK_SIZE, progress: Optional[Callable] = None,
+    backup_id: Optional[str] = None,
+) -> dict:
+    """Потоковый бэкап в BACKUP_DIR/<backup_id>/: манифест + NDJSON-чанки (zstd/gzip).
+
+    Все таблицы читаются в одной транзакции (REPEATABLE READ на PostgreSQL/MySQL),
+    в памяти одновременно не больше одного чанка.
+    """
+    backup_id = backup_id or new_backup_id()
+    directory = backup_path(backup_id)
+    os.makedirs(directory)
+    codec = _codec()
+    started = time.perf_counter()
+
+    conn = _snapshot_connection(engine)
+    try:
+        # Оценка объема для прогресса
+        totals = {t.name: conn.execute(select(func.count()).select_from(t)).scalar_one() for t in BACKUP_TABLES}
+        grand_total = sum(totals.values()) or 1
+        done = 0
+        tables = []
+        for table in BACKUP_TABLES:
+            columns = [c.name for c in table.columns]
+            chunks = []
+            rows = 0
+            for number, partition in enumerate(_iter_chunks(conn, table, chunk_size), start=1):
+                lines = "".join(json.dumps(list(row), default=str, ensure_ascii=False) + "\n" for row in partition)
+                filename = f"{table.name}-{number:05d}.ndjson.{codec}"
+                payload = _compress(lines.encode("utf-8"), codec)
+                with open(os.path.join(directory, filename), "wb") as f:
+                    f.write(payload)
+                chunks.append({"file": filename, "rows": len(partition), "bytes": len(payload)})
+                rows += len(partition)
+                done += len(partition)
+                if progress:
+                    progress(done, grand_total, f"{table.name}: {rows}/{totals[table.name]}")
+            tables.append({"name": table.name, "columns": columns, "rows": rows, "chunks": chunks})
+    finally:
+        conn.rollback()
+        conn.close()
+
+    seconds = time.perf_counter() - started
+    total_rows = sum(t["rows"] for t in tables)
+    manifest = {
+        "backup_id": backup_id,
+        "format_version": FORMAT_VERSION,
+        "codec": codec,
+        "dialect": engine.dialect.name,
+        "created_at": datetime.utcnow().isoformat(),
+        "tables": tables,
+        "rows": total_rows,
+        "bytes": sum(c["bytes"] for t in tables for c in t["chunks"]),
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(total_rows / seconds) if seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    # Манифест пишется последним: архив без него считается незавершенным
+    with open(os.path.join(directory, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+# ==================== RESTORE ====================
+
+def _load_rows(conn: Connection, table: Table, columns: List[str], rows: List[list]) -> None:
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg":
+        # COPY FROM STDIN - самый быстрый путь загрузки в PostgreSQL
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        with conn.connection.cursor() as cursor:
+            with cursor.copy(f'COPY "{table.name}" ({column_list}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+        return
+    conn.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+
+def _restore_chunk(engine: Engine, directory: str, codec: str, table: Table, columns: List[str], chunk: dict) -> int:
+    with open(os.path.join(directory, chunk["file"]), "rb") as f:
+        data = _decompress(f.read(), codec)
+    rows = [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+    with engine.begin() as conn:
+        _load_rows(conn, table, columns, rows)
+    return len(rows)
+
+def _staging_tables(engine: Engine) -> Dict[str, Table]:
+    """Пустые промежуточные таблицы с колонками рабочих, без ключей, индексов и внешних ключей"""
+    metadata = MetaData()
+    staging = {
+        table.name: Table(f"{STAGING_PREFIX}{table.name}", metadata, *(Column(c.name, c.type) for c in table.columns))
+        for table in BACKUP_TABLES
+    }
+    # Остатки прерванного восстановления
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    return staging
+
+def _swap_in(conn: Connection, staging: Dict[str, Table]) -> None:
+    """Заменить содержимое рабочих таблиц промежуточными (в транзакции conn)"""
+    # Дочерние таблицы очищаются первыми, заполняются - последними
+    for table in reversed(BACKUP_TABLES):
+        conn.execute(delete(table))
+    for table in BACKUP_TABLES:
+        columns = [c.name for c in table.columns]
+        conn.execute(insert(table).from_select(columns, select(*(staging[table.name].c[c] for c in columns))))
+    _reset_sequences(conn)
+
+def _reset_sequences(conn: Connection) -> None:
+    """После загрузки явных id сдвинуть последовательности (PostgreSQL)"""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in BACKUP_TABLES:
+        pk = list(table.primary_key.columns)[0].name
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', '{pk}'), "
+            f"COALESCE((SELECT MAX(\"{pk}\") FROM \"{table.name}\"), 0) + 1, false)"
+        ))
+
+def restore_backup(
+    engine: Engine, backup_id: str, workers: int = RESTORE_WORKERS, progress: Optional[Callable] = None
+) -> dict:
+    """Восстановить архив: загрузить чанки в промежуточные таблицы и одной транзакцией заменить рабочие.
+
+    Чанки грузятся в промежуточные таблицы (STAGING_PREFIX) в пуле из
+    workers потоков, каждый - отдельной транзакцией; на SQLite запись
+    однопоточная, поэтому workers принудительно = 1. Рабочие таблицы
+    меняются одной транзакцией, только если все таблицы загружены
+    полностью: при любой ошибке база остается прежней, а текст ошибки
+    задачи перечисляет недогруженные таблицы.
+    """
+    directory = backup_path(backup_id)
+    manifest_path = os.path.join(directory, MANIFEST)
+    if not os.path.isfile(manifest_path):
+        raise FileNotFoundError(f"Архив {backup_id} не найден или не завершен")
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия архива: {manifest.get('format_version')}")
+    if engine.dialect.name == "sqlite":
+        workers = 1
+
+    by_name = {t["name"]: t for t in manifest["tables"]}
+    started = time.perf_counter()
+    staging = _staging_tables(engine)
+
+    restored: Dict[str, int] = {name: 0 for name in by_name}
+    lock = threading.Lock()
+    grand_total = manifest["rows"] or 1
+    done = 0
+
+    def load(table: Table, columns: List[str], chunk: dict) -> None:
+        nonlocal done
+        count = _restore_chunk(engine, directory, manifest["codec"], staging[table.name], columns, chunk)
+        with lock:
+            restored[table.name] += count
+            done += count
+            current = done
+        if progress:
+            progress(current, grand_total, f"Загружено {current}/{manifest['rows']} строк")
+
+    def incomplete() -> List[str]:
+        return [
+            f"{name} ({restored.get(name, 0)}/{table['rows']})"
+            for name, table in by_name.items() if restored.get(name, 0) != table["rows"]
+        ]
+
+    try:
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="restore") as pool:
+                futures = [
+                    pool.submit(load, table, by_name[table.name]["columns"], chunk)
+                    for table in BACKUP_TABLES if table.name in by_name
+                    for chunk in by_name[table.name]["chunks"]
+                ]
+                for future in futures:
+                    future.result()
+        except Exception as e:
+            raise RuntimeError(
+                f"Восстановление прервано, база не изменена; не загружены полностью: {', '.join(incomplete())}: {e}"
+            ) from e
+        if incomplete():
+            raise RuntimeError(f"Архив не совпадает с манифестом, база не изменена: {', '.join(incomplete())}")
+        if progress:
+            progress(grand_total, grand_total, "Замена таблиц")
+        with engine.begin() as conn:
+            _swap_in(conn, staging)
+    finally:
+        staging[BACKUP_TABLES[0].name].metadata.drop_all(engine)
+
+    # В бэкапах, сделанных до появления car.registration_key, колонки нет
+    backfill_registration_keys(engine)
+    invalidate_counts(*(t.name for t in BACKUP_TABLES))
+    invalidate_facets()
+    autocomplete_index.rebuild()
+    price_distributions.rebuild()
+    pivot_engine.rebuild()
+    broadcast_reset()
+    # Журнал изменений не описывает восстановленные данные - клиенты синхронизации перечитывают все
+    with Session(engine) as db:
+        mark_reset(db)
+        db.commit()
+
+    seconds = time.perf_counter() - started
+    total_rows = sum(restored.values())
+    return {
+        "backup_id": backup_id,
+        "tables": restored,
+        "rows": total_rows,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(total_rows / seconds) if seconds else None,
+        "workers": workers,
+        "peak_rss_mb": peak_rss_mb(),
+    }
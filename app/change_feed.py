@@ -0,0 +1,10 @@
+# Лента изменений общая для app и auth_app и живет в core
+from core.change_feed import (
+    CHANGE_FEED_BUFFER, CHANGE_FEED_CHANNEL, CHANGE_FEED_HEARTBEAT, ENTITIES, ENTITY_FIELDS, RESET,
+    ChangeFeed, ChangeFeedListener, broadcast_reset, feed, listener, record_change,
+)
+
+__all__ = [
+    "CHANGE_FEED_BUFFER", "CHANGE_FEED_CHANNEL", "CHANGE_FEED_HEARTBEAT", "ENTITIES", "ENTITY_FIELDS", "RESET",
+    "ChangeFeed", "ChangeFeedListener", "broadcast_reset", "feed", "listener", "record_change",
+]
@@ -0,0 +1,149 @@
+import asyncio
+import functools
+import inspect
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import anyio
+from fastapi import Request, params
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from core.replicas import ReplicaSession, wants_primary
+
+# ==================== CONFIG ====================
+
+# Сколько секунд после вычисления результат отдается повторным запросам (0 - только общее вычисление)
+COALESCE_TTL = float(os.getenv("COALESCE_TTL", "1"))
+# Предел числа ключей с сохраненным результатом
+COALESCE_MAX_KEYS = int(os.getenv("COALESCE_MAX_KEYS", "1000"))
+
+# ==================== SINGLE FLIGHT ====================
+
+class SingleFlight:
+    """Одно вычисление на ключ: одновременные вызовы с тем же ключом ждут
+    результат первого ("лидера"), а он еще ttl секунд отдается без вычисления.
+
+    Работает в event loop воркера (без блокировок): ожидающие не занимают
+    потоки пула. Лидер вычисляет в своем запросе (его сессия БД и контекст
+    логов); если его отменят, вычисление начнет один из ожидающих.
+    Ошибки общие для ожидающих, но не кэшируются.
+    """
+
+    def __init__(self, ttl: float = COALESCE_TTL, max_keys: int = COALESCE_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}
+        self.stats = {"calls": 0, "computed": 0, "joined": 0, "cached": 0}
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        self.stats["calls"] += 1
+        while True:
+            cached = self._results.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self.stats["cached"] += 1
+                    return cached[1]
+                del self._results[key]
+            shared = self._inflight.get(key)
+            if shared is None:
+                break
+            self.stats["joined"] += 1
+            try:
+                # shield: отмена ожидающего (клиент ушел) не трогает общий результат
+                return await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                if not shared.cancelled():
+                    raise
+                # Отменен лидер - пробуем сами
+
+        self.stats["computed"] += 1
+        shared = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            shared.cancel()
+            raise
+        except BaseException as e:
+            shared.set_exception(e)
+            # Без ожидающих asyncio иначе залогирует "exception was never retrieved"
+            shared.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        shared.set_result(result)
+        self._store(key, result, self.ttl if ttl is None else ttl)
+        return result
+
+    def _store(self, key: Hashable, result: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        now = time.monotonic()
+        if len(self._results) >= self.max_keys:
+            self._results = {k: v for k, v in self._results.items() if v[0] > now}
+            if len(self._results) >= self.max_keys:
+                self._results.pop(next(iter(self._results)))
+        self._results[key] = (now + ttl, result)
+
+    def clear(self) -> None:
+        self._results.clear()
+
+flights = SingleFlight()
+
+# ==================== DECORATOR ====================
+
+_REQUEST_PARAM = "coalesce_request"
+
+def _key_part(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Session):
+        # Чтения с реплики и с primary не смешиваются; get_bind() не зовем -
+        # у ReplicaSession он занимает соединение
+        return "db:replica" if isinstance(value, ReplicaSession) else "db:primary"
+    return value
+
+def coalesce(ttl: Optional[float] = None):
+    """Декоратор эндпоинта: одинаковые одновременные запросы выполняют обработчик один раз.
+
+    Ключ - имя обработчика и параметры запроса (path/query/body). Зависимости
+    (Depends) в ключ не входят - проверки доступа выполняются для каждого
+    запроса, - кроме сессии БД: учитывается, реплика это или primary.
+    Результат общий для всех ожидающих, поэтому подходит для обработчиков,
+    чей ответ не зависит от пользователя и не изменяется после возврата.
+    Клиент, который недавно писал (read-your-writes, wants_primary), получает
+    собственное выполнение - не общий и не сохраненный результат.
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        dependencies = {
+            name for name, parameter in signature.parameters.items()
+            if isinstance(parameter.default, params.Depends)
+        }
+        is_async = inspect.iscoroutinefunction(func)
+
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            request = kwargs.pop(_REQUEST_PARAM)
+            if is_async:
+                compute = functools.partial(func, **kwargs)
+            else:
+                # sync-обработчик, как и без декоратора, выполняется в пуле потоков
+                compute = functools.partial(anyio.to_thread.run_sync, functools.partial(func, **kwargs))
+            if wants_primary(request):
+                return await compute()
+            key_params = {
+                name: _key_part(value) for name, value in kwargs.items()
+                if name not in dependencies or isinstance(value, Session)
+            }
+            key = (func.__module__, func.__qualname__, json.dumps(key_params, sort_keys=True, default=str))
+            return await flights.do(key, compute, ttl)
+
+        # FastAPI передает обертке Request дополнительным параметром - для проверки read-your-writes
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter(_REQUEST_PARAM, inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+        ])
+        return wrapper
+    return decorator
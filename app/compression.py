@@ -0,0 +1,186 @@
+import os
+import zlib
+from typing import List, Optional, Tuple
+import anyio
+
+# Опциональные кодеки: без пакета соответствующий Content-Encoding просто не предлагается
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Ответы меньше порога не сжимаются (заголовки и CPU дороже выигрыша)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+# ==================== CODECS ====================
+
+class _Compressor:
+    """Единый интерфейс compress()/flush() для потокового сжатия"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._obj.process(data)
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    """Сжать тело ответа целиком"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return zlib.compress(body, GZIP_LEVEL, wbits=31)
+
+def available_encodings() -> List[str]:
+    """Поддерживаемые Content-Encoding в порядке предпочтения сервера"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+def choose_encoding(accept_encoding: str, supported: Optional[List[str]] = None) -> Optional[str]:
+    """Выбрать кодек по Accept-Encoding с учетом q-значений"""
+    supported = supported or available_encodings()
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+    best: Optional[Tuple[float, int, str]] = None
+    for rank, encoding in enumerate(supported):
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q <= 0:
+            continue
+        candidate = (q, -rank, encoding)
+        if best is None or candidate > best:
+            best = candidate
+    return best[2] if best else None
+
+# ==================== ASGI MIDDLEWARE ====================
+
+class CompressionMiddleware:
+    """Сжатие ответов gzip/br/zstd по Accept-Encoding.
+
+    Буферизованные ответы сжимаются целиком, если больше COMPRESSION_MIN_SIZE;
+    потоковые (StreamingResponse) - по чанкам. Сжатие выполняется в пуле
+    потоков, чтобы не блокировать event loop.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressingResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+class _CompressingResponder:
+    def __init__(self, app, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    def _headers(self, drop=(b"content-length",)) -> list:
+        return [(k, v) for k, v in self.start_message["headers"] if k.lower() not in drop]
+
+    async def send_wrapper(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = {k.lower(): v for k, v in message.get("headers", [])}
+            # Уже сжатые ответы, ответы без тела и SSE (компрессор копил бы события) не трогаем
+            self.passthrough = (
+                b"content-encoding" in headers
+                or message["status"] in (204, 304)
+                or headers.get(b"content-type", b"").startswith(b"text/event-stream")
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None and not more_body:
+            # Обычный ответ одним куском
+            if len(body) < self.minimum_size:
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            compressed = await anyio.to_thread.run_sync(compress_body, body, self.encoding)
+            headers = self._headers() + [
+                (b"content-encoding", self.encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await self.send({**self.start_message, "headers": headers})
+            await self.send({"type": "http.response.body", "body": compressed})
+            return
+
+        # Потоковый ответ: сжимаем по мере поступления чанков
+        if self.compressor is None:
+            self.compressor = _Compressor(self.encoding)
+            headers = self._headers() + [
+                (b"content-encoding", self.encoding.encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await self.send({**self.start_message, "headers": headers})
+        data = await anyio.to_thread.run_sync(self.compressor.compress, body) if body else b""
+        if not more_body:
+            data += self.compressor.flush()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -1,26 +1,209 @@
+import os
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, desc, asc
-from typing import List, Optional
-from .models import Car, Owner
-from .schemas import CarCreate, CarUpdate, OwnerCreate, OwnerUpdate, CarQuery, OwnerQuery
+from sqlalchemy import (
+    and_, or_, desc, asc, bindparam, cast, delete, func, insert, literal_column, select, tuple_, union_all,
+    Select, String,
+)
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from core import cars as car_writes
+from .autocomplete import autocomplete_index
+from .change_feed import record_change
+from .distributions import price_distributions
+from .models import Car, Owner, normalize_plate
+from .pagination import filtered_total, invalidate_counts, table_total
+from .read_models import CarRow, select_car_fields, select_car_rows, select_owner_fields, to_car_rows
+from .sync import track_change, track_deleted_where
+from .schemas import CarCreate, CarUpdate, OwnerCreate, OwnerUpdate, CarQuery, OwnerQuery, CAR_SORT_FIELDS
+
+# ==================== STATEMENT CACHE ====================
+
+# Условия поиска с именованными bind-параметрами: значения передаются при
+# выполнении, поэтому текст SQL одинаков для одного набора фильтров
+_SEARCH_CAR_FILTERS = {
+    "brand": lambda: Car.brand.ilike(bindparam("brand")),
+    "color": lambda: Car.color.ilike(bindparam("color")),
+    "modelYear": lambda: Car.modelYear == bindparam("modelYear"),
+    "minPrice": lambda: Car.price >= bindparam("minPrice"),
+    "maxPrice": lambda: Car.price <= bindparam("maxPrice"),
+    "owner_id": lambda: Car.owner_id == bindparam("owner_id"),
+}
+
+def search_cars_params(query: CarQuery) -> dict:
+    """Значения bind-параметров для заданных фильтров CarQuery"""
+    # Фильтры применяются только для "истинных" значений (как и раньше)
+    return {
+        name: value
+        for name, value in (
+            ("brand", f"%{query.brand}%" if query.brand else None),
+            ("color", f"%{query.color}%" if query.color else None),
+            ("modelYear", query.modelYear or None),
+            ("minPrice", query.minPrice or None),
+            ("maxPrice", query.maxPrice or None),
+            ("owner_id", query.owner_id or None),
+        )
+        if value is not None
+    }
+
+def car_select(fields: Optional[tuple] = None) -> Select:
+    """SELECT всех колонок CarRow или только полей из ?fields="""
+    return select_car_rows() if fields is None else select_car_fields(fields)
+
+def car_results(result, fields: Optional[tuple] = None) -> list:
+    """CarRow для полного набора полей, иначе строки Row с атрибутами-полями"""
+    return to_car_rows(result) if fields is None else result.all()
+
+@lru_cache(maxsize=None)
+def search_cars_filtered(filters: tuple, fields: Optional[tuple] = None) -> Select:
+    """SELECT CarRow с условиями для набора фильтров (без сортировки и пагинации)"""
+    stmt = car_select(fields)
+    for name in filters:
+        stmt = stmt.where(_SEARCH_CAR_FILTERS[name]())
+    return stmt
+
+@lru_cache(maxsize=None)
+def search_cars_statement(filters: tuple, sort_by: str, descending: bool, fields: Optional[tuple] = None) -> Select:
+    """Готовый SELECT для набора фильтров и сортировки.
+
+    Ключ кэша ограничен (2^6 наборов фильтров x колонки из CAR_SORT_FIELDS x 2
+    x наборы полей в каноническом порядке из parse_fields),
+    один и тот же объект statement попадает в compiled cache SQLAlchemy, а
+    одинаковый текст SQL позволяет psycopg готовить его на сервере
+    (см. DB_PREPARE_THRESHOLD в core/db.py).
+    """
+    if sort_by not in CAR_SORT_FIELDS:
+        raise ValueError(f"Недопустимая колонка сортировки: {sort_by}")
+    stmt = search_cars_filtered(filters, fields)
+    sort_column = getattr(Car, sort_by)
+    stmt = stmt.order_by(desc(sort_column) if descending else asc(sort_column))
+    return stmt.offset(bindparam("offset")).limit(bindparam("limit"))
+
+# ==================== FACETS ====================
+
+# Ширина ценового диапазона в фасете price
+FACET_PRICE_BUCKET = int(os.getenv("FACET_PRICE_BUCKET", "10000"))
+# Сколько секунд живет результат /cars/facets для набора фильтров (0 - без кэша)
+FACETS_CACHE_TTL = float(os.getenv("FACETS_CACHE_TTL", "30"))
+FACETS_CACHE_SIZE = 1000
+
+FACET_NAMES = ("brand", "color", "modelYear", "price")
+# Номеров в одном IN при пакетном поиске (лимит параметров: SQLite 32766, PostgreSQL 65535)
+PLATE_LOOKUP_CHUNK = 5000
+# GROUPING(brand, color, modelYear, price): бит 1 - колонка свернута, старший бит - brand
+_FACET_MASKS = {0b1111 ^ (1 << (3 - position)): name for position, name in enumerate(FACET_NAMES)}
+
+_facet_cache: dict = {}
+_facet_lock = threading.Lock()
+
+def invalidate_facets() -> None:
+    """Сбросить закэшированные фасеты после записи в car"""
+    with _facet_lock:
+        _facet_cache.clear()
+
+def _facet_columns() -> tuple:
+    # Нижняя граница ценового диапазона: одинаково считается во всех СУБД (цена >= 0)
+    bucket = (Car.price - Car.price % literal_column(str(FACET_PRICE_BUCKET))).label("price")
+    return Car.brand, Car.color, Car.modelYear, bucket
+
+@lru_cache(maxsize=None)
+def car_facets_statement(filters: tuple, dialect: str) -> Select:
+    """Все фасеты одним запросом.
+
+    PostgreSQL - GROUPING SETS за один проход, строки (mask, brand, color,
+    modelYear, price, count). Остальные СУБД - UNION ALL группировок над CTE
+    отфильтрованных строк (facet, value, count); facet=NULL - итог.
+    """
+    columns = _facet_columns()
+    conditions = [_SEARCH_CAR_FILTERS[name]() for name in filters]
+    if dialect == "postgresql":
+        return (
+            select(func.grouping(*columns).label("mask"), *columns, func.count().label("count"))
+            .where(*conditions)
+            .group_by(func.grouping_sets(*[tuple_(column) for column in columns], tuple_()))
+        )
+    filtered = select(*columns).where(*conditions).cte("filtered")
+    branches = [
+        select(literal_column("NULL").label("facet"), literal_column("NULL").label("value"), func.count().label("count"))
+        .select_from(filtered)
+    ]
+    for name in FACET_NAMES:
+        column = filtered.c[name]
+        branches.append(
+            select(literal_column(f"'{name}'").label("facet"), cast(column, String).label("value"),
+                   func.count().label("count"))
+            .group_by(column)
+        )
+    return union_all(*branches)
+
+def _nulls_last(item: tuple) -> tuple:
+    return item[0] is None, item[0] or 0
+
+def _facet_counts(counts: dict) -> List[dict]:
+    """Значения фасета по убыванию числа автомобилей"""
+    return [{"value": value, "count": count}
+            for value, count in sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))]
 
 # ==================== CAR CRUD OPERATIONS ====================
 
+@car_writes.on_car_write
+def _car_written(old: Optional[dict], new: Optional[Car]) -> None:
+    """После записи автомобиля (здесь или в auth_app этого процесса): кэши и индексы в памяти"""
+    if old is None or new is None:
+        invalidate_counts(Car.__tablename__)
+    invalidate_facets()
+    if old is None:
+        autocomplete_index.car_added(new)
+        price_distributions.car_added(new)
+    elif new is None:
+        autocomplete_index.car_removed(old)
+        price_distributions.car_removed(old)
+    else:
+        autocomplete_index.car_changed(old, new)
+        price_distributions.car_changed(old, new)
+
 class CarCRUD:
     @staticmethod
     def create(db: Session, car: CarCreate) -> Car:
-        """Создать новый автомобиль"""
-        # Проверяем, что владелец существует
-        from .models import Owner
-        owner = db.query(Owner).filter(Owner.ownerid == car.owner_id).first()
-        if not owner:
-            raise ValueError(f"Владелец с ID {car.owner_id} не найден")
-        
-        db_car = Car(**car.model_dump())
-        db.add(db_car)
-        db.commit()
-        db.refresh(db_car)
-        return db_car
+        """Создать новый автомобиль (проверки и журнал - core/cars.py, общий путь с auth_app)"""
+        return car_writes.create_car(db, car.model_dump())
+
+    @staticmethod
+    def bulk_create(
+        db: Session, cars: List[dict], batch_size: int = 1000, progress: Optional[Callable] = None
+    ) -> int:
+        """Массовая вставка автомобилей пачками (executemany без ORM-объектов)"""
+        owner_ids = {car["owner_id"] for car in cars}
+        existing = set(db.execute(select(Owner.ownerid).where(Owner.ownerid.in_(owner_ids))).scalars())
+        missing = owner_ids - existing
+        if missing:
+            raise ValueError(f"Владельцы не найдены: {', '.join(map(str, sorted(missing)))}")
+        # insert() идет мимо ORM-валидатора - нормализованный номер считаем здесь
+        cars = [{**car, "registration_key": normalize_plate(car.get("registrationNumber"))} for car in cars]
+        keys = Counter(car["registration_key"] for car in cars if car["registration_key"])
+        duplicates = {key for key, count in keys.items() if count > 1}
+        duplicates |= set(CarCRUD.find_by_registrations(db, keys))
+        if duplicates:
+            raise ValueError(f"Номера уже заняты или повторяются: {', '.join(sorted(duplicates)[:20])}")
+        inserted = 0
+        for start in range(0, len(cars), batch_size):
+            batch = cars[start:start + batch_size]
+            ids = db.execute(insert(Car).returning(Car.id), batch).scalars().all()
+            # В ленту - одно событие на пачку, в журнал синхронизации - каждый автомобиль
+            record_change(db, "car", "imported", {"count": len(batch)})
+            track_change(db, "car", ids)
+            db.commit()
+            for car in batch:
+                autocomplete_index.car_added(car)
+                price_distributions.car_added(car)
+            inserted += len(batch)
+            if progress:
+                progress(inserted, len(cars), f"Импортировано {inserted}/{len(cars)}")
+        invalidate_counts(Car.__tablename__)
+        invalidate_facets()
+        return inserted
 
     @staticmethod
     def get_by_id(db: Session, car_id: int) -> Optional[Car]:
@@ -28,121 +211,186 @@ class CarCRUD:
         return db.query(Car).options(joinedload(Car.owner)).filter(Car.id == car_id).first()
 
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[Car]:
-        """Получить все автомобили с пагинацией"""
-        return db.query(Car).options(joinedload(Car.owner)).offset(skip).limit(limit).all()
+    def get_all(
+        db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, fields: Optional[tuple] = None
+    ) -> List[CarRow]:
+        """Получить все автомобили с пагинацией (after_id - keyset-курсор, fields - только эти поля)"""
+        stmt = car_select(fields).order_by(Car.id)
+        if after_id is not None:
+            stmt = stmt.where(Car.id > after_id)
+        return car_results(db.execute(stmt.offset(skip).limit(limit)), fields)
+
+    check_owner_limit = staticmethod(car_writes.check_owner_limit)
+    check_registration_free = staticmethod(car_writes.check_registration_free)
+
+    @staticmethod
+    def get_by_registration(db: Session, plate: str) -> Optional[CarRow]:
+        """Автомобиль по номеру: регистр, пробелы и дефисы не важны (уникальный индекс)"""
+        key = normalize_plate(plate)
+        if key is None:
+            return None
+        rows = to_car_rows(db.execute(select_car_rows().where(Car.registration_key == key)))
+        return rows[0] if rows else None
+
+    @staticmethod
+    def find_by_registrations(db: Session, plates: Iterable[str]) -> Dict[str, CarRow]:
+        """Автомобили по списку номеров: {нормализованный номер: CarRow}.
+
+        Один SELECT ... WHERE registration_key IN (...) на каждые PLATE_LOOKUP_CHUNK номеров.
+        """
+        keys = sorted({key for key in map(normalize_plate, plates) if key})
+        found: Dict[str, CarRow] = {}
+        stmt = select_car_rows().add_columns(Car.registration_key).where(
+            Car.registration_key.in_(bindparam("keys", expanding=True))
+        )
+        for start in range(0, len(keys), PLATE_LOOKUP_CHUNK):
+            for row in db.execute(stmt, {"keys": keys[start:start + PLATE_LOOKUP_CHUNK]}):
+                found[row[-1]] = CarRow(*row[:-1])
+        return found
 
     @staticmethod
     def update(db: Session, car_id: int, car_update: CarUpdate) -> Optional[Car]:
         """Обновить автомобиль"""
-        db_car = db.query(Car).filter(Car.id == car_id).first()
-        if db_car:
-            update_data = car_update.model_dump(exclude_unset=True)
-            for field, value in update_data.items():
-                setattr(db_car, field, value)
-            db.commit()
-            db.refresh(db_car)
-        return db_car
+        return car_writes.update_car(db, car_id, car_update.model_dump(exclude_unset=True))
 
     @staticmethod
     def delete(db: Session, car_id: int) -> bool:
         """Удалить автомобиль"""
-        db_car = db.query(Car).filter(Car.id == car_id).first()
-        if db_car:
-            db.delete(db_car)
-            db.commit()
-            return True
-        return False
+        return car_writes.delete_car(db, car_id)
 
     # ==================== ADVANCED QUERIES ====================
 
     @staticmethod
-    def find_by_brand(db: Session, brand: str) -> List[Car]:
+    def find_by_brand(db: Session, brand: str) -> List[CarRow]:
         """Найти автомобили по марке"""
-        return db.query(Car).options(joinedload(Car.owner)).filter(
+        return to_car_rows(db.execute(select_car_rows().where(
             Car.brand.ilike(f"%{brand}%")
-        ).all()
+        )))
 
     @staticmethod
-    def find_by_color(db: Session, color: str) -> List[Car]:
+    def find_by_color(db: Session, color: str) -> List[CarRow]:
         """Найти автомобили по цвету"""
-        return db.query(Car).options(joinedload(Car.owner)).filter(
+        return to_car_rows(db.execute(select_car_rows().where(
             Car.color.ilike(f"%{color}%")
-        ).all()
+        )))
 
     @staticmethod
-    def find_by_model_year(db: Session, year: int) -> List[Car]:
+    def find_by_model_year(db: Session, year: int) -> List[CarRow]:
         """Найти автомобили по году выпуска"""
-        return db.query(Car).options(joinedload(Car.owner)).filter(
+        return to_car_rows(db.execute(select_car_rows().where(
             Car.modelYear == year
-        ).all()
+        )))
 
     @staticmethod
-    def find_by_price_range(db: Session, min_price: int, max_price: int) -> List[Car]:
+    def find_by_price_range(db: Session, min_price: int, max_price: int) -> List[CarRow]:
         """Найти автомобили в диапазоне цен"""
-        return db.query(Car).options(joinedload(Car.owner)).filter(
+        return to_car_rows(db.execute(select_car_rows().where(
             and_(Car.price >= min_price, Car.price <= max_price)
-        ).all()
+        )))
 
     @staticmethod
-    def find_by_owner(db: Session, owner_id: int) -> List[Car]:
+    def find_by_owner(db: Session, owner_id: int) -> List[CarRow]:
         """Найти автомобили по владельцу"""
-        return db.query(Car).options(joinedload(Car.owner)).filter(
+        return to_car_rows(db.execute(select_car_rows().where(
             Car.owner_id == owner_id
-        ).all()
+        )))
 
     @staticmethod
-    def search_cars(db: Session, query: CarQuery) -> List[Car]:
+    def search_cars(db: Session, query: CarQuery, fields: Optional[tuple] = None) -> List[CarRow]:
         """Продвинутый поиск автомобилей с фильтрацией и сортировкой"""
-        q = db.query(Car).options(joinedload(Car.owner))
+        params = search_cars_params(query)
+        stmt = search_cars_statement(tuple(params), query.sort_by, query.sort_order == "desc", fields)
+        params["offset"] = query.offset
+        params["limit"] = query.limit
+        return car_results(db.execute(stmt, params), fields)
 
-        # Применяем фильтры
-        if query.brand:
-            q = q.filter(Car.brand.ilike(f"%{query.brand}%"))
-        
-        if query.color:
-            q = q.filter(Car.color.ilike(f"%{query.color}%"))
-        
-        if query.modelYear:
-            q = q.filter(Car.modelYear == query.modelYear)
-        
-        if query.minPrice:
-            q = q.filter(Car.price >= query.minPrice)
-        
-        if query.maxPrice:
-            q = q.filter(Car.price <= query.maxPrice)
-        
-        if query.owner_id:
-            q = q.filter(Car.owner_id == query.owner_id)
+    @staticmethod
+    def iter_all(db: Session, chunk_size: int = 5000, fields: Optional[tuple] = None) -> Iterator[List[CarRow]]:
+        """Все автомобили чанками (server-side cursor через yield_per)"""
+        stmt = car_select(fields).order_by(Car.id).execution_options(yield_per=chunk_size)
+        for partition in db.execute(stmt).partitions():
+            yield to_car_rows(partition) if fields is None else partition
 
-        # Применяем сортировку
-        sort_column = getattr(Car, query.sort_by, Car.id)
-        if query.sort_order.lower() == "desc":
-            q = q.order_by(desc(sort_column))
-        else:
-            q = q.order_by(asc(sort_column))
+    @staticmethod
+    def count_search(db: Session, query: CarQuery) -> Tuple[int, bool]:
+        """Сколько автомобилей подходит под фильтры CarQuery: (total, is_estimate)"""
+        params = search_cars_params(query)
+        if not params:
+            return table_total(db, Car.__tablename__)
+        return filtered_total(db, search_cars_filtered(tuple(params)), params)
 
-        # Применяем пагинацию
-        return q.offset(query.offset).limit(query.limit).all()
+    @staticmethod
+    def facets(db: Session, query: CarQuery) -> dict:
+        """Счетчики по brand, color, modelYear и ценовым диапазонам для фильтров CarQuery.
+
+        Один сгруппированный запрос; результат кэшируется на FACETS_CACHE_TTL
+        по набору фильтров и сбрасывается при записи в car.
+        """
+        params = search_cars_params(query)
+        key = tuple(sorted(params.items()))
+        now = time.monotonic()
+        if FACETS_CACHE_TTL > 0:
+            with _facet_lock:
+                cached = _facet_cache.get(key)
+                if cached and cached[1] > now:
+                    return {**cached[0], "cached": True}
+        dialect = db.get_bind().dialect.name
+        rows = db.execute(car_facets_statement(tuple(params), dialect), params).all()
+        result = {"total": 0, **{name: {} for name in FACET_NAMES}}
+        for row in rows:
+            if dialect == "postgresql":
+                name = _FACET_MASKS.get(row.mask)
+                value = row[1 + FACET_NAMES.index(name)] if name else None
+            else:
+                name = row.facet
+                value = row.value
+                if name in ("modelYear", "price") and value is not None:
+                    value = int(value)
+            if name is None:
+                result["total"] = row.count
+            else:
+                result[name][value] = row.count
+        facets = {
+            "total": result["total"],
+            "brand": _facet_counts(result["brand"]),
+            "color": _facet_counts(result["color"]),
+            "modelYear": [{"value": year, "count": count} for year, count in sorted(result["modelYear"].items(), key=_nulls_last)],
+            "price": [
+                {"min": start, "max": start + FACET_PRICE_BUCKET - 1, "count": count}
+                for start, count in sorted(result["price"].items(), key=_nulls_last) if start is not None
+            ],
+            "price_bucket": FACET_PRICE_BUCKET,
+        }
+        if FACETS_CACHE_TTL > 0:
+            with _facet_lock:
+                if len(_facet_cache) >= FACETS_CACHE_SIZE:
+                    _facet_cache.pop(next(iter(_facet_cache)))
+                _facet_cache[key] = (facets, now + FACETS_CACHE_TTL)
+        return {**facets, "cached": False}
+
+    @staticmethod
+    def count_all(db: Session) -> Tuple[int, bool]:
+        """Сколько всего автомобилей: (total, is_estimate)"""
+        return table_total(db, Car.__tablename__)
 
     @staticmethod
-    def get_cars_by_owner_name(db: Session, firstname: str = None, lastname: str = None) -> List[Car]:
+    def get_cars_by_owner_name(db: Session, firstname: str = None, lastname: str = None) -> List[CarRow]:
         """Найти автомобили по имени владельца"""
-        q = db.query(Car).options(joinedload(Car.owner))
+        q = select_car_rows()
         
         if firstname and lastname:
-            q = q.join(Owner).filter(
+            q = q.where(
                 and_(
                     Owner.firstname.ilike(f"%{firstname}%"),
                     Owner.lastname.ilike(f"%{lastname}%")
                 )
             )
         elif firstname:
-            q = q.join(Owner).filter(Owner.firstname.ilike(f"%{firstname}%"))
+            q = q.where(Owner.firstname.ilike(f"%{firstname}%"))
         elif lastname:
-            q = q.join(Owner).filter(Owner.lastname.ilike(f"%{lastname}%"))
+            q = q.where(Owner.lastname.ilike(f"%{lastname}%"))
         
-        return q.all()
+        return to_car_rows(db.execute(q))
 
     @staticmethod
     def get_statistics(db: Session) -> dict:
@@ -186,8 +434,12 @@ class OwnerCRUD:
         """Создать нового владельца"""
         db_owner = Owner(**owner.model_dump())
         db.add(db_owner)
+        record_change(db, "owner", "created", db_owner)
+        track_change(db, "owner", db_owner)
         db.commit()
         db.refresh(db_owner)
+        invalidate_counts(Owner.__tablename__)
+        autocomplete_index.owner_added(db_owner)
         return db_owner
 
     @staticmethod
@@ -196,9 +448,29 @@ class OwnerCRUD:
         return db.query(Owner).options(joinedload(Owner.cars)).filter(Owner.ownerid == owner_id).first()
 
     @staticmethod
-    def get_all(db: Session, skip: int = 0, limit: int = 100) -> List[Owner]:
-        """Получить всех владельцев с пагинацией"""
-        return db.query(Owner).options(joinedload(Owner.cars)).offset(skip).limit(limit).all()
+    def get_all(
+        db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None, fields: Optional[tuple] = None
+    ) -> List[Owner]:
+        """Получить всех владельцев с пагинацией (after_id - keyset-курсор, fields - только эти поля)"""
+        if OwnerCRUD._columns_only(fields):
+            stmt = select_owner_fields(fields).order_by(Owner.ownerid)
+            if after_id is not None:
+                stmt = stmt.where(Owner.ownerid > after_id)
+            return db.execute(stmt.offset(skip).limit(limit)).all()
+        q = db.query(Owner).options(joinedload(Owner.cars)).order_by(Owner.ownerid)
+        if after_id is not None:
+            q = q.filter(Owner.ownerid > after_id)
+        return q.offset(skip).limit(limit).all()
+
+    @staticmethod
+    def _columns_only(fields: Optional[tuple]) -> bool:
+        """Запрошены только скалярные поля - автомобили владельца не загружаем"""
+        return fields is not None and "cars" not in fields
+
+    @staticmethod
+    def count_all(db: Session) -> Tuple[int, bool]:
+        """Сколько всего владельцев: (total, is_estimate)"""
+        return table_total(db, Owner.__tablename__)
 
     @staticmethod
     def update(db: Session, owner_id: int, owner_update: OwnerUpdate) -> Optional[Owner]:
@@ -206,21 +478,61 @@ class OwnerCRUD:
         db_owner = db.query(Owner).filter(Owner.ownerid == owner_id).first()
         if db_owner:
             update_data = owner_update.model_dump(exclude_unset=True)
+            old = {"firstname": db_owner.firstname, "lastname": db_owner.lastname}
             for field, value in update_data.items():
                 setattr(db_owner, field, value)
+            record_change(db, "owner", "updated", db_owner)
+            track_change(db, "owner", db_owner)
             db.commit()
             db.refresh(db_owner)
+            autocomplete_index.owner_changed(old, db_owner)
         return db_owner
 
     @staticmethod
     def delete(db: Session, owner_id: int) -> bool:
-        """Удалить владельца (с каскадным удалением автомобилей)"""
-        db_owner = db.query(Owner).filter(Owner.ownerid == owner_id).first()
-        if db_owner:
-            db.delete(db_owner)
-            db.commit()
-            return True
-        return False
+        """Удалить владельца (автомобили удаляет БД через ON DELETE CASCADE).
+
+        Владелец и его автомобили в сессию не загружаются: надгробия автомобилей
+        для журнала синхронизации пишутся INSERT ... SELECT до удаления, индексы
+        в памяти обновляются по сгруппированным значениям - число операторов и
+        объем данных в Python не зависят от размера парка.
+        """
+        owner = db.execute(select(Owner.firstname, Owner.lastname).where(Owner.ownerid == owner_id)).first()
+        if owner is None:
+            return False
+        price_bucket = (Car.price - Car.price % price_distributions.bucket).label("price_bucket")
+        car_values = db.execute(
+            select(
+                Car.brand, Car.model, Car.color, Car.modelYear, price_bucket,
+                func.count().label("n"), func.sum(Car.price).label("price_total"),
+            )
+            .where(Car.owner_id == owner_id)
+            .group_by(Car.brand, Car.model, Car.color, Car.modelYear, price_bucket)
+        ).all()
+        cars_deleted = track_deleted_where(db, "car", Car.owner_id == owner_id)
+        result = db.execute(
+            delete(Owner).where(Owner.ownerid == owner_id).execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            # Владельца удалили параллельно - надгробия откатываются вместе с транзакцией
+            db.rollback()
+            return False
+        # В ленте - одно событие владельца без событий по его автомобилям
+        record_change(db, "owner", "deleted", {"ownerid": owner_id, "cars_deleted": cars_deleted})
+        track_change(db, "owner", owner_id, deleted=True)
+        db.commit()
+        invalidate_counts(Owner.__tablename__, Car.__tablename__)
+        invalidate_facets()
+        autocomplete_index.owner_removed(owner)
+        for car in car_values:
+            autocomplete_index.car_removed(car, car.n)
+        price_distributions.cars_removed(car_values)
+        return True
+
+    @staticmethod
+    def count_cars(db: Session, owner_id: int) -> int:
+        """Сколько автомобилей у владельца"""
+        return db.execute(select(func.count()).select_from(Car).where(Car.owner_id == owner_id)).scalar_one()
 
     @staticmethod
     def find_by_name(db: Session, firstname: str = None, lastname: str = None) -> List[Owner]:
@@ -257,42 +569,55 @@ class OwnerCRUD:
         return q.all()
 
     @staticmethod
-    def search_owners(db: Session, query: OwnerQuery) -> List[Owner]:
+    def search_owners(db: Session, query: OwnerQuery, fields: Optional[tuple] = None) -> List[Owner]:
         """Продвинутый поиск владельцев с фильтрацией и сортировкой"""
-        q = db.query(Owner).options(joinedload(Owner.cars))
+        columns_only = OwnerCRUD._columns_only(fields)
+        q = select_owner_fields(fields) if columns_only else select(Owner).options(joinedload(Owner.cars))
 
         # Применяем фильтры
-        if query.search:
-            # Общий поиск по имени ИЛИ фамилии
-            q = q.filter(
-                or_(
-                    Owner.firstname.ilike(f"%{query.search}%"),
-                    Owner.lastname.ilike(f"%{query.search}%")
-                )
-            )
-        else:
-            # Точный поиск по конкретным полям
-            if query.firstname:
-                q = q.filter(Owner.firstname.ilike(f"%{query.firstname}%"))
-            
-            if query.lastname:
-                q = q.filter(Owner.lastname.ilike(f"%{query.lastname}%"))
+        q = q.where(*OwnerCRUD._search_conditions(query))
 
         # Применяем сортировку
         sort_column = getattr(Owner, query.sort_by, Owner.ownerid)
-        if query.sort_order.lower() == "desc":
+        if query.sort_order == "desc":
             q = q.order_by(desc(sort_column))
         else:
             q = q.order_by(asc(sort_column))
 
         # Применяем пагинацию
-        return q.offset(query.offset).limit(query.limit).all()
+        result = db.execute(q.offset(query.offset).limit(query.limit))
+        return result.all() if columns_only else result.unique().scalars().all()
+
+    @staticmethod
+    def _search_conditions(query: OwnerQuery) -> list:
+        """Условия WHERE для OwnerQuery"""
+        if query.search:
+            # Общий поиск по имени ИЛИ фамилии
+            return [
+                or_(
+                    Owner.firstname.ilike(f"%{query.search}%"),
+                    Owner.lastname.ilike(f"%{query.search}%")
+                )
+            ]
+        # Точный поиск по конкретным полям
+        conditions = []
+        if query.firstname:
+            conditions.append(Owner.firstname.ilike(f"%{query.firstname}%"))
+        if query.lastname:
+            conditions.append(Owner.lastname.ilike(f"%{query.lastname}%"))
+        return conditions
+
+    @staticmethod
+    def count_search(db: Session, query: OwnerQuery) -> Tuple[int, bool]:
+        """Сколько владельцев подходит под фильтры OwnerQuery: (total, is_estimate)"""
+        conditions = OwnerCRUD._search_conditions(query)
+        if not conditions:
+            return table_total(db, Owner.__tablename__)
+        return filtered_total(db, select(Owner.ownerid).where(*conditions))
 
     @staticmethod
     def get_owners_with_car_count(db: Session) -> List[dict]:
         """Получить владельцев с количеством автомобилей"""
-        from sqlalchemy import func
-        
         result = db.query(
             Owner.ownerid,
             Owner.firstname,
@@ -1,115 +1,18 @@
-import os
 import logging
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import select
 from sqlalchemy.exc import OperationalError, MultipleResultsFound, IntegrityError
-from .models import Base, Owner, Car, AppUser
+# Engine и фабрика сессий общие для app и auth_app (core/db.py)
+from core.db import DB_URL, AsyncSyncSession, engine, SessionLocal, get_db, get_db_url
+from core.migrations import run_migrations
+from core.replicas import all_engines
+from .models import Base, Owner, Car, AppUser, normalize_plate
+from .slow_queries import install_slow_query_log
 
 # Настройка логирования
 log = logging.getLogger(__name__)
 
-# В production (Railway/Render) используем ТОЛЬКО переменные окружения
-# Проверяем, не в production ли мы
-is_production = os.getenv("PORT") or os.getenv("RAILWAY_ENVIRONMENT") or os.getenv("RENDER")
-
-# Загружаем config.env ТОЛЬКО для локальной разработки (если DATABASE_URL не установлен и не production)
-database_url_from_env = os.getenv("DATABASE_URL")
-if not database_url_from_env and not is_production:
-    try:
-        load_dotenv("config.env", override=True)
-        log.info("Loaded config.env for local development")
-    except Exception as e:
-        log.warning(f"Could not load config.env: {e}")
-
-# Перезагружаем переменные окружения с приоритетом
-load_dotenv(override=True)
-
-# Логируем статус DATABASE_URL (без полного URL для безопасности)
-database_url_status = "SET" if os.getenv("DATABASE_URL") else "NOT SET"
-log.info("=" * 80)
-log.info(f"Database configuration: DATABASE_URL={database_url_status}")
-log.info("=" * 80)
-
-def get_db_url():
-    """Получить URL подключения к БД ТОЛЬКО из DATABASE_URL"""
-    database_url = os.getenv("DATABASE_URL")
-    
-    if database_url is None:
-        log.error("=" * 80)
-        log.error("CRITICAL ERROR: DATABASE_URL is not set!")
-        log.error("=" * 80)
-        log.error("The application requires DATABASE_URL environment variable to be set.")
-        log.error("On Railway:")
-        log.error("1. Go to Railway Dashboard → Your Backend Service")
-        log.error("2. Variables → New Variable")
-        log.error("3. KEY: DATABASE_URL")
-        log.error("4. VALUE: ${{ Postgres.DATABASE_URL }}")
-        log.error("5. Save and redeploy")
-        log.error("=" * 80)
-        raise RuntimeError(
-            "DATABASE_URL is not set. Configure it in Railway Variables."
-        )
-    
-    # Railway/Render могут использовать postgres:// вместо postgresql://
-    if database_url.startswith("postgres://"):
-        database_url = database_url.replace("postgres://", "postgresql+psycopg://", 1)
-    # Также проверяем postgresql:// без psycopg
-    elif database_url.startswith("postgresql://") and "+psycopg" not in database_url:
-        database_url = database_url.replace("postgresql://", "postgresql+psycopg://", 1)
-    
-    # Маскируем пароль для логирования
-    masked = database_url.split("@")[0].split(":")[0] + "://***:***@" + "@".join(database_url.split("@")[1:]) if "@" in database_url else "***"
-    log.info(f"Using DATABASE_URL: {masked}")
-    
-    return database_url
-
-# Получаем DATABASE_URL - если не установлен, будет RuntimeError
-DB_URL = get_db_url()
-
-# Настройки для production (Railway PostgreSQL)
-# Подготовка connect_args с поддержкой SSL для облачных PostgreSQL
-connect_args = {
-    "connect_timeout": 10,
-}
-
-# Для PostgreSQL добавляем SSL если не указан в URL
-# Railway использует внутренний URL (postgres.railway.internal), который не требует SSL
-# Но если используется внешний URL, может потребоваться SSL
-if "postgresql" in DB_URL or "postgres" in DB_URL:
-    # Проверяем, не указан ли уже sslmode в URL
-    if "sslmode" not in DB_URL.lower():
-        # Для внешних подключений (не internal) может потребоваться SSL
-        # Railway обычно использует внутренний URL (postgres.railway.internal), который не требует SSL
-        if "railway.internal" not in DB_URL.lower():
-            # Пробуем добавить SSL, но если не получится - продолжаем без него
-            try:
-                connect_args["sslmode"] = "require"
-                log.info("Added SSL mode 'require' for PostgreSQL connection (external URL)")
-            except Exception as e:
-                log.warning(f"Could not set SSL mode: {e}")
-        else:
-            log.info("Using internal Railway PostgreSQL URL (SSL not required)")
-    else:
-        log.info("SSL mode already specified in DATABASE_URL")
-elif "mysql" in DB_URL:
-    # Для MySQL используем charset
-    connect_args["charset"] = "utf8mb4"
-
-# Создаем engine с правильными параметрами
-# Используем DATABASE_URL напрямую, без ручной подстановки
-engine = create_engine(
-    DB_URL,
-    echo=os.getenv("DB_ECHO", "False").lower() == "true",
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
-    pool_recycle=3600,  # Переподключение каждый час
-    connect_args=connect_args
-)
-
-# Создаем SessionLocal для работы с БД
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+# Журнал медленных запросов (SLOW_QUERY_MS) на основном engine и репликах
+install_slow_query_log(all_engines())
 
 def init_db_with_seed() -> None:
     """Create tables if not exist and seed initial data once. Idempotent - safe to call multiple times."""
@@ -117,6 +20,8 @@ def init_db_with_seed() -> None:
         log.info("Initializing database...")
         Base.metadata.create_all(engine)
         log.info("Database tables created/verified")
+        # Существующие базы доводятся до актуальной схемы (ON DELETE CASCADE и т.п.)
+        run_migrations(engine)
         
         with SessionLocal() as s:
             # Используем .scalars().first() вместо scalar_one_or_none() для безопасной проверки
@@ -161,9 +66,9 @@ def init_db_with_seed() -> None:
                 
                 s.commit()  # Сохраняем владельцев
                 
-                # Теперь создаем автомобили с проверкой по registrationNumber (уникальное поле)
+                # Теперь создаем автомобили с проверкой по нормализованному номеру (уникальный индекс)
                 # Ford Mustang
-                stmt_car1 = select(Car).where(Car.registrationNumber == "ADF-1121")
+                stmt_car1 = select(Car).where(Car.registration_key == normalize_plate("ADF-1121"))
                 car1 = s.execute(stmt_car1).scalars().first()
                 if not car1:
                     car1 = Car(
@@ -181,7 +86,7 @@ def init_db_with_seed() -> None:
                     log.info("Car ADF-1121 already exists, skipping")
                 
                 # Nissan Leaf
-                stmt_car2 = select(Car).where(Car.registrationNumber == "SSJ-3002")
+                stmt_car2 = select(Car).where(Car.registration_key == normalize_plate("SSJ-3002"))
                 car2 = s.execute(stmt_car2).scalars().first()
                 if not car2:
                     car2 = Car(
@@ -199,7 +104,7 @@ def init_db_with_seed() -> None:
                     log.info("Car SSJ-3002 already exists, skipping")
                 
                 # Toyota Prius
-                stmt_car3 = select(Car).where(Car.registrationNumber == "KKO-0212")
+                stmt_car3 = select(Car).where(Car.registration_key == normalize_plate("KKO-0212"))
                 car3 = s.execute(stmt_car3).scalars().first()
                 if not car3:
                     car3 = Car(
@@ -225,7 +130,7 @@ def init_db_with_seed() -> None:
     except OperationalError as e:
         log.error("=" * 80)
         log.error("Database unreachable, starting without DB")
-        log.error(f"OperationalError: {e}")
+        log.error("OperationalError: %s", e)
         log.error("=" * 80)
         log.error("The application will continue running, but database operations will fail.")
         log.error("Please check:")
@@ -239,8 +144,8 @@ def init_db_with_seed() -> None:
     except (MultipleResultsFound, IntegrityError) as e:
         log.error("=" * 80)
         log.error("Error during DB seeding; database is reachable but seed data may be inconsistent")
-        log.error(f"Error type: {type(e).__name__}")
-        log.error(f"Error message: {e}")
+        log.error("Error type: %s", type(e).__name__)
+        log.error("Error message: %s", e)
         log.error("=" * 80)
         log.warning("Database is reachable, but seeding encountered data consistency issues.")
         log.warning("Application will continue running with existing data.")
@@ -248,10 +153,10 @@ def init_db_with_seed() -> None:
     except Exception as e:
         log.error("=" * 80)
         log.error("Unexpected error during DB init")
-        log.error(f"Error type: {type(e).__name__}")
-        log.error(f"Error message: {e}")
+        log.error("Error type: %s", type(e).__name__)
+        log.error("Error message: %s", e)
         import traceback
-        log.error(f"Traceback: {traceback.format_exc()}")
+        log.error("Traceback: %s", traceback.format_exc())
         log.error("=" * 80)
         log.warning("Application will continue running, but database initialization may be incomplete.")
         # НЕ поднимаем исключение - приложение должно продолжить работу
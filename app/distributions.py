@@ -0,0 +1,374 @@
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import select
+from .db import SessionLocal
+from .models import Car
+from .sync import current_version
+
+log = logging.getLogger(__name__)
+
+# ==================== CONFIG ====================
+
+# Степень сжатия t-digest: больше - точнее квантили и больше центроидов на группу
+DISTRIBUTION_COMPRESSION = float(os.getenv("DISTRIBUTION_COMPRESSION", "100"))
+# Ширина корзины гистограммы цен
+DISTRIBUTION_BUCKET = int(os.getenv("DISTRIBUTION_BUCKET", "10000"))
+# Как часто проверять журнал изменений и перестраивать скетчи, если были записи (0 - только при старте)
+DISTRIBUTION_REFRESH_INTERVAL = float(os.getenv("DISTRIBUTION_REFRESH_INTERVAL", "300"))
+DISTRIBUTION_REBUILD_CHUNK = 10000
+
+FIELDS = ("brand", "modelYear", "price")
+GROUP_BY = {"none": (), "brand": ("brand",), "modelYear": ("modelYear",), "brand,modelYear": ("brand", "modelYear")}
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+# ==================== T-DIGEST ====================
+
+def _k(q: float, compression: float) -> float:
+    # Масштабная функция k1: центроиды мельче у хвостов, поэтому p99 точнее p50 в абсолюте ранга
+    return compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+def _k_inverse(k: float, compression: float) -> float:
+    return (math.sin(min(k, compression / 4) * 2 * math.pi / compression) + 1) / 2
+
+class TDigest:
+    """Сливаемый скетч квантилей (merging t-digest, Dunning).
+
+    Хранит не больше ~compression центроидов (среднее, вес) независимо от
+    числа значений; ошибка квантиля q пропорциональна q(1-q)/compression
+    по рангу. Значения копятся в буфере и вливаются пачкой. Удаление
+    не поддерживается - удаленные значения учитываются до перестройки.
+    """
+
+    __slots__ = ("compression", "count", "min", "max", "_means", "_weights", "_buffer")
+
+    def __init__(self, compression: float = DISTRIBUTION_COMPRESSION):
+        self.compression = compression
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._means: List[float] = []
+        self._weights: List[float] = []
+        self._buffer: List[Tuple[float, float]] = []
+
+    @classmethod
+    def from_sorted(cls, values: Sequence[float], compression: float = DISTRIBUTION_COMPRESSION) -> "TDigest":
+        """Построение за один линейный проход по отсортированным значениям"""
+        digest = cls(compression)
+        if values:
+            digest.count = len(values)
+            digest.min, digest.max = values[0], values[-1]
+            digest._means, digest._weights = _cluster(values, None, len(values), compression)
+        return digest
+
+    def add(self, value: float, weight: float = 1) -> None:
+        self._buffer.append((value, weight))
+        self.count += weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self._buffer) > 4 * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest") -> None:
+        if not other.count:
+            return
+        self._buffer.extend(zip(other._means, other._weights))
+        self._buffer.extend(other._buffer)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        # Как и add: сжатие пачкой, а не на каждое слияние
+        if len(self._buffer) > 4 * self.compression:
+            self._compress()
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self._means, self._weights)) + self._buffer)
+        self._buffer = []
+        self._means, self._weights = _cluster([p[0] for p in points], [p[1] for p in points], self.count, self.compression)
+
+    @property
+    def centroids(self) -> int:
+        self._compress()
+        return len(self._means)
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._compress()
+        means, weights = self._means, self._weights
+        if not means:
+            return None
+        if len(means) == 1 or q <= 0:
+            return means[0] if q > 0 else self.min
+        if q >= 1:
+            return self.max
+        index = q * self.count
+        # Левый хвост: между min и центром первого центроида
+        if index < weights[0] / 2:
+            return self.min + (means[0] - self.min) * index / (weights[0] / 2)
+        cumulative = weights[0] / 2
+        for i in range(len(means) - 1):
+            step = (weights[i] + weights[i + 1]) / 2
+            if cumulative + step > index:
+                return means[i] + (means[i + 1] - means[i]) * (index - cumulative) / step
+            cumulative += step
+        tail = weights[-1] / 2
+        return means[-1] + (self.max - means[-1]) * min(1.0, (index - cumulative) / tail)
+
+def _cluster(values: Sequence[float], weights: Optional[Sequence[float]], total: float, compression: float):
+    """Слить отсортированные точки в центроиды, пока k(q) центроида растет не больше чем на 1"""
+    means: List[float] = []
+    sizes: List[float] = []
+    mean = values[0]
+    size = weights[0] if weights is not None else 1
+    done = 0.0
+    limit = _k_inverse(_k(0, compression) + 1, compression) * total
+    for i in range(1, len(values)):
+        weight = weights[i] if weights is not None else 1
+        if done + size + weight <= limit:
+            size += weight
+            mean += (values[i] - mean) * weight / size
+        else:
+            means.append(mean)
+            sizes.append(size)
+            done += size
+            limit = _k_inverse(_k(done / total, compression) + 1, compression) * total
+            mean, size = values[i], weight
+    means.append(mean)
+    sizes.append(size)
+    return means, sizes
+
+# ==================== GROUP SKETCH ====================
+
+class PriceSketch:
+    """Цены одной группы (марка, год): t-digest для квантилей и точная гистограмма корзин"""
+
+    __slots__ = ("digest", "histogram", "count", "total", "removed")
+
+    def __init__(self, digest: Optional[TDigest] = None, histogram: Optional[Dict[int, int]] = None, total: float = 0):
+        self.digest = digest or TDigest()
+        self.histogram: Dict[int, int] = histogram or {}
+        self.count = sum(self.histogram.values())
+        self.total = total
+        # Удалено после перестройки: в гистограмме и сумме учтено, в t-digest еще нет
+        self.removed = 0
+
+    @classmethod
+    def from_prices(cls, prices: List[int], bucket: int) -> "PriceSketch":
+        prices.sort()
+        histogram = {}
+        position = 0
+        # Гистограмма по отсортированным ценам: bisect на границу каждой корзины
+        while position < len(prices):
+            start = prices[position] - prices[position] % bucket
+            end = bisect_left(prices, start + bucket, position)
+            histogram[start] = end - position
+            position = end
+        return cls(TDigest.from_sorted(prices), histogram, sum(prices))
+
+    def add(self, price: int, bucket: int) -> None:
+        self.digest.add(price)
+        start = price - price % bucket
+        self.histogram[start] = self.histogram.get(start, 0) + 1
+        self.count += 1
+        self.total += price
+
+    def remove(self, price: int, bucket: int) -> None:
+        self.remove_bucket(price - price % bucket, 1, price)
+
+    def remove_bucket(self, start: int, n: int, total: float) -> None:
+        """Убрать n цен корзины start с суммой total"""
+        left = self.histogram.get(start, 0) - n
+        if left > 0:
+            self.histogram[start] = left
+        else:
+            self.histogram.pop(start, None)
+        self.count -= n
+        self.total -= total
+        self.removed += n
+
+    def merge(self, other: "PriceSketch") -> None:
+        self.digest.merge(other.digest)
+        for start, count in other.histogram.items():
+            self.histogram[start] = self.histogram.get(start, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.removed += other.removed
+
+    def summary(self, quantiles: Iterable[float], bucket: int) -> dict:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else None,
+            "min": self.digest.min if self.digest.count else None,
+            "max": self.digest.max if self.digest.count else None,
+            "quantiles": {_quantile_name(q): _round(self.digest.quantile(q)) for q in quantiles},
+            "histogram": [
+                {"min": start, "max": start + bucket - 1, "count": count}
+                for start, count in sorted(self.histogram.items())
+            ],
+            "stale": self.removed,
+        }
+
+def _quantile_name(q: float) -> str:
+    return "p" + f"{q * 100:g}".replace(".", "_")
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+def _value(row, field: str):
+    # ORM-объект, Row или dict из bulk_create
+    return row.get(field) if isinstance(row, dict) else getattr(row, field, None)
+
+# ==================== INDEX ====================
+
+class PriceDistributions:
+    """Скетчи цен по группам (марка, год) в памяти процесса.
+
+    Строятся одним проходом по car при старте, дальше обновляются методами
+    car_* из CarCRUD после COMMIT. Запросы сливают нужные группы: O(групп),
+    без сортировки таблицы. Записи других воркеров подхватывает перестройка,
+    если версия журнала изменений сдвинулась (проверка раз в
+    DISTRIBUTION_REFRESH_INTERVAL).
+    """
+
+    def __init__(self, bucket: int = DISTRIBUTION_BUCKET, refresh_interval: float = DISTRIBUTION_REFRESH_INTERVAL):
+        self.bucket = bucket
+        self.refresh_interval = refresh_interval
+        self._groups: Dict[Tuple[str, int], PriceSketch] = {}
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._built_at: Optional[datetime] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def rebuild(self) -> None:
+        """Перечитать цены из БД и подменить скетчи"""
+        started = time.perf_counter()
+        prices: Dict[Tuple[str, int], List[int]] = defaultdict(list)
+        with SessionLocal() as db:
+            version = current_version(db)
+            rows = db.execute(
+                select(Car.brand, Car.modelYear, Car.price).execution_options(yield_per=DISTRIBUTION_REBUILD_CHUNK)
+            )
+            for brand, year, price in rows:
+                if price is not None:
+                    prices[(brand, year)].append(price)
+        groups = {key: PriceSketch.from_prices(values, self.bucket) for key, values in prices.items()}
+        with self._lock:
+            self._groups = groups
+            self._version = version
+            self._built_at = datetime.utcnow()
+        log.debug("Price distributions rebuilt: %s groups in %.0f ms", len(groups), (time.perf_counter() - started) * 1000)
+
+    def distribution(
+        self, group_by: Tuple[str, ...] = ("brand",), brand: Optional[str] = None, model_year: Optional[int] = None,
+        quantiles: Iterable[float] = DEFAULT_QUANTILES, limit: int = 100,
+    ) -> dict:
+        """Квантили и гистограммы цен по группам group_by (самые многочисленные первыми)"""
+        quantiles = tuple(quantiles)
+        merged: Dict[tuple, PriceSketch] = {}
+        with self._lock:
+            for (group_brand, group_year), sketch in self._groups.items():
+                if brand is not None and group_brand != brand:
+                    continue
+                if model_year is not None and group_year != model_year:
+                    continue
+                values = {"brand": group_brand, "modelYear": group_year}
+                key = tuple(values[field] for field in group_by)
+                target = merged.get(key)
+                if target is None:
+                    # Слияние в новый скетч: исходные группы не меняются
+                    target = merged[key] = PriceSketch()
+                target.merge(sketch)
+            built_at, version = self._built_at, self._version
+        ordered = sorted(merged.items(), key=lambda item: item[1].count, reverse=True)
+        return {
+            "group_by": list(group_by),
+            "bucket": self.bucket,
+            "compression": DISTRIBUTION_COMPRESSION,
+            "built_at": built_at.isoformat() if built_at else None,
+            "version": version,
+            "groups": [
+                {**dict(zip(group_by, key)), **sketch.summary(quantiles, self.bucket)}
+                for key, sketch in ordered[:limit] if sketch.count
+            ],
+        }
+
+    # ==================== WRITE PATHS ====================
+
+    def car_added(self, car) -> None:
+        price = _value(car, "price")
+        if price is None:
+            return
+        key = (_value(car, "brand"), _value(car, "modelYear"))
+        with self._lock:
+            sketch = self._groups.get(key)
+            if sketch is None:
+                sketch = self._groups[key] = PriceSketch()
+            sketch.add(price, self.bucket)
+
+    def car_removed(self, car) -> None:
+        price = _value(car, "price")
+        key = (_value(car, "brand"), _value(car, "modelYear"))
+        with self._lock:
+            sketch = self._groups.get(key)
+            if sketch is not None and price is not None:
+                sketch.remove(price, self.bucket)
+                if sketch.count <= 0:
+                    # Пустая группа не должна подмешивать удаленные цены в общие квантили
+                    del self._groups[key]
+
+    def cars_removed(self, rows: Iterable) -> None:
+        """Удаление пачкой по сгруппированным строкам (brand, modelYear, price_bucket, n, price_total)"""
+        with self._lock:
+            for row in rows:
+                key = (row.brand, row.modelYear)
+                sketch = self._groups.get(key)
+                if sketch is None:
+                    continue
+                sketch.remove_bucket(row.price_bucket, row.n, row.price_total)
+                if sketch.count <= 0:
+                    del self._groups[key]
+
+    def car_changed(self, old: dict, car) -> None:
+        if any(old.get(field) != _value(car, field) for field in FIELDS):
+            self.car_removed(old)
+            self.car_added(car)
+
+    # ==================== REFRESHER ====================
+
+    def start(self) -> None:
+        try:
+            self.rebuild()
+        except Exception as e:
+            log.error("Could not build price distributions: %s", e)
+        if self.refresh_interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="price-distributions", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                with SessionLocal() as db:
+                    version = current_version(db)
+                if version != self._version:
+                    self.rebuild()
+            except Exception as e:
+                log.warning("Price distributions refresh failed: %s", e)
+
+price_distributions = PriceDistributions()
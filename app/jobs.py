@@ -0,0 +1,253 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+from sqlalchemy import or_, select, update
+from .db import SessionLocal
+from .models import Job
+
+log = logging.getLogger(__name__)
+
+# ==================== CONFIG ====================
+
+# Сколько задач выполняется одновременно (потоки вне пула запросов)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Сколько задач может ждать в очереди; сверх этого submit() отказывает
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+# Не чаще чем раз в N секунд прогресс записывается в БД
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "0.5"))
+# Как часто воркер отмечает пульс своих задач и ищет задачи пропавших воркеров
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "10"))
+# Задача, пульс которой старше N секунд, считается брошенной (воркер упал)
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "60"))
+
+class JobQueueFull(Exception):
+    """Очередь задач заполнена"""
+
+# ==================== HANDLERS ====================
+
+_handlers: Dict[str, Callable] = {}
+
+def job_handler(kind: str):
+    """Зарегистрировать функцию handler(ctx, **params) для задач вида kind"""
+    def decorator(func: Callable) -> Callable:
+        _handlers[kind] = func
+        return func
+    return decorator
+
+class JobContext:
+    """Передается в обработчик: id задачи и отчет о прогрессе"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._last_write = 0.0
+
+    def progress(self, done: float, total: Optional[float] = None, message: Optional[str] = None) -> None:
+        """Сообщить прогресс (done из total или доля 0..1); запись в БД троттлится"""
+        fraction = done / total if total else done
+        now = time.monotonic()
+        if now - self._last_write < JOB_PROGRESS_INTERVAL and fraction < 1:
+            return
+        self._last_write = now
+        values = {"progress": max(0.0, min(1.0, fraction))}
+        if message is not None:
+            values["message"] = message[:255]
+        _update_job(self.job_id, **values)
+
+def _update_job(job_id: str, **values) -> None:
+    with SessionLocal() as db:
+        db.execute(update(Job).where(Job.id == job_id).values(**values))
+        db.commit()
+
+# ==================== RUNNER ====================
+
+class JobRunner:
+    """Ограниченный пул потоков для тяжелых операций с записями задач в БД.
+
+    Каждая задача принадлежит воркеру (owner) и захватывается атомарным
+    UPDATE ... WHERE status='queued': выполнить ее может только один процесс.
+    Пока задача ждет или выполняется, воркер раз в JOB_HEARTBEAT_INTERVAL
+    обновляет ее heartbeat_at; задачи с пульсом старше JOB_STALE_AFTER
+    принадлежат пропавшему воркеру: queued подхватываются, running - failed.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, queue_limit: int = JOB_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self.recover()
+        if JOB_HEARTBEAT_INTERVAL > 0:
+            self._stop.clear()
+            self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._stop.set()
+            if self._heartbeat is not None:
+                self._heartbeat.join(timeout=5)
+                self._heartbeat = None
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            # Незапущенные задачи остаются queued без владельца и сразу подхватываются другими воркерами
+            try:
+                with SessionLocal() as db:
+                    db.execute(
+                        update(Job).where(Job.owner == self.worker_id, Job.status == "queued")
+                        .values(owner=None, heartbeat_at=None)
+                    )
+                    db.commit()
+            except Exception as e:
+                log.warning("Could not release queued jobs: %s", e)
+
+    def submit(self, kind: str, params: Optional[dict] = None, created_by: Optional[str] = None) -> Job:
+        """Создать запись задачи и поставить ее в очередь"""
+        if kind not in _handlers:
+            raise ValueError(f"Неизвестный тип задачи: {kind}")
+        self.start()
+        with self._lock:
+            if self._pending >= self.workers + self.queue_limit:
+                raise JobQueueFull("Очередь фоновых задач заполнена, повторите позже")
+            self._pending += 1
+        try:
+            with SessionLocal() as db:
+                job = Job(
+                    id=str(uuid.uuid4()), kind=kind, status="queued", params=params or {}, created_by=created_by,
+                    owner=self.worker_id, heartbeat_at=datetime.utcnow(),
+                )
+                db.add(job)
+                db.commit()
+                db.refresh(job)
+                db.expunge(job)
+            self._executor.submit(self._run, job.id)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        log.info("Job %s (%s) queued", job.id, kind)
+        return job
+
+    def _claim(self, job_id: str) -> bool:
+        """queued -> running одним условным UPDATE: True, только если задачу захватил этот воркер"""
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            claimed = db.execute(
+                update(Job).where(Job.id == job_id, Job.status == "queued", Job.owner == self.worker_id)
+                .values(status="running", started_at=now, heartbeat_at=now)
+            ).rowcount
+            db.commit()
+        return claimed == 1
+
+    def _finish(self, job_id: str, **values) -> None:
+        # Задачу, которую уже признали брошенной (failed другим воркером), не перезаписываем
+        with SessionLocal() as db:
+            db.execute(
+                update(Job).where(Job.id == job_id, Job.owner == self.worker_id, Job.status == "running")
+                .values(finished_at=datetime.utcnow(), **values)
+            )
+            db.commit()
+
+    def _run(self, job_id: str) -> None:
+        try:
+            if not self._claim(job_id):
+                return
+            with SessionLocal() as db:
+                job = db.get(Job, job_id)
+                kind, params = job.kind, dict(job.params or {})
+            started = time.perf_counter()
+            try:
+                result = _handlers[kind](JobContext(job_id), **params)
+            except Exception as e:
+                log.error("Job %s (%s) failed: %s", job_id, kind, e)
+                self._finish(job_id, status="failed", error=f"{type(e).__name__}: {e}\n{traceback.format_exc()}")
+                return
+            self._finish(job_id, status="succeeded", progress=1.0, result=result)
+            log.info("Job %s (%s) finished in %.2fs", job_id, kind, time.perf_counter() - started)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def recover(self) -> None:
+        """Задачи пропавших воркеров: running -> failed, queued - в свою очередь.
+
+        Задачи живых воркеров (свежий heartbeat_at) не трогаются.
+        """
+        now = datetime.utcnow()
+        stale = or_(Job.heartbeat_at.is_(None), Job.heartbeat_at < now - timedelta(seconds=JOB_STALE_AFTER))
+        adopted = []
+        try:
+            with SessionLocal() as db:
+                failed = db.execute(
+                    update(Job).where(Job.status == "running", stale)
+                    .values(status="failed", error="Воркер, выполнявший задачу, перестал отвечать", finished_at=now)
+                ).rowcount
+                db.commit()
+                candidates = db.execute(
+                    select(Job.id).where(Job.status == "queued", stale).order_by(Job.created_at)
+                ).scalars().all()
+                for job_id in candidates:
+                    # Условие повторяется в UPDATE: из нескольких воркеров задачу забирает один
+                    if db.execute(
+                        update(Job).where(Job.id == job_id, Job.status == "queued", stale)
+                        .values(owner=self.worker_id, heartbeat_at=now)
+                    ).rowcount == 1:
+                        adopted.append(job_id)
+                    db.commit()
+        except Exception as e:
+            # Таблицы может еще не быть (БД недоступна при старте)
+            log.warning("Could not recover jobs: %s", e)
+            return
+        if failed:
+            log.warning("Marked %s abandoned running jobs as failed", failed)
+        for job_id in adopted:
+            with self._lock:
+                if self._executor is None:
+                    return
+                self._pending += 1
+                self._executor.submit(self._run, job_id)
+        if adopted:
+            log.info("Re-queued %s abandoned jobs", len(adopted))
+
+    def _beat(self) -> None:
+        while not self._stop.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                with SessionLocal() as db:
+                    db.execute(
+                        update(Job).where(Job.owner == self.worker_id, Job.status.in_(("queued", "running")))
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    db.commit()
+            except Exception as e:
+                log.warning("Job heartbeat failed: %s", e)
+                continue
+            self.recover()
+
+runner = JobRunner()
+
+def get_job(job_id: str) -> Optional[Job]:
+    with SessionLocal() as db:
+        return db.get(Job, job_id)
+
+def recent_jobs(limit: int = 50, kind: Optional[str] = None) -> list:
+    with SessionLocal() as db:
+        stmt = select(Job).order_by(Job.created_at.desc()).limit(limit)
+        if kind:
+            stmt = stmt.where(Job.kind == kind)
+        return db.execute(stmt).scalars().all()
@@ -1,44 +1,54 @@
+import json
 import logging
 import os
-import time
-from typing import List, Optional
-from datetime import datetime, timedelta
+from typing import List, Optional, Union
+import anyio
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-import jwt
-from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
-from .db import SessionLocal, init_db_with_seed
+from .db import get_db, init_db_with_seed
 from .schemas import (
     CarCreate, CarUpdate, CarResponse, CarWithOwner, CarQuery,
     OwnerCreate, OwnerUpdate, OwnerResponse, OwnerQuery,
-    StatusResponse, MessageResponse, UserLogin, UserRegister, Token, UserResponse
+    StatusResponse, MessageResponse, UserLogin, UserRegister, Token, UserResponse, Page,
+    JobResponse, JobAccepted, CarFacets, PlateLookup, PlateLookupResult, SyncPage
 )
 from .crud import CarCRUD, OwnerCRUD
-from .models import AppUser, Car, Owner
+from .pagination import encode_cursor, decode_cursor
+from .read_models import CAR_FIELDS, OWNER_FIELDS, parse_fields
+from .coalesce import coalesce
+from .compression import CompressionMiddleware
+from .jobs import JobQueueFull, get_job, recent_jobs, runner
+from . import analytics, sync, tasks, wire  # tasks регистрирует обработчики фоновых задач
+from .backup import MANIFEST, backup_path, list_backups, new_backup_id
+from .system_settings import MaintenanceModeMiddleware, settings as system_settings
+from .profiling import PROFILING_ENABLED, ProfilingMiddleware, list_reports, load_report
+from .slow_queries import slow_queries
+from .autocomplete import FIELDS as AUTOCOMPLETE_FIELDS, autocomplete_index
+from .distributions import DEFAULT_QUANTILES, GROUP_BY as DISTRIBUTION_GROUP_BY, price_distributions
+from .pivot import DIMENSIONS as PIVOT_DIMENSIONS, MEASURES as PIVOT_MEASURES, pivot_engine
+from .change_feed import ENTITIES as CHANGE_ENTITIES, RESET, feed as change_feed, listener as change_listener
+from .models import AppUser, normalize_plate
+# Аутентификация общая для app и auth_app (core/security.py)
+from core.db import dispose_engines
+from core.logs import AccessLogMiddleware, dropped_records, log_buffer, setup_logging, stop_logging
+from core.replicas import ReadYourWritesMiddleware, dispose_replicas, get_read_db, read_session, wants_primary
+from core.security import (
+    ACCESS_TOKEN_EXPIRE_MINUTES, hash_password, verify_password,
+    create_access_token, get_current_user, role_required, shutdown_hash_executor,
+    connection_token, decode_access_token, get_token_payload
+)
 
 # Load config
 load_dotenv("config.env")
 APP_NAME = os.getenv("APP_NAME", "Lab1 FastAPI")
 APP_VERSION = os.getenv("APP_VERSION", "1.0.0")
 
-# JWT Configuration
-SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key-change-in-production")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
-
-# Password hashing - используем pbkdf2_sha256 для поддержки любых символов
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
-
-# Security scheme
-security = HTTPBearer()
-
-# Logging
-logging.basicConfig(level=logging.DEBUG, format="%(levelname)s %(name)s: %(message)s")
+# Logging: очередь + фоновый поток записи, уровень из LOG_LEVEL (core/logs.py)
+setup_logging()
 log = logging.getLogger("lab1")
 
 app = FastAPI(title=APP_NAME, version=APP_VERSION)
@@ -59,96 +69,166 @@ else:
         "https://web-123-b09c.up.railway.app",  # Railway фронтенд
     ]
 
+# Режим обслуживания (внутри CORS, чтобы 503 был виден браузеру)
+app.add_middleware(MaintenanceModeMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=cors_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Is-Estimate", "X-Request-ID", "X-Profile-Id"],
 )
 
-# Dependency для получения сессии БД
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# Authentication functions
-def hash_password(password: str) -> str:
-    """Hash password using pbkdf2_sha256 - поддерживает любые символы и длину"""
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password against hash - поддерживает любые символы и длину"""
-    return pwd_context.verify(plain_password, hashed_password)
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create JWT access token"""
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> AppUser:
-    """Get current authenticated user"""
-    credentials_exception = HTTPException(
-        status_code=401,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except InvalidTokenError:
-        raise credentials_exception
-    
-    user = db.query(AppUser).filter(AppUser.username == username).first()
-    if user is None:
-        raise credentials_exception
-    return user
+# Сжатие ответов (gzip/br/zstd) по Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+# Чтения клиента сразу после его записи идут в primary (если заданы реплики)
+app.add_middleware(ReadYourWritesMiddleware)
+# Профилирование запроса администратора по X-Profile: 1 / ?profile=1
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+# Access-лог с выборкой и X-Request-ID (внешний слой: латентность включает сжатие)
+app.add_middleware(AccessLogMiddleware)
 
-def role_required(required_role: str):
-    """Dependency to check user role"""
-    def role_checker(current_user: AppUser = Depends(get_current_user)):
-        if current_user.role != required_role:
-            raise HTTPException(
-                status_code=403,
-                detail="Not enough permissions"
-            )
-        return current_user
-    return role_checker
+# Размер чанка для потокового экспорта (/export/cars)
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+# Владельцы с большим числом автомобилей удаляются фоновой задачей
+OWNER_DELETE_INLINE_LIMIT = int(os.getenv("OWNER_DELETE_INLINE_LIMIT", "1000"))
+# Потоков для sync-эндпоинтов в воркере (0 - по умолчанию anyio, 40); больше, чем
+# pool_size + max_overflow пула БД, обычно бесполезно - потоки будут ждать соединения
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "0"))
 
 @app.on_event("startup")
 async def on_startup():
     try:
         log.info("🚀 Starting application...")
-        log.info(f"Environment: PORT={os.getenv('PORT', 'NOT SET')}, DATABASE_URL={'SET' if os.getenv('DATABASE_URL') else 'NOT SET'}")
-    init_db_with_seed()
+        log.info("Environment: PORT=%s, DATABASE_URL=%s", os.getenv('PORT', 'NOT SET'), 'SET' if os.getenv('DATABASE_URL') else 'NOT SET')
+        if THREADPOOL_SIZE:
+            anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+        init_db_with_seed()
+        system_settings.start()
+        autocomplete_index.start()
+        price_distributions.start()
+        pivot_engine.start()
+        change_listener.start()
+        runner.start()
         log.info("🚀 Application started successfully")
     except Exception as e:
         # init_db_with_seed() теперь не поднимает OperationalError,
         # но на всякий случай обрабатываем все исключения
-        log.error(f"❌ Failed to start application: {e}")
-        import traceback
-        log.error(f"Traceback: {traceback.format_exc()}")
+        log.error("❌ Failed to start application: %s", e, exc_info=True)
         # В production не падаем полностью, но логируем ошибку
         # Это позволит приложению запуститься и показать ошибку в /api/status
         log.error("Application will continue but database operations may fail")
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    shutdown_hash_executor()
+    runner.shutdown()
+    system_settings.stop()
+    autocomplete_index.stop()
+    price_distributions.stop()
+    pivot_engine.stop()
+    change_listener.stop()
+    await dispose_replicas()
+    await dispose_engines()
+    stop_logging()
+
+# ==================== PAGINATION HELPERS ====================
+
+def cursor_value(cursor: Optional[str], key: str) -> Optional[int]:
+    """Достать целое значение из курсора пагинации или 400"""
+    if not cursor:
+        return None
+    try:
+        value = decode_cursor(cursor).get(key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not isinstance(value, int):
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+    return value
+
+def make_page(items: list, limit: int, next_cursor_data, total) -> dict:
+    """Собрать конверт: items обрезаются до limit, next_cursor - если была лишняя строка"""
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(next_cursor_data(items)) if has_more and items else None,
+        "total": total[0],
+        "total_is_estimate": total[1],
+    }
+
+def requested_fields(fields: Optional[str], allowed: tuple, key: str) -> Optional[tuple]:
+    """Разобрать ?fields= или 400"""
+    try:
+        return parse_fields(fields, allowed, key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def car_list_response(cars: list, fmt: str, fields: Optional[tuple] = None):
+    """Список CarRow в запрошенном формате (JSON / MessagePack / Arrow)"""
+    if fmt != wire.JSON:
+        return wire.cars_response(cars, fmt, fields=fields or CAR_FIELDS)
+    if fields:
+        # Частичные строки не проходят валидацию response_model
+        return JSONResponse(wire.car_dicts(cars, fields))
+    return [CarWithOwner.model_validate(car) for car in cars]
+
+def car_page_response(page: dict, fmt: str, fields: Optional[tuple] = None):
+    """Конверт со списком CarRow в запрошенном формате"""
+    if fmt == wire.ARROW:
+        # У Arrow нет места под конверт - метаданные страницы идут в заголовках
+        headers = {
+            "X-Total-Count": str(page["total"]),
+            "X-Total-Is-Estimate": str(page["total_is_estimate"]).lower(),
+        }
+        if page["next_cursor"]:
+            headers["X-Next-Cursor"] = page["next_cursor"]
+        return wire.cars_response(page["items"], fmt, headers=headers, fields=fields or CAR_FIELDS)
+    if fmt == wire.MSGPACK:
+        return wire.msgpack_response({**page, "items": wire.car_dicts(page["items"], fields or CAR_FIELDS)})
+    if fields:
+        return JSONResponse({**page, "items": wire.car_dicts(page["items"], fields)})
+    page["items"] = [CarWithOwner.model_validate(car) for car in page["items"]]
+    return page
+
+def owner_dicts(owners: list, fields: Optional[tuple] = None) -> List[dict]:
+    """Владельцы -> словари (только поля из fields, если заданы)"""
+    if fields and "cars" not in fields:
+        return [row._asdict() for row in owners]
+    include = set(fields) if fields else None
+    return [OwnerResponse.model_validate(owner).model_dump(include=include) for owner in owners]
+
+def owner_list_response(owners: list, fmt: str, fields: Optional[tuple] = None):
+    """Список владельцев в запрошенном формате (JSON / MessagePack)"""
+    if fmt == wire.MSGPACK:
+        return wire.msgpack_response(owner_dicts(owners, fields))
+    if fields:
+        return JSONResponse(owner_dicts(owners, fields))
+    return owners
+
+def owner_page_response(page: dict, fmt: str, fields: Optional[tuple] = None):
+    """Конверт со списком владельцев в запрошенном формате"""
+    if fmt == wire.MSGPACK:
+        return wire.msgpack_response({**page, "items": owner_dicts(page["items"], fields)})
+    if fields:
+        return JSONResponse({**page, "items": owner_dicts(page["items"], fields)})
+    return page
+
+def enqueue_job(kind: str, params: Optional[dict], user: AppUser):
+    """Поставить фоновую задачу (503, если очередь полна)"""
+    try:
+        return runner.submit(kind, params, created_by=user.username)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+def job_accepted(job, message: str, **extra) -> JSONResponse:
+    """Ответ 202 с job_id для опроса GET /jobs/{job_id}"""
+    body = JobAccepted(message=message, job_id=job.id).model_dump()
+    return JSONResponse(status_code=202, content={**body, **extra})
+
 # ==================== BASIC ENDPOINTS ====================
 
 @app.get("/")
@@ -262,43 +342,67 @@ def read_users_me(current_user: AppUser = Depends(get_current_user)):
 
 # ==================== CAR ENDPOINTS ====================
 
-@app.get("/cars", response_model=List[CarWithOwner])
+@app.get("/cars", response_model=Union[List[CarWithOwner], Page[CarWithOwner]])
 def get_cars(
+    request: Request,
     skip: int = Query(0, ge=0, description="Количество записей для пропуска"),
     limit: int = Query(100, ge=1, le=1000, description="Максимальное количество записей"),
-    db: Session = Depends(get_db),
+    envelope: bool = Query(False, description="Вернуть {items, next_cursor, total} вместо массива"),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    fields: Optional[str] = Query(None, description="Только эти поля через запятую (id включается всегда)"),
+    db: Session = Depends(get_read_db),
     current_user: AppUser = Depends(get_current_user)
 ):
     """Получить все автомобили с пагинацией"""
-    log.debug(f"Getting cars: skip={skip}, limit={limit}")
-    cars = CarCRUD.get_all(db, skip=skip, limit=limit)
-    return [
-        CarWithOwner(
-            id=car.id,
-            brand=car.brand,
-            model=car.model,
-            color=car.color,
-            registrationNumber=car.registrationNumber,
-            modelYear=car.modelYear,
-            price=car.price,
-            owner_id=car.owner_id,
-            owner=f"{car.owner.firstname} {car.owner.lastname}" if car.owner else None,
-            owner_firstname=car.owner.firstname if car.owner else None,
-            owner_lastname=car.owner.lastname if car.owner else None
-        )
-        for car in cars
-    ]
+    log.debug("Getting cars: skip=%s, limit=%s", skip, limit)
+    fmt = wire.negotiate(request.headers.get("accept"), allow_arrow=True)
+    selected = requested_fields(fields, CAR_FIELDS, "id")
+    if not envelope:
+        return car_list_response(CarCRUD.get_all(db, skip=skip, limit=limit, fields=selected), fmt, selected)
+
+    after_id = cursor_value(cursor, "after_id")
+    cars = CarCRUD.get_all(
+        db, skip=0 if after_id is not None else skip, limit=limit + 1, after_id=after_id, fields=selected
+    )
+    page = make_page(cars, limit, lambda items: {"after_id": items[-1].id}, CarCRUD.count_all(db))
+    return car_page_response(page, fmt, selected)
 
 @app.get("/cars/statistics")
-def get_car_statistics(db: Session = Depends(get_db)):
+@coalesce()
+def get_car_statistics(db: Session = Depends(get_read_db)):
     """Получить статистику по автомобилям"""
     log.debug("Getting car statistics")
     return CarCRUD.get_statistics(db)
 
+@app.get("/cars/by-registration/{plate}", response_model=CarWithOwner)
+def get_car_by_registration(plate: str, db: Session = Depends(get_read_db)):
+    """Автомобиль по регистрационному номеру (без учета регистра, пробелов и дефисов)"""
+    log.debug("Getting car by registration: %s", plate)
+    car = CarCRUD.get_by_registration(db, plate)
+    if not car:
+        raise HTTPException(status_code=404, detail="Автомобиль не найден")
+    return CarWithOwner.model_validate(car)
+
+@app.post("/cars/by-registration", response_model=PlateLookupResult)
+def find_cars_by_registration(
+    lookup: PlateLookup, db: Session = Depends(get_read_db), current_user: AppUser = Depends(get_current_user)
+):
+    """Пакетный поиск по номерам (до 10000 за запрос) одним IN по нормализованному номеру"""
+    log.debug("Looking up %s plates", len(lookup.plates))
+    cars = CarCRUD.find_by_registrations(db, lookup.plates)
+    found, missing = {}, []
+    for plate in lookup.plates:
+        car = cars.get(normalize_plate(plate))
+        if car is None:
+            missing.append(plate)
+        else:
+            found[plate] = CarWithOwner.model_validate(car)
+    return PlateLookupResult(found=found, missing=missing)
+
 @app.get("/cars/{car_id}", response_model=CarWithOwner)
-def get_car(car_id: int, db: Session = Depends(get_db)):
+def get_car(car_id: int, db: Session = Depends(get_read_db)):
     """Получить автомобиль по ID"""
-    log.debug(f"Getting car with ID: {car_id}")
+    log.debug("Getting car with ID: %s", car_id)
     car = CarCRUD.get_by_id(db, car_id)
     if not car:
         raise HTTPException(status_code=404, detail="Автомобиль не найден")
@@ -320,7 +424,7 @@ def get_car(car_id: int, db: Session = Depends(get_db)):
 @app.post("/cars", response_model=CarResponse)
 def create_car(car: CarCreate, db: Session = Depends(get_db), current_user: AppUser = Depends(role_required("ADMIN"))):
     """Создать новый автомобиль"""
-    log.debug(f"Creating car: {car.brand} {car.model}")
+    log.debug("Creating car: %s %s", car.brand, car.model)
     try:
         db_car = CarCRUD.create(db, car)
         # Загружаем владельца
@@ -328,14 +432,17 @@ def create_car(car: CarCreate, db: Session = Depends(get_db), current_user: AppU
         db_car = CarCRUD.get_by_id(db, db_car.id)
         return CarResponse.model_validate(db_car)
     except Exception as e:
-        log.error(f"Error creating car: {str(e)}")
+        log.error("Error creating car: %s", e)
         raise HTTPException(status_code=400, detail=f"Ошибка создания автомобиля: {str(e)}")
 
 @app.put("/cars/{car_id}", response_model=CarResponse)
 def update_car(car_id: int, car_update: CarUpdate, db: Session = Depends(get_db), current_user: AppUser = Depends(role_required("ADMIN"))):
     """Обновить автомобиль"""
-    log.debug(f"Updating car with ID: {car_id}")
-    car = CarCRUD.update(db, car_id, car_update)
+    log.debug("Updating car with ID: %s", car_id)
+    try:
+        car = CarCRUD.update(db, car_id, car_update)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not car:
         raise HTTPException(status_code=404, detail="Автомобиль не найден")
     # Загружаем владельца
@@ -345,7 +452,7 @@ def update_car(car_id: int, car_update: CarUpdate, db: Session = Depends(get_db)
 @app.delete("/cars/{car_id}", response_model=MessageResponse)
 def delete_car(car_id: int, db: Session = Depends(get_db), current_user: AppUser = Depends(role_required("ADMIN"))):
     """Удалить автомобиль"""
-    log.debug(f"Deleting car with ID: {car_id}")
+    log.debug("Deleting car with ID: %s", car_id)
     success = CarCRUD.delete(db, car_id)
     if not success:
         raise HTTPException(status_code=404, detail="Автомобиль не найден")
@@ -354,134 +461,233 @@ def delete_car(car_id: int, db: Session = Depends(get_db), current_user: AppUser
 # ==================== ADVANCED CAR QUERIES ====================
 
 @app.get("/cars/search/brand/{brand}", response_model=List[CarWithOwner])
-def find_cars_by_brand(brand: str, db: Session = Depends(get_db)):
+def find_cars_by_brand(brand: str, db: Session = Depends(get_read_db)):
     """Найти автомобили по марке"""
-    log.debug(f"Searching cars by brand: {brand}")
+    log.debug("Searching cars by brand: %s", brand)
     cars = CarCRUD.find_by_brand(db, brand)
-    return [
-        CarWithOwner(
-            id=car.id, brand=car.brand, model=car.model, color=car.color,
-            registrationNumber=car.registrationNumber, modelYear=car.modelYear,
-            price=car.price, owner_id=car.owner_id,
-            owner=f"{car.owner.firstname} {car.owner.lastname}" if car.owner else None,
-            owner_firstname=car.owner.firstname if car.owner else None,
-            owner_lastname=car.owner.lastname if car.owner else None
-        )
-        for car in cars
-    ]
+    return [CarWithOwner.model_validate(car) for car in cars]
 
 @app.get("/cars/search/color/{color}", response_model=List[CarWithOwner])
-def find_cars_by_color(color: str, db: Session = Depends(get_db)):
+def find_cars_by_color(color: str, db: Session = Depends(get_read_db)):
     """Найти автомобили по цвету"""
-    log.debug(f"Searching cars by color: {color}")
+    log.debug("Searching cars by color: %s", color)
     cars = CarCRUD.find_by_color(db, color)
-    return [
-        CarWithOwner(
-            id=car.id, brand=car.brand, model=car.model, color=car.color,
-            registrationNumber=car.registrationNumber, modelYear=car.modelYear,
-            price=car.price, owner_id=car.owner_id,
-            owner=f"{car.owner.firstname} {car.owner.lastname}" if car.owner else None,
-            owner_firstname=car.owner.firstname if car.owner else None,
-            owner_lastname=car.owner.lastname if car.owner else None
-        )
-        for car in cars
-    ]
+    return [CarWithOwner.model_validate(car) for car in cars]
 
 @app.get("/cars/search/year/{year}", response_model=List[CarWithOwner])
-def find_cars_by_year(year: int, db: Session = Depends(get_db)):
+def find_cars_by_year(year: int, db: Session = Depends(get_read_db)):
     """Найти автомобили по году выпуска"""
-    log.debug(f"Searching cars by year: {year}")
+    log.debug("Searching cars by year: %s", year)
     cars = CarCRUD.find_by_model_year(db, year)
-    return [
-        CarWithOwner(
-            id=car.id, brand=car.brand, model=car.model, color=car.color,
-            registrationNumber=car.registrationNumber, modelYear=car.modelYear,
-            price=car.price, owner_id=car.owner_id,
-            owner=f"{car.owner.firstname} {car.owner.lastname}" if car.owner else None,
-            owner_firstname=car.owner.firstname if car.owner else None,
-            owner_lastname=car.owner.lastname if car.owner else None
-        )
-        for car in cars
-    ]
+    return [CarWithOwner.model_validate(car) for car in cars]
 
 @app.get("/cars/search/price-range", response_model=List[CarWithOwner])
 def find_cars_by_price_range(
     min_price: int = Query(..., ge=0, description="Минимальная цена"),
     max_price: int = Query(..., ge=0, description="Максимальная цена"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Найти автомобили в диапазоне цен"""
-    log.debug(f"Searching cars by price range: {min_price}-{max_price}")
+    log.debug("Searching cars by price range: %s-%s", min_price, max_price)
     cars = CarCRUD.find_by_price_range(db, min_price, max_price)
-    return [
-        CarWithOwner(
-            id=car.id, brand=car.brand, model=car.model, color=car.color,
-            registrationNumber=car.registrationNumber, modelYear=car.modelYear,
-            price=car.price, owner_id=car.owner_id,
-            owner=f"{car.owner.firstname} {car.owner.lastname}" if car.owner else None,
-            owner_firstname=car.owner.firstname if car.owner else None,
-            owner_lastname=car.owner.lastname if car.owner else None
-        )
-        for car in cars
-    ]
+    return [CarWithOwner.model_validate(car) for car in cars]
 
 @app.get("/cars/search/owner/{owner_id}", response_model=List[CarWithOwner])
-def find_cars_by_owner(owner_id: int, db: Session = Depends(get_db)):
+def find_cars_by_owner(owner_id: int, db: Session = Depends(get_read_db)):
     """Найти автомобили по владельцу"""
-    log.debug(f"Searching cars by owner ID: {owner_id}")
+    log.debug("Searching cars by owner ID: %s", owner_id)
     cars = CarCRUD.find_by_owner(db, owner_id)
-    return [
-        CarWithOwner(
-            id=car.id, brand=car.brand, model=car.model, color=car.color,
-            registrationNumber=car.registrationNumber, modelYear=car.modelYear,
-            price=car.price, owner_id=car.owner_id,
-            owner=f"{car.owner.firstname} {car.owner.lastname}" if car.owner else None,
-            owner_firstname=car.owner.firstname if car.owner else None,
-            owner_lastname=car.owner.lastname if car.owner else None
-        )
-        for car in cars
-    ]
+    return [CarWithOwner.model_validate(car) for car in cars]
 
-@app.post("/cars/search", response_model=List[CarWithOwner])
-def search_cars(query: CarQuery, db: Session = Depends(get_db)):
+@app.post("/cars/search", response_model=Union[List[CarWithOwner], Page[CarWithOwner]])
+def search_cars(
+    query: CarQuery,
+    request: Request,
+    envelope: bool = Query(False, description="Вернуть {items, next_cursor, total} вместо массива"),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    fields: Optional[str] = Query(None, description="Только эти поля через запятую (id включается всегда)"),
+    db: Session = Depends(get_read_db)
+):
     """Продвинутый поиск автомобилей с фильтрацией и сортировкой"""
-    log.debug(f"Advanced car search: {query.model_dump()}")
-    cars = CarCRUD.search_cars(db, query)
-    return [
-        CarWithOwner(
-            id=car.id, brand=car.brand, model=car.model, color=car.color,
-            registrationNumber=car.registrationNumber, modelYear=car.modelYear,
-            price=car.price, owner_id=car.owner_id,
-            owner=f"{car.owner.firstname} {car.owner.lastname}" if car.owner else None,
-            owner_firstname=car.owner.firstname if car.owner else None,
-            owner_lastname=car.owner.lastname if car.owner else None
-        )
-        for car in cars
-    ]
+    log.debug("Advanced car search: %s", query)
+    fmt = wire.negotiate(request.headers.get("accept"), allow_arrow=True)
+    selected = requested_fields(fields, CAR_FIELDS, "id")
+    if not envelope:
+        return car_list_response(CarCRUD.search_cars(db, query, selected), fmt, selected)
+
+    offset = cursor_value(cursor, "offset")
+    offset = query.offset if offset is None else offset
+    cars = CarCRUD.search_cars(db, query.model_copy(update={"offset": offset, "limit": query.limit + 1}), selected)
+    page = make_page(cars, query.limit, lambda items: {"offset": offset + len(items)}, CarCRUD.count_search(db, query))
+    return car_page_response(page, fmt, selected)
+
+@app.get("/autocomplete")
+def autocomplete(
+    field: str = Query(..., pattern=f"^({'|'.join(AUTOCOMPLETE_FIELDS)})$"),
+    prefix: str = Query("", max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    current_user: AppUser = Depends(get_current_user),
+):
+    """Подсказки по префиксу (без учета регистра) из индекса в памяти, частые значения первыми.
+
+    Только для вошедших пользователей: field=owner раскрывает имена владельцев, как /owners.
+    """
+    return {"field": field, "prefix": prefix, "items": autocomplete_index.suggest(field, prefix, limit)}
+
+# ==================== CHANGE FEED ====================
+
+def change_entities(entities: Optional[str]) -> tuple:
+    """?entities=car,owner -> кортеж сущностей или 400"""
+    if not entities:
+        return CHANGE_ENTITIES
+    selected = tuple(e.strip() for e in entities.split(",") if e.strip())
+    unknown = set(selected) - set(CHANGE_ENTITIES)
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Неизвестные сущности: {', '.join(sorted(unknown)) or entities}")
+    return selected
+
+def sse_message(change: dict) -> str:
+    if change is RESET:
+        return f"event: reset\ndata: {{}}\n\n"
+    data = json.dumps(change, default=str, ensure_ascii=False)
+    return f"id: {change['id']}\nevent: {change['entity']}.{change['action']}\ndata: {data}\n\n"
+
+@app.get("/changes/stream")
+async def changes_stream(
+    request: Request,
+    entities: Optional[str] = Query(None, description="car,owner"),
+    last_event_id: Optional[str] = Query(None, description="Альтернатива заголовку Last-Event-ID"),
+    payload: dict = Depends(get_token_payload),
+):
+    """Server-Sent Events: создание/изменение/удаление автомобилей и владельцев.
+
+    Возобновление по Last-Event-ID; event: reset - история потеряна, данные нужно перечитать.
+    """
+    selected = change_entities(entities)
+    resume_from = request.headers.get("last-event-id") or last_event_id
+
+    async def stream():
+        # Переподключение EventSource через 3 с; пустое событие сразу отдает заголовки
+        yield f"retry: 3000\n: connected {change_feed.last_event_id}\n\n"
+        async for change in change_feed.subscribe(resume_from, selected):
+            yield ": ping\n\n" if change is None else sse_message(change)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/changes/ws")
+async def changes_ws(websocket: WebSocket, entities: Optional[str] = None, last_event_id: Optional[str] = None):
+    """Та же лента по WebSocket: JSON-сообщения, {"type": "reset"} и {"type": "ping"}"""
+    token = connection_token(websocket)
+    try:
+        decode_access_token(token or "")
+        selected = change_entities(entities)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    try:
+        async for change in change_feed.subscribe(last_event_id, selected):
+            await websocket.send_text(json.dumps({"type": "ping"} if change is None else change, default=str, ensure_ascii=False))
+    except WebSocketDisconnect:
+        pass
+
+@app.post("/cars/facets", response_model=CarFacets)
+def car_facets(query: CarQuery, db: Session = Depends(get_read_db)):
+    """Счетчики по марке, цвету, году и ценовым диапазонам для фильтров поиска (одним запросом)"""
+    log.debug("Car facets: %s", query)
+    return CarCRUD.facets(db, query)
+
+@app.post("/cars/import", status_code=202, response_model=JobAccepted)
+def import_cars(cars: List[CarCreate], current_user: AppUser = Depends(role_required("ADMIN"))):
+    """Массовый импорт автомобилей фоновой задачей"""
+    log.debug("Importing %s cars", len(cars))
+    if not cars:
+        raise HTTPException(status_code=400, detail="Пустой список автомобилей")
+    job = enqueue_job("import_cars", {"cars": [car.model_dump() for car in cars]}, current_user)
+    return job_accepted(job, f"Импорт {len(cars)} автомобилей поставлен в очередь")
+
+@app.get("/export/cars")
+def export_cars(
+    request: Request,
+    fields: Optional[str] = Query(None, description="Только эти поля через запятую (id включается всегда)"),
+    current_user: AppUser = Depends(get_current_user)
+):
+    """Потоковая выгрузка всех автомобилей.
+
+    Accept: application/vnd.apache.arrow.stream - Arrow IPC stream (батч на чанк),
+    application/msgpack - последовательность MessagePack-массивов (массив на чанк),
+    иначе - JSON-массив. Строки читаются чанками по EXPORT_CHUNK_SIZE.
+    """
+    log.debug("Exporting cars")
+    fmt = wire.negotiate(request.headers.get("accept"), allow_arrow=True)
+    selected = requested_fields(fields, CAR_FIELDS, "id")
+    columns = selected or CAR_FIELDS
+    prefer_primary = wants_primary(request)
+
+    def chunks():
+        # Сессия живет столько же, сколько поток ответа
+        with read_session(prefer_primary) as db:
+            yield from CarCRUD.iter_all(db, EXPORT_CHUNK_SIZE, selected)
+
+    if fmt == wire.ARROW:
+        body = wire.iter_arrow_stream(chunks(), columns)
+    elif fmt == wire.MSGPACK:
+        body = (wire.encode_msgpack(wire.car_dicts(chunk, columns)) for chunk in chunks())
+    else:
+        def json_body():
+            yield b"["
+            first = True
+            for chunk in chunks():
+                if not chunk:
+                    continue
+                yield (b"" if first else b",") + json.dumps(wire.car_dicts(chunk, columns), ensure_ascii=False)[1:-1].encode()
+                first = False
+            yield b"]"
+        body = json_body()
+    return StreamingResponse(body, media_type=fmt)
 
 # ==================== OWNER ENDPOINTS ====================
 
-@app.get("/owners", response_model=List[OwnerResponse])
+@app.get("/owners", response_model=Union[List[OwnerResponse], Page[OwnerResponse]])
 def get_owners(
+    request: Request,
     skip: int = Query(0, ge=0, description="Количество записей для пропуска"),
     limit: int = Query(100, ge=1, le=1000, description="Максимальное количество записей"),
-    db: Session = Depends(get_db),
+    envelope: bool = Query(False, description="Вернуть {items, next_cursor, total} вместо массива"),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    fields: Optional[str] = Query(None, description="Только эти поля через запятую (ownerid включается всегда)"),
+    db: Session = Depends(get_read_db),
     current_user: AppUser = Depends(get_current_user)
 ):
     """Получить всех владельцев с пагинацией"""
-    log.debug(f"Getting owners: skip={skip}, limit={limit}")
-    return OwnerCRUD.get_all(db, skip=skip, limit=limit)
+    log.debug("Getting owners: skip=%s, limit=%s", skip, limit)
+    fmt = wire.negotiate(request.headers.get("accept"))
+    selected = requested_fields(fields, OWNER_FIELDS, "ownerid")
+    if not envelope:
+        return owner_list_response(OwnerCRUD.get_all(db, skip=skip, limit=limit, fields=selected), fmt, selected)
+
+    after_id = cursor_value(cursor, "after_id")
+    owners = OwnerCRUD.get_all(
+        db, skip=0 if after_id is not None else skip, limit=limit + 1, after_id=after_id, fields=selected
+    )
+    page = make_page(owners, limit, lambda items: {"after_id": items[-1].ownerid}, OwnerCRUD.count_all(db))
+    return owner_page_response(page, fmt, selected)
 
 @app.get("/owners/statistics")
-def get_owner_statistics(db: Session = Depends(get_db), current_user: AppUser = Depends(get_current_user)):
+@coalesce()
+def get_owner_statistics(db: Session = Depends(get_read_db), current_user: AppUser = Depends(get_current_user)):
     """Получить статистику по владельцам с количеством автомобилей"""
     log.debug("Getting owner statistics")
     return OwnerCRUD.get_owners_with_car_count(db)
 
 @app.get("/owners/{owner_id}", response_model=OwnerResponse)
-def get_owner(owner_id: int, db: Session = Depends(get_db), current_user: AppUser = Depends(get_current_user)):
+def get_owner(owner_id: int, db: Session = Depends(get_read_db), current_user: AppUser = Depends(get_current_user)):
     """Получить владельца по ID"""
-    log.debug(f"Getting owner with ID: {owner_id}")
+    log.debug("Getting owner with ID: %s", owner_id)
     owner = OwnerCRUD.get_by_id(db, owner_id)
     if not owner:
         raise HTTPException(status_code=404, detail="Владелец не найден")
@@ -490,38 +696,60 @@ def get_owner(owner_id: int, db: Session = Depends(get_db), current_user: AppUse
 @app.post("/owners", response_model=OwnerResponse)
 def create_owner(owner: OwnerCreate, db: Session = Depends(get_db), current_user: AppUser = Depends(role_required("ADMIN"))):
     """Создать нового владельца"""
-    log.debug(f"Creating owner: {owner.firstname} {owner.lastname}")
+    log.debug("Creating owner: %s %s", owner.firstname, owner.lastname)
     return OwnerCRUD.create(db, owner)
 
 @app.put("/owners/{owner_id}", response_model=OwnerResponse)
 def update_owner(owner_id: int, owner_update: OwnerUpdate, db: Session = Depends(get_db), current_user: AppUser = Depends(role_required("ADMIN"))):
     """Обновить владельца"""
-    log.debug(f"Updating owner with ID: {owner_id}")
+    log.debug("Updating owner with ID: %s", owner_id)
     owner = OwnerCRUD.update(db, owner_id, owner_update)
     if not owner:
         raise HTTPException(status_code=404, detail="Владелец не найден")
     return owner
 
-@app.delete("/owners/{owner_id}", response_model=MessageResponse)
+@app.delete("/owners/{owner_id}", response_model=MessageResponse, responses={202: {"model": JobAccepted}})
 def delete_owner(owner_id: int, db: Session = Depends(get_db), current_user: AppUser = Depends(role_required("ADMIN"))):
     """Удалить владельца (с каскадным удалением автомобилей)"""
-    log.debug(f"Deleting owner with ID: {owner_id}")
+    log.debug("Deleting owner with ID: %s", owner_id)
+    if OwnerCRUD.count_cars(db, owner_id) > OWNER_DELETE_INLINE_LIMIT:
+        # Каскадный DELETE большого парка идет в фоновой задаче, чтобы не держать воркер запроса;
+        # владелец существует - у него есть автомобили
+        job = enqueue_job("delete_owner", {"owner_id": owner_id}, current_user)
+        return job_accepted(job, "Удаление владельца поставлено в очередь")
     success = OwnerCRUD.delete(db, owner_id)
     if not success:
         raise HTTPException(status_code=404, detail="Владелец не найден")
     return MessageResponse(message="Владелец и все его автомобили успешно удалены")
 
 @app.get("/owners/search/{search_term}", response_model=List[OwnerResponse])
-def search_owners_by_term(search_term: str, db: Session = Depends(get_db), current_user: AppUser = Depends(get_current_user)):
+def search_owners_by_term(search_term: str, db: Session = Depends(get_read_db), current_user: AppUser = Depends(get_current_user)):
     """Найти владельцев по любому полю (имя или фамилия)"""
-    log.debug(f"Searching owners by term: {search_term}")
+    log.debug("Searching owners by term: %s", search_term)
     return OwnerCRUD.search_by_any_field(db, search_term)
 
-@app.post("/owners/search", response_model=List[OwnerResponse])
-def search_owners(query: OwnerQuery, db: Session = Depends(get_db), current_user: AppUser = Depends(get_current_user)):
+@app.post("/owners/search", response_model=Union[List[OwnerResponse], Page[OwnerResponse]])
+def search_owners(
+    query: OwnerQuery,
+    request: Request,
+    envelope: bool = Query(False, description="Вернуть {items, next_cursor, total} вместо массива"),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    fields: Optional[str] = Query(None, description="Только эти поля через запятую (ownerid включается всегда)"),
+    db: Session = Depends(get_read_db),
+    current_user: AppUser = Depends(get_current_user)
+):
     """Продвинутый поиск владельцев с фильтрацией и сортировкой"""
-    log.debug(f"Advanced owner search: {query.model_dump()}")
-    return OwnerCRUD.search_owners(db, query)
+    log.debug("Advanced owner search: %s", query)
+    fmt = wire.negotiate(request.headers.get("accept"))
+    selected = requested_fields(fields, OWNER_FIELDS, "ownerid")
+    if not envelope:
+        return owner_list_response(OwnerCRUD.search_owners(db, query, selected), fmt, selected)
+
+    offset = cursor_value(cursor, "offset")
+    offset = query.offset if offset is None else offset
+    owners = OwnerCRUD.search_owners(db, query.model_copy(update={"offset": offset, "limit": query.limit + 1}), selected)
+    page = make_page(owners, query.limit, lambda items: {"offset": offset + len(items)}, OwnerCRUD.count_search(db, query))
+    return owner_page_response(page, fmt, selected)
 
 # ==================== USER MANAGEMENT ENDPOINTS ====================
 
@@ -533,14 +761,14 @@ def get_all_users(
     current_user: AppUser = Depends(role_required("ADMIN"))
 ):
     """Получить список всех пользователей (только для администраторов)"""
-    log.debug(f"Getting all users: skip={skip}, limit={limit}")
+    log.debug("Getting all users: skip=%s, limit=%s", skip, limit)
     users = db.query(AppUser).offset(skip).limit(limit).all()
     return users
 
 @app.get("/admin/users/{user_id}", response_model=UserResponse)
 def get_user_by_id(user_id: int, db: Session = Depends(get_db), current_user: AppUser = Depends(role_required("ADMIN"))):
     """Получить пользователя по ID (только для администраторов)"""
-    log.debug(f"Getting user by ID: {user_id}")
+    log.debug("Getting user by ID: %s", user_id)
     user = db.query(AppUser).filter(AppUser.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
@@ -554,7 +782,7 @@ def update_user(
     current_user: AppUser = Depends(role_required("ADMIN"))
 ):
     """Обновить пользователя (только для администраторов)"""
-    log.debug(f"Updating user {user_id}: {user_update}")
+    log.debug("Updating user %s: %s", user_id, user_update)
     user = db.query(AppUser).filter(AppUser.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
@@ -571,7 +799,7 @@ def update_user(
 @app.delete("/admin/users/{user_id}", response_model=MessageResponse)
 def delete_user(user_id: int, db: Session = Depends(get_db), current_user: AppUser = Depends(role_required("ADMIN"))):
     """Удалить пользователя (только для администраторов)"""
-    log.debug(f"Deleting user: {user_id}")
+    log.debug("Deleting user: %s", user_id)
     user = db.query(AppUser).filter(AppUser.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
@@ -587,145 +815,281 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: AppUs
 # ==================== ANALYTICS ENDPOINTS ====================
 
 @app.get("/analytics/overview")
-def get_analytics_overview(db: Session = Depends(get_db), current_user: AppUser = Depends(get_current_user)):
+@coalesce()
+def get_analytics_overview(db: Session = Depends(get_read_db), current_user: AppUser = Depends(get_current_user)):
     """Получить общую аналитику системы"""
     log.debug("Getting analytics overview")
-    
-    # Подсчитываем статистику
-    total_cars = db.query(Car).count()
-    total_owners = db.query(Owner).count()
-    total_users = db.query(AppUser).count()
-    
-    # Средняя цена автомобилей
-    avg_price_result = db.query(func.avg(Car.price)).scalar()
-    avg_price = float(avg_price_result) if avg_price_result else 0
-    
-    # Самый дорогой автомобиль
-    most_expensive_car = db.query(Car).order_by(Car.price.desc()).first()
-    
-    # Статистика по владельцам
-    owners_with_cars = db.query(Owner).join(Car).distinct().count()
-    
-    return {
-        "total_cars": total_cars,
-        "total_owners": total_owners,
-        "total_users": total_users,
-        "average_car_price": round(avg_price, 2),
-        "most_expensive_car": {
-            "brand": most_expensive_car.brand if most_expensive_car else None,
-            "model": most_expensive_car.model if most_expensive_car else None,
-            "price": most_expensive_car.price if most_expensive_car else 0
-        } if most_expensive_car else None,
-        "owners_with_cars": owners_with_cars,
-        "owners_without_cars": total_owners - owners_with_cars
-    }
+    cached = analytics.cached_section(db, "overview")
+    return cached if cached is not None else analytics.overview(db)
 
 @app.get("/analytics/cars-by-year")
-def get_cars_by_year(db: Session = Depends(get_db), current_user: AppUser = Depends(get_current_user)):
+@coalesce()
+def get_cars_by_year(db: Session = Depends(get_read_db), current_user: AppUser = Depends(get_current_user)):
     """Получить статистику автомобилей по годам"""
     log.debug("Getting cars by year statistics")
-    
-    # Группируем автомобили по годам
-    year_stats = db.query(
-        Car.modelYear,
-        func.count(Car.id).label('count'),
-        func.avg(Car.price).label('avg_price')
-    ).group_by(Car.modelYear).order_by(Car.modelYear).all()
-    
-    return [
-        {
-            "year": stat.modelYear,
-            "count": stat.count,
-            "average_price": round(float(stat.avg_price), 2) if stat.avg_price else 0
-        }
-        for stat in year_stats
-    ]
+    cached = analytics.cached_section(db, "cars_by_year")
+    return cached if cached is not None else analytics.cars_by_year(db)
 
 @app.get("/analytics/owners-stats")
-def get_owners_statistics(db: Session = Depends(get_db), current_user: AppUser = Depends(get_current_user)):
+@coalesce()
+def get_owners_statistics(db: Session = Depends(get_read_db), current_user: AppUser = Depends(get_current_user)):
     """Получить статистику владельцев"""
     log.debug("Getting owners statistics")
-    
-    # Владельцы с количеством автомобилей
-    owner_stats = db.query(
-        Owner.ownerid,
-        Owner.firstname,
-        Owner.lastname,
-        func.count(Car.id).label('car_count')
-    ).outerjoin(Car).group_by(Owner.ownerid, Owner.firstname, Owner.lastname).all()
-    
-    return [
-        {
-            "owner_id": stat.ownerid,
-            "name": f"{stat.firstname} {stat.lastname}",
-            "car_count": stat.car_count
-        }
-        for stat in owner_stats
-    ]
+    cached = analytics.cached_section(db, "owners_stats")
+    return cached if cached is not None else analytics.owners_stats(db)
+
+def parse_quantiles(quantiles: Optional[str]) -> tuple:
+    """?quantiles=0.5,0.9,0.99 -> кортеж долей в (0, 1) или 400"""
+    if not quantiles:
+        return DEFAULT_QUANTILES
+    try:
+        values = tuple(float(q) for q in quantiles.split(",") if q.strip())
+    except ValueError:
+        values = ()
+    if not values or len(values) > 20 or any(not 0 < q < 1 for q in values):
+        raise HTTPException(status_code=400, detail="quantiles: от 1 до 20 чисел в интервале (0, 1) через запятую")
+    return values
+
+@app.get("/analytics/price-distribution")
+@coalesce()
+def get_price_distribution(
+    group_by: str = Query("brand", pattern=f"^({'|'.join(DISTRIBUTION_GROUP_BY)})$"),
+    brand: Optional[str] = Query(None, max_length=100),
+    modelYear: Optional[int] = Query(None),
+    quantiles: Optional[str] = Query(None, description="0.5,0.9,0.99"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: AppUser = Depends(get_current_user),
+):
+    """Приблизительные квантили и гистограммы цен по маркам/годам из скетчей в памяти"""
+    log.debug("Getting price distribution by %s", group_by)
+    return price_distributions.distribution(
+        DISTRIBUTION_GROUP_BY[group_by], brand, modelYear, parse_quantiles(quantiles), limit
+    )
+
+def csv_choice(value: Optional[str], allowed: tuple, name: str) -> tuple:
+    """?name=a,b -> кортеж без повторов из allowed или 400"""
+    selected = tuple(dict.fromkeys(v.strip() for v in (value or "").split(",") if v.strip()))
+    unknown = set(selected) - set(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"{name}: неизвестные значения {', '.join(sorted(unknown))}; допустимы {', '.join(allowed)}"
+        )
+    return selected
+
+@app.get("/analytics/pivot")
+@coalesce()
+def get_pivot(
+    rows: Optional[str] = Query("brand", description="Измерения строк через запятую: " + ",".join(PIVOT_DIMENSIONS)),
+    cols: Optional[str] = Query(None, description="Измерения столбцов через запятую"),
+    measure: Optional[str] = Query("count", description="Меры по цене через запятую: " + ",".join(PIVOT_MEASURES)),
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: AppUser = Depends(get_current_user),
+):
+    """Сводная таблица автомобилей (count/sum/avg/min/max цены) по колоночному снимку в памяти"""
+    row_keys = csv_choice(rows, PIVOT_DIMENSIONS, "rows")
+    col_keys = csv_choice(cols, PIVOT_DIMENSIONS, "cols")
+    measures = csv_choice(measure, PIVOT_MEASURES, "measure") or ("count",)
+    if set(row_keys) & set(col_keys):
+        raise HTTPException(status_code=400, detail="Измерение не может быть одновременно в rows и cols")
+    log.debug("Pivot rows=%s cols=%s measures=%s", row_keys, col_keys, measures)
+    try:
+        return pivot_engine.pivot(row_keys, col_keys, measures, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/analytics/rebuild", status_code=202, response_model=JobAccepted)
+def rebuild_analytics(current_user: AppUser = Depends(role_required("ADMIN"))):
+    """Пересчитать снимок аналитики в фоне (только для администраторов)"""
+    log.debug("Rebuilding analytics snapshot")
+    job = enqueue_job("analytics_rebuild", None, current_user)
+    return job_accepted(job, "Пересчет аналитики поставлен в очередь")
+
+# ==================== SYNC ENDPOINTS ====================
+
+@app.get("/sync/changes", response_model=SyncPage)
+def sync_changes(
+    since: int = Query(..., ge=0, description="next_since предыдущей страницы; 0 - первая синхронизация"),
+    limit: int = Query(sync.SYNC_PAGE_SIZE, ge=1, le=sync.SYNC_MAX_PAGE_SIZE),
+    entities: Optional[str] = Query(None, description="car,owner"),
+    db: Session = Depends(get_read_db),
+    current_user: AppUser = Depends(get_current_user),
+):
+    """Изменения автомобилей и владельцев после версии since (сжатые, с надгробиями удалений)"""
+    log.debug("Sync changes since %s", since)
+    return sync.changes_since(db, since, limit, change_entities(entities))
+
+@app.post("/sync/compact", status_code=202, response_model=JobAccepted)
+def compact_sync_log(current_user: AppUser = Depends(role_required("ADMIN"))):
+    """Сжать журнал изменений в фоне (только для администраторов)"""
+    job = enqueue_job("sync_compact", None, current_user)
+    return job_accepted(job, "Сжатие журнала изменений поставлено в очередь")
 
 # ==================== SYSTEM SETTINGS ENDPOINTS ====================
 
 @app.get("/settings")
-def get_system_settings(db: Session = Depends(get_db), current_user: AppUser = Depends(role_required("ADMIN"))):
+def get_system_settings(current_user: AppUser = Depends(role_required("ADMIN"))):
     """Получить настройки системы (только для администраторов)"""
     log.debug("Getting system settings")
-    
-    # Здесь можно добавить настройки из базы данных или конфигурационных файлов
-    return {
-        "system_name": "Car Management System",
-        "version": "1.0.0",
-        "max_cars_per_owner": 10,
-        "max_users": 1000,
-        "maintenance_mode": False,
-        "registration_enabled": True,
-        "admin_notifications": True
-    }
+    return system_settings.snapshot()
 
 @app.put("/settings")
 def update_system_settings(
     settings: dict,
-    db: Session = Depends(get_db),
     current_user: AppUser = Depends(role_required("ADMIN"))
 ):
     """Обновить настройки системы (только для администраторов)"""
-    log.debug(f"Updating system settings: {settings}")
-    
-    # Здесь можно сохранить настройки в базу данных
-    # Пока что просто возвращаем обновленные настройки
+    log.debug("Updating system settings: %s", settings)
+    try:
+        updated = system_settings.update(settings, updated_by=current_user.username)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
         "message": "Настройки системы обновлены",
-        "updated_settings": settings
+        "updated_settings": settings,
+        "settings": updated,
+        "settings_version": system_settings.version,
     }
 
-@app.get("/settings/backup")
-def create_system_backup(db: Session = Depends(get_db), current_user: AppUser = Depends(role_required("ADMIN"))):
-    """Создать резервную копию системы (только для администраторов)"""
+@app.get("/settings/backup", status_code=202, response_model=JobAccepted)
+def create_system_backup(current_user: AppUser = Depends(role_required("ADMIN"))):
+    """Создать резервную копию системы в фоне (только для администраторов)"""
     log.debug("Creating system backup")
-    
-    # Здесь можно добавить логику создания резервной копии
-    return {
-        "message": "Резервная копия создана",
-        "backup_id": f"backup_{int(time.time())}",
-        "created_at": datetime.now().isoformat()
-    }
+    # Имя архива выдается заранее: по нему работают restore и список бэкапов, когда задача
+    # (GET /jobs/{job_id}) завершится
+    backup_id = new_backup_id()
+    job = enqueue_job("backup", {"backup_id": backup_id}, current_user)
+    return job_accepted(job, "Резервная копия поставлена в очередь", backup_id=backup_id)
+
+@app.get("/settings/backups")
+def get_system_backups(current_user: AppUser = Depends(role_required("ADMIN"))):
+    """Список готовых резервных копий (только для администраторов)"""
+    return [
+        {key: manifest[key] for key in ("backup_id", "created_at", "rows", "bytes", "codec", "rows_per_sec")}
+        for manifest in list_backups()
+    ]
+
+@app.post("/settings/restore/{backup_id}", status_code=202, response_model=JobAccepted)
+def restore_system_backup(backup_id: str, current_user: AppUser = Depends(role_required("ADMIN"))):
+    """Восстановить базу из резервной копии в фоне (только для администраторов)"""
+    log.debug("Restoring system backup %s", backup_id)
+    try:
+        # Манифест пишется последним: без него архив еще создается или поврежден
+        exists = os.path.isfile(os.path.join(backup_path(backup_id), MANIFEST))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not exists:
+        raise HTTPException(status_code=404, detail="Резервная копия не найдена или еще не готова")
+    job = enqueue_job("restore", {"backup_id": backup_id}, current_user)
+    return job_accepted(job, "Восстановление поставлено в очередь")
 
 @app.get("/settings/logs")
 def get_system_logs(
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db),
+    level: Optional[str] = Query(None, description="Минимальный уровень: DEBUG, INFO, WARNING, ERROR"),
+    route: Optional[str] = Query(None, description="Шаблон маршрута, например /cars/{car_id}"),
+    request_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_duration_ms: Optional[float] = Query(None, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor прошлого ответа - только новые записи"),
     current_user: AppUser = Depends(role_required("ADMIN"))
 ):
-    """Получить логи системы (только для администраторов)"""
-    log.debug(f"Getting system logs: limit={limit}")
-    
-    # Здесь можно добавить логику получения логов
+    """Последние записи логов из кольцевого буфера процесса (только для администраторов)"""
+    log.debug("Getting system logs: limit=%s", limit)
+    if log_buffer is None:
+        raise HTTPException(status_code=404, detail="Буфер логов выключен (LOG_BUFFER_SIZE=0)")
+    min_level = logging.NOTSET
+    if level:
+        min_level = logging.getLevelName(level.upper())
+        if not isinstance(min_level, int):
+            raise HTTPException(status_code=400, detail=f"Неизвестный уровень: {level}")
+    result = log_buffer.query(
+        after=cursor_value(cursor, "id"),
+        level=min_level,
+        route=route,
+        request_id=request_id,
+        since=epoch_seconds(since),
+        until=epoch_seconds(until),
+        min_duration_ms=min_duration_ms,
+        limit=limit,
+    )
     return {
         "message": "Логи системы",
-        "logs": [
-            {
-                "timestamp": datetime.now().isoformat(),
-                "level": "INFO",
-                "message": "Система запущена"
-            }
-        ]
-    }
\ No newline at end of file
+        "logs": result["items"],
+        "next_cursor": encode_cursor({"id": result["next_id"]}),
+        "truncated": result["truncated"],
+        "buffer_size": log_buffer.capacity,
+        "dropped": dropped_records(),
+    }
+
+def epoch_seconds(value: Optional[datetime]) -> Optional[float]:
+    """datetime из query (без зоны - UTC) в секунды epoch"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+@app.get("/settings/slow-queries")
+def get_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    sort: str = Query("total_ms", pattern="^(total_ms|mean_ms|max_ms|count)$"),
+    current_user: AppUser = Depends(role_required("ADMIN"))
+):
+    """Самые тяжелые медленные SQL-запросы по отпечаткам, с планами EXPLAIN (только для администраторов)"""
+    log.debug("Getting slow queries: limit=%s sort=%s", limit, sort)
+    return {
+        "message": "Медленные запросы",
+        "threshold_ms": slow_queries.threshold_ms,
+        "fingerprints": len(slow_queries),
+        "queries": slow_queries.top(limit, sort),
+    }
+
+@app.delete("/settings/slow-queries")
+def reset_slow_queries(current_user: AppUser = Depends(role_required("ADMIN"))):
+    """Очистить статистику медленных запросов этого воркера"""
+    slow_queries.reset()
+    return {"message": "Статистика медленных запросов очищена"}
+
+# ==================== PROFILING ====================
+
+@app.get("/profiles")
+def get_profiles(current_user: AppUser = Depends(role_required("ADMIN"))):
+    """Сохраненные профили запросов (только для администраторов)"""
+    return list_reports()
+
+@app.get("/profiles/{profile_id}")
+def get_profile(
+    profile_id: str,
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+    current_user: AppUser = Depends(role_required("ADMIN"))
+):
+    """Профиль запроса: JSON с SQL и стеками или collapsed-стеки для flamegraph"""
+    try:
+        report = load_report(profile_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if report is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    if format == "collapsed":
+        return PlainTextResponse("\n".join(report["collapsed"]) + "\n")
+    return report
+
+# ==================== BACKGROUND JOBS ====================
+
+@app.get("/jobs", response_model=List[JobResponse])
+def list_jobs(
+    limit: int = Query(50, ge=1, le=500),
+    kind: Optional[str] = Query(None, description="Фильтр по типу задачи"),
+    current_user: AppUser = Depends(role_required("ADMIN"))
+):
+    """Последние фоновые задачи (только для администраторов)"""
+    return recent_jobs(limit, kind)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job_status(job_id: str, current_user: AppUser = Depends(role_required("ADMIN"))):
+    """Статус и прогресс фоновой задачи (только для администраторов)"""
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
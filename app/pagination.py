@@ -0,0 +1,102 @@
+import base64
+import json
+import os
+import threading
+import time
+from typing import Optional, Tuple
+from sqlalchemy import Select, func, select, table as table_clause, text
+from sqlalchemy.orm import Session
+
+# ==================== CURSORS ====================
+
+def encode_cursor(data: dict) -> str:
+    """Непрозрачный курсор для next_cursor"""
+    raw = json.dumps(data, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    """Разобрать курсор, ValueError если он поврежден"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Некорректный cursor: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("Некорректный cursor")
+    return data
+
+# ==================== TOTALS ====================
+
+# До этого порога total считается точно (COUNT по отфильтрованному набору с LIMIT)
+EXACT_COUNT_LIMIT = int(os.getenv("EXACT_COUNT_LIMIT", "10000"))
+# Сколько секунд живет закэшированный COUNT(*) по целой таблице
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "30"))
+
+_count_cache: dict = {}
+_count_lock = threading.Lock()
+
+def invalidate_counts(*tables: str) -> None:
+    """Сбросить закэшированные COUNT(*) после записи в таблицы"""
+    with _count_lock:
+        for table in tables:
+            _count_cache.pop(table, None)
+
+def _cached_table_count(db: Session, table: str) -> int:
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(table)
+        if cached and cached[1] > now:
+            return cached[0]
+    value = db.execute(select(func.count()).select_from(table_clause(table))).scalar_one()
+    with _count_lock:
+        _count_cache[table] = (value, now + COUNT_CACHE_TTL)
+    return value
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+def table_total(db: Session, table: str) -> Tuple[int, bool]:
+    """Число строк в таблице без фильтров: (total, is_estimate).
+
+    На PostgreSQL большие таблицы оцениваются по pg_class.reltuples (без
+    сканирования), маленькие и прочие СУБД - закэшированный COUNT(*).
+    """
+    if _is_postgres(db):
+        estimate = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": table},
+        ).scalar()
+        # reltuples = -1, пока таблица не проанализирована
+        if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+            return int(estimate), True
+    return _cached_table_count(db, table), False
+
+def _explain_rows(db: Session, stmt: Select, params: Optional[dict]) -> Optional[int]:
+    compiled = stmt.compile(dialect=db.get_bind().dialect)
+    plan = db.connection().exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + compiled.string, compiled.construct_params(params or {})
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    try:
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except (KeyError, IndexError, TypeError):
+        return None
+
+def filtered_total(db: Session, stmt: Select, params: Optional[dict] = None) -> Tuple[int, bool]:
+    """Число строк отфильтрованного SELECT: (total, is_estimate).
+
+    Считает точно, но не дальше EXACT_COUNT_LIMIT + 1 строки; если набор больше,
+    на PostgreSQL берется оценка планировщика (EXPLAIN), иначе нижняя граница.
+    stmt не должен содержать LIMIT/OFFSET.
+    """
+    bounded = stmt.with_only_columns(stmt.selected_columns[0]).order_by(None).limit(EXACT_COUNT_LIMIT + 1)
+    count_stmt = select(func.count()).select_from(bounded.subquery())
+    counted = db.execute(count_stmt, params or {}).scalar_one()
+    if counted <= EXACT_COUNT_LIMIT:
+        return counted, False
+    if _is_postgres(db):
+        estimate = _explain_rows(db, stmt.order_by(None), params)
+        if estimate is not None:
+            return max(estimate, counted), True
+    return counted, True
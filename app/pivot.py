@@ -0,0 +1,274 @@
+import logging
+import os
+import threading
+import time
+from array import array
+from datetime import datetime
+from itertools import repeat
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import select
+from .db import SessionLocal
+from .models import Car, Owner
+from .sync import current_version
+
+# Колонки Arrow и группировка в C++ (Table.group_by), pyarrow - в requirements.txt; без пакета -
+# запасной вариант: колонки в array и группировка построчным проходом Python
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover
+    pa = None
+
+log = logging.getLogger(__name__)
+
+# ==================== CONFIG ====================
+
+# Как часто проверять журнал изменений и перестраивать снимок, если были записи (0 - только при старте)
+PIVOT_REFRESH_INTERVAL = float(os.getenv("PIVOT_REFRESH_INTERVAL", "60"))
+# Предел числа столбцов сводной таблицы (комбинаций значений cols)
+PIVOT_MAX_COLUMNS = int(os.getenv("PIVOT_MAX_COLUMNS", "200"))
+PIVOT_REBUILD_CHUNK = 50000
+
+DIMENSIONS = ("brand", "model", "color", "modelYear", "owner")
+MEASURES = ("count", "sum", "avg", "min", "max")
+_STRING_DIMENSIONS = ("brand", "model", "color", "owner")
+# Имя агрегата Arrow для меры по price
+_ARROW_AGGREGATES = {"sum": "sum", "avg": "mean", "min": "min", "max": "max"}
+
+# ==================== SNAPSHOT ====================
+
+class Snapshot:
+    """Колоночный снимок car JOIN owner на момент версии журнала изменений"""
+
+    __slots__ = ("engine", "columns", "rows", "version", "built_at", "build_ms")
+
+    def __init__(self, engine: str, columns, rows: int, version: int, build_ms: float):
+        self.engine = engine
+        # arrow: pa.Table; python: {колонка: (коды array('i'), словарь значений) или array('q')}
+        self.columns = columns
+        self.rows = rows
+        self.version = version
+        self.built_at = datetime.utcnow()
+        self.build_ms = build_ms
+
+    def info(self) -> dict:
+        return {
+            "engine": self.engine,
+            "rows": self.rows,
+            "version": self.version,
+            "built_at": self.built_at.isoformat(),
+            "build_ms": round(self.build_ms, 1),
+        }
+
+def _snapshot_rows(db):
+    owner = (Owner.firstname + " " + Owner.lastname).label("owner")
+    return db.execute(
+        select(Car.brand, Car.model, Car.color, Car.modelYear, Car.price, owner)
+        .join(Owner, Owner.ownerid == Car.owner_id)
+        .execution_options(yield_per=PIVOT_REBUILD_CHUNK)
+    ).partitions()
+
+def _arrow_schema():
+    return pa.schema(
+        [(name, pa.dictionary(pa.int32(), pa.string())) for name in ("brand", "model", "color")]
+        + [("modelYear", pa.int32()), ("price", pa.int64()), ("owner", pa.dictionary(pa.int32(), pa.string()))]
+    )
+
+def _build_arrow(partitions):
+    schema = _arrow_schema()
+    batches = []
+    for rows in partitions:
+        columns = list(zip(*rows))
+        arrays = [
+            pa.array(values, type=field.type.value_type).dictionary_encode()
+            if pa.types.is_dictionary(field.type)
+            else pa.array(values, type=field.type)
+            for field, values in zip(schema, columns)
+        ]
+        batches.append(pa.RecordBatch.from_arrays(arrays, schema=schema))
+    # Общий словарь на колонку: коды сравнимы между пачками
+    table = pa.Table.from_batches(batches, schema=schema).unify_dictionaries().combine_chunks()
+    return table, table.num_rows
+
+def _build_python(partitions):
+    encoders: Dict[str, Dict[str, int]] = {name: {} for name in _STRING_DIMENSIONS}
+    codes = {name: array("i") for name in _STRING_DIMENSIONS}
+    numbers = {"modelYear": array("q"), "price": array("q")}
+    rows = 0
+    for chunk in partitions:
+        for brand, model, color, year, price, owner in chunk:
+            for name, value in (("brand", brand), ("model", model), ("color", color), ("owner", owner)):
+                encoder = encoders[name]
+                code = encoder.get(value)
+                if code is None:
+                    code = encoder[value] = len(encoder)
+                codes[name].append(code)
+            numbers["modelYear"].append(year)
+            numbers["price"].append(price)
+        rows += len(chunk)
+    columns = {name: (codes[name], list(encoders[name])) for name in _STRING_DIMENSIONS}
+    columns.update(numbers)
+    return columns, rows
+
+# ==================== GROUP BY ====================
+
+def _group_arrow(table, keys: Sequence[str]) -> List[dict]:
+    aggregates = [([], "count_all")] + [("price", name) for name in _ARROW_AGGREGATES.values()]
+    result = table.group_by(list(keys), use_threads=True).aggregate(aggregates)
+    groups = []
+    # В Python переводится только результат: одна строка на группу
+    for row in result.to_pylist():
+        if not row["count_all"]:
+            # Итог без ключей по пустой таблице
+            continue
+        group = {key: row[key] for key in keys}
+        group["count"] = row["count_all"]
+        for measure, name in _ARROW_AGGREGATES.items():
+            group[measure] = row[f"price_{name}"]
+        groups.append(group)
+    return groups
+
+def _group_python(columns, keys: Sequence[str]) -> List[dict]:
+    # Группировка по кортежу кодов; значения строк подставляются из словарей только для групп
+    key_columns = [columns[key][0] if key in _STRING_DIMENSIONS else columns[key] for key in keys]
+    totals: Dict[tuple, list] = {}
+    for key, price in zip(zip(*key_columns) if key_columns else repeat(()), columns["price"]):
+        total = totals.get(key)
+        if total is None:
+            totals[key] = [1, price, price, price]
+        else:
+            total[0] += 1
+            total[1] += price
+            if price < total[2]:
+                total[2] = price
+            if price > total[3]:
+                total[3] = price
+    groups = []
+    for codes, (count, price_sum, price_min, price_max) in totals.items():
+        group = {
+            key: columns[key][1][code] if key in _STRING_DIMENSIONS else code
+            for key, code in zip(keys, codes)
+        }
+        group.update(count=count, sum=price_sum, avg=price_sum / count, min=price_min, max=price_max)
+        groups.append(group)
+    return groups
+
+def _sort_key(key: tuple) -> tuple:
+    return tuple((value is None, value) for value in key)
+
+def _round(value):
+    return round(value, 2) if isinstance(value, float) else value
+
+# ==================== PIVOT ENGINE ====================
+
+class PivotEngine:
+    """Сводные таблицы по колоночному снимку car JOIN owner в памяти процесса.
+
+    Снимок строится одним проходом по БД при старте и перестраивается в
+    фоне, если версия журнала изменений сдвинулась (проверка раз в
+    PIVOT_REFRESH_INTERVAL); запросы к БД не обращаются. Строковые колонки
+    словарно закодированы. С pyarrow группировка идет в Table.group_by,
+    без него - один проход по массивам кодов.
+    """
+
+    def __init__(self, refresh_interval: float = PIVOT_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[Snapshot] = None
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def snapshot(self) -> Optional[Snapshot]:
+        return self._snapshot
+
+    def rebuild(self) -> Snapshot:
+        """Перечитать car JOIN owner и подменить снимок"""
+        with self._build_lock:
+            started = time.perf_counter()
+            with SessionLocal() as db:
+                # Версия читается до снимка: снимок не старше ее
+                version = current_version(db)
+                if pa is not None:
+                    columns, rows = _build_arrow(_snapshot_rows(db))
+                else:
+                    columns, rows = _build_python(_snapshot_rows(db))
+            build_ms = (time.perf_counter() - started) * 1000
+            self._snapshot = Snapshot("arrow" if pa is not None else "python", columns, rows, version, build_ms)
+        log.info("Pivot snapshot rebuilt: %s rows in %.0f ms", rows, build_ms)
+        return self._snapshot
+
+    def group(self, keys: Sequence[str]) -> Tuple[List[dict], Snapshot]:
+        """Агрегаты price по группам keys: count, sum, avg, min, max"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.rebuild()
+        if snapshot.engine == "arrow":
+            return _group_arrow(snapshot.columns, keys), snapshot
+        return _group_python(snapshot.columns, keys), snapshot
+
+    def pivot(
+        self, rows: Sequence[str], cols: Sequence[str] = (), measures: Sequence[str] = ("count",), limit: int = 1000,
+    ) -> dict:
+        """Сводная таблица: строки - комбинации rows, столбцы - комбинации cols,
+        в ячейках - меры по price (null - автомобилей с такими значениями нет)"""
+        rows, cols = tuple(rows), tuple(cols)
+        groups, snapshot = self.group(rows + cols)
+        col_keys = sorted({tuple(group[key] for key in cols) for group in groups}, key=_sort_key)
+        if len(col_keys) > PIVOT_MAX_COLUMNS:
+            raise ValueError(f"Слишком много столбцов: {len(col_keys)} > {PIVOT_MAX_COLUMNS}")
+        row_keys = sorted({tuple(group[key] for key in rows) for group in groups}, key=_sort_key)
+        truncated = len(row_keys) > limit
+        row_keys = row_keys[:limit]
+        row_index = {key: i for i, key in enumerate(row_keys)}
+        col_index = {key: i for i, key in enumerate(col_keys)}
+        cells = {measure: [[None] * len(col_keys) for _ in row_keys] for measure in measures}
+        for group in groups:
+            i = row_index.get(tuple(group[key] for key in rows))
+            if i is None:
+                continue
+            j = col_index[tuple(group[key] for key in cols)]
+            for measure in measures:
+                cells[measure][i][j] = _round(group[measure])
+        return {
+            "rows": list(rows),
+            "cols": list(cols),
+            "measures": list(measures),
+            "row_keys": [list(key) for key in row_keys],
+            "col_keys": [list(key) for key in col_keys],
+            "cells": cells,
+            "truncated": truncated,
+            "snapshot": snapshot.info(),
+        }
+
+    # ==================== REFRESHER ====================
+
+    def start(self) -> None:
+        if pa is None:
+            log.warning("pyarrow is not installed: /analytics/pivot falls back to row-by-row Python group-by")
+        try:
+            self.rebuild()
+        except Exception as e:
+            log.error("Could not build pivot snapshot: %s", e)
+        if self.refresh_interval > 0 and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="pivot-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                with SessionLocal() as db:
+                    version = current_version(db)
+                snapshot = self._snapshot
+                if snapshot is None or version != snapshot.version:
+                    self.rebuild()
+            except Exception as e:
+                log.warning("Pivot snapshot refresh failed: %s", e)
+
+pivot_engine = PivotEngine()
@@ -0,0 +1,234 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import List, Optional
+import anyio
+from sqlalchemy import event
+from core.replicas import all_engines
+from core.security import is_admin_scope
+
+# ==================== CONFIG ====================
+
+# false - middleware не подключается вовсе
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+# Интервал сэмплирования стеков (секунды)
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+# Каталог отчетов (общий для всех воркеров) и сколько последних отчетов хранить
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# Верхний кадр "простаивающего" потока: ожидание событий, очереди, блокировки
+_IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+}
+
+# ==================== SQL CAPTURE ====================
+# Слушатели engine висят только пока идет хотя бы одно профилирование;
+# список запросов текущего запроса передается через ContextVar (виден и в пуле потоков)
+
+_sql_capture: ContextVar[Optional[list]] = ContextVar("profile_sql", default=None)
+_active = 0
+_active_lock = threading.Lock()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _sql_capture.get() is not None:
+        context._profile_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    statements = _sql_capture.get()
+    started = getattr(context, "_profile_started", None)
+    if statements is None or started is None:
+        return
+    statements.append({
+        "sql": statement,
+        "ms": round((time.perf_counter() - started) * 1000, 3),
+        "executemany": executemany,
+        # Только форма параметров: значения могут содержать хэши паролей и т.п.
+        "params": len(parameters) if isinstance(parameters, (list, tuple, dict)) else None,
+        "rows": cursor.rowcount,
+    })
+
+def _attach_sql_listeners() -> None:
+    global _active
+    with _active_lock:
+        _active += 1
+        if _active == 1:
+            for target in all_engines():
+                event.listen(target, "before_cursor_execute", _before_cursor_execute)
+                event.listen(target, "after_cursor_execute", _after_cursor_execute)
+
+def _detach_sql_listeners() -> None:
+    global _active
+    with _active_lock:
+        _active -= 1
+        if _active == 0:
+            for target in all_engines():
+                event.remove(target, "before_cursor_execute", _before_cursor_execute)
+                event.remove(target, "after_cursor_execute", _after_cursor_execute)
+
+# ==================== SAMPLER ====================
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Сэмплирующий профилировщик: раз в interval снимает стеки всех потоков
+    процесса через sys._current_frames() и считает свернутые стеки (collapsed).
+
+    Потоки в ожидании (select, Condition.wait, Queue.get) не учитываются,
+    поэтому в отчет попадают event loop и потоки пула, занятые работой.
+    Чужие запросы, выполняющиеся одновременно, тоже попадут в выборку.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(labels))] += 1
+
+    def collapsed(self) -> List[str]:
+        """Строки "кадр;кадр;кадр N" для flamegraph.pl / speedscope"""
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+# ==================== REPORTS ====================
+
+def _report_path(profile_id: str) -> str:
+    if not profile_id or not all(c in "0123456789abcdef" for c in profile_id):
+        raise ValueError("Некорректный profile_id")
+    return os.path.join(PROFILE_DIR, f"{profile_id}.json")
+
+def save_report(report: dict) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(_report_path(report["id"]), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False)
+    # Храним только PROFILE_KEEP последних отчетов
+    files = sorted(
+        (os.path.join(PROFILE_DIR, name) for name in os.listdir(PROFILE_DIR) if name.endswith(".json")),
+        key=os.path.getmtime,
+    )
+    for path in files[:-PROFILE_KEEP]:
+        os.remove(path)
+
+def load_report(profile_id: str) -> Optional[dict]:
+    """Отчет по id или None (ValueError на некорректный id)"""
+    path = _report_path(profile_id)
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def list_reports() -> List[dict]:
+    """Краткие сведения об отчетах, новые первыми"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    reports = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".json"):
+            report = load_report(name[:-5])
+            if report:
+                reports.append({key: report[key] for key in
+                                ("id", "created_at", "method", "path", "status", "duration_ms", "sql_count", "sql_ms")})
+    return sorted(reports, key=lambda r: r["created_at"], reverse=True)
+
+# ==================== MIDDLEWARE ====================
+
+def wants_profile(scope) -> bool:
+    """Флаг X-Profile: 1 или ?profile=1"""
+    if b"profile=1" in scope.get("query_string", b""):
+        return True
+    for name, value in scope.get("headers", []):
+        if name == PROFILE_HEADER:
+            return value in (b"1", b"true")
+    return False
+
+class ProfilingMiddleware:
+    """Профилирование одного запроса администратора по X-Profile: 1 или ?profile=1.
+
+    Без флага - одна проверка заголовков. С флагом (и токеном ADMIN) запрос
+    выполняется под StackSampler, SQL-запросы пишутся с длительностью,
+    отчет сохраняется в PROFILE_DIR, а его id возвращается в X-Profile-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not wants_profile(scope) or not is_admin_scope(scope):
+            await self.app(scope, receive, send)
+            return
+        profile_id = uuid.uuid4().hex
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(PROFILE_ID_HEADER, profile_id.encode())]}
+            await send(message)
+
+        statements: list = []
+        token = _sql_capture.set(statements)
+        _attach_sql_listeners()
+        sampler = StackSampler()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            duration = (time.perf_counter() - started) * 1000
+            _detach_sql_listeners()
+            _sql_capture.reset(token)
+            # Отчет доступен по X-Profile-Id после завершения ответа
+            await anyio.to_thread.run_sync(save_report, {
+                "id": profile_id,
+                "created_at": datetime.utcnow().isoformat(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status,
+                "duration_ms": round(duration, 3),
+                "interval_ms": sampler.interval * 1000,
+                "samples": sampler.samples,
+                "sql_count": len(statements),
+                "sql_ms": round(sum(s["ms"] for s in statements), 3),
+                "sql": statements,
+                "collapsed": sampler.collapsed(),
+            })
@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, List, Optional
+from sqlalchemy import select, Select
+from .models import Car, Owner
+
+# ==================== READ MODELS ====================
+# Компактные строки для горячих списков: заполняются прямо из кортежей
+# Core select(), без ORM identity map и joinedload
+
+@dataclass(slots=True, frozen=True)
+class CarRow:
+    id: int
+    brand: str
+    model: str
+    color: str
+    registrationNumber: str
+    modelYear: int
+    price: int
+    owner_id: int
+    owner_firstname: Optional[str] = None
+    owner_lastname: Optional[str] = None
+
+    @property
+    def owner(self) -> Optional[str]:
+        """Полное имя владельца (как в CarWithOwner.owner)"""
+        if self.owner_firstname is None:
+            return None
+        return f"{self.owner_firstname} {self.owner_lastname}"
+
+# Порядок колонок совпадает с порядком полей CarRow
+CAR_ROW_COLUMNS = (
+    Car.id,
+    Car.brand,
+    Car.model,
+    Car.color,
+    Car.registrationNumber,
+    Car.modelYear,
+    Car.price,
+    Car.owner_id,
+    Owner.firstname,
+    Owner.lastname,
+)
+
+def select_car_rows() -> Select:
+    """SELECT колонок CarRow с LEFT JOIN владельца"""
+    return select(*CAR_ROW_COLUMNS).outerjoin(Owner, Car.owner_id == Owner.ownerid)
+
+def to_car_rows(rows: Iterable[tuple]) -> List[CarRow]:
+    """Превратить кортежи результата в CarRow"""
+    return [CarRow(*row) for row in rows]
+
+# ==================== SPARSE FIELDSETS ====================
+# ?fields=... : в SELECT попадают только запрошенные колонки,
+# JOIN владельца - только если запрошено хотя бы одно поле владельца
+
+# Поля CarWithOwner в порядке ответа JSON
+CAR_FIELDS = (
+    "id", "brand", "model", "color", "registrationNumber", "modelYear",
+    "price", "owner_id", "owner", "owner_firstname", "owner_lastname",
+)
+# Поля OwnerResponse; cars требует загрузки связанных автомобилей
+OWNER_FIELDS = ("ownerid", "firstname", "lastname", "cars")
+
+CAR_OWNER_FIELDS = frozenset({"owner", "owner_firstname", "owner_lastname"})
+
+_CAR_FIELD_COLUMNS = {
+    "id": Car.id,
+    "brand": Car.brand,
+    "model": Car.model,
+    "color": Car.color,
+    "registrationNumber": Car.registrationNumber,
+    "modelYear": Car.modelYear,
+    "price": Car.price,
+    "owner_id": Car.owner_id,
+    # Полное имя собирается в SQL; NULL, если владельца нет
+    "owner": (Owner.firstname + " " + Owner.lastname).label("owner"),
+    "owner_firstname": Owner.firstname.label("owner_firstname"),
+    "owner_lastname": Owner.lastname.label("owner_lastname"),
+}
+
+_OWNER_FIELD_COLUMNS = {
+    "ownerid": Owner.ownerid,
+    "firstname": Owner.firstname,
+    "lastname": Owner.lastname,
+}
+
+def parse_fields(raw: Optional[str], allowed: tuple, key: str) -> Optional[tuple]:
+    """Разобрать "a,b,c" в кортеж полей в каноническом порядке (key добавляется всегда).
+
+    None - поля не заданы (полный ответ); ValueError - неизвестное поле.
+    """
+    if not raw:
+        return None
+    requested = {name.strip() for name in raw.split(",") if name.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValueError(
+            f"Неизвестные поля: {', '.join(sorted(unknown))}. Допустимые: {', '.join(allowed)}"
+        )
+    # Ключ нужен для курсоров пагинации и идентификации строк на клиенте
+    requested.add(key)
+    return tuple(name for name in allowed if name in requested)
+
+@lru_cache(maxsize=None)
+def select_car_fields(fields: tuple) -> Select:
+    """SELECT только колонок из fields (LEFT JOIN владельца - если нужен)"""
+    stmt = select(*(_CAR_FIELD_COLUMNS[name] for name in fields)).select_from(Car)
+    if CAR_OWNER_FIELDS.intersection(fields):
+        stmt = stmt.outerjoin(Owner, Car.owner_id == Owner.ownerid)
+    return stmt
+
+@lru_cache(maxsize=None)
+def select_owner_fields(fields: tuple) -> Select:
+    """SELECT скалярных колонок владельца из fields (без cars)"""
+    return select(*(_OWNER_FIELD_COLUMNS[name] for name in fields if name != "cars"))
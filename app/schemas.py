@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict, Field
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Any, Dict, Generic, Optional, List, TypeVar, Union
 from datetime import datetime
 
 # ==================== CAR SCHEMAS ====================
@@ -74,6 +74,23 @@ class OwnerResponse(OwnerBase):
 
 # ==================== QUERY SCHEMAS ====================
 
+# Разрешенные колонки сортировки (имя попадает в ORDER BY, поэтому только allowlist)
+CAR_SORT_FIELDS = ("id", "brand", "model", "color", "registrationNumber", "modelYear", "price", "owner_id")
+OWNER_SORT_FIELDS = ("ownerid", "firstname", "lastname")
+
+def _check_sort(value: Optional[str], allowed: tuple, default: str) -> str:
+    if value is None:
+        return default
+    if value not in allowed:
+        raise ValueError(f"sort_by должен быть одним из: {', '.join(allowed)}")
+    return value
+
+def _check_order(value: Optional[str]) -> str:
+    order = (value or "asc").lower()
+    if order not in ("asc", "desc"):
+        raise ValueError("sort_order должен быть asc или desc")
+    return order
+
 class CarQuery(BaseModel):
     brand: Optional[str] = None
     color: Optional[str] = None
@@ -86,6 +103,16 @@ class CarQuery(BaseModel):
     limit: Optional[int] = 100
     offset: Optional[int] = 0
 
+    @field_validator("sort_by")
+    @classmethod
+    def validate_sort_by(cls, value):
+        return _check_sort(value, CAR_SORT_FIELDS, "id")
+
+    @field_validator("sort_order")
+    @classmethod
+    def validate_sort_order(cls, value):
+        return _check_order(value)
+
 class OwnerQuery(BaseModel):
     firstname: Optional[str] = None
     lastname: Optional[str] = None
@@ -95,8 +122,68 @@ class OwnerQuery(BaseModel):
     limit: Optional[int] = 100
     offset: Optional[int] = 0
 
+    @field_validator("sort_by")
+    @classmethod
+    def validate_sort_by(cls, value):
+        return _check_sort(value, OWNER_SORT_FIELDS, "ownerid")
+
+    @field_validator("sort_order")
+    @classmethod
+    def validate_sort_order(cls, value):
+        return _check_order(value)
+
 # ==================== RESPONSE SCHEMAS ====================
 
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    """Конверт пагинации (?envelope=true)"""
+    items: List[T]
+    next_cursor: Optional[str] = None
+    total: int
+    total_is_estimate: bool = False
+
+class PlateLookup(BaseModel):
+    plates: List[str] = Field(..., min_length=1, max_length=10000, description="Регистрационные номера")
+
+class PlateLookupResult(BaseModel):
+    """Найденные автомобили по исходному написанию номера и ненайденные номера"""
+    found: Dict[str, CarWithOwner]
+    missing: List[str]
+
+class FacetCount(BaseModel):
+    value: Optional[Union[str, int]] = None
+    count: int
+
+class PriceBucket(BaseModel):
+    min: int
+    max: int
+    count: int
+
+class CarFacets(BaseModel):
+    """Счетчики фасетов для фильтров CarQuery (/cars/facets)"""
+    total: int
+    brand: List[FacetCount]
+    color: List[FacetCount]
+    modelYear: List[FacetCount]
+    price: List[PriceBucket]
+    price_bucket: int
+    cached: bool = False
+
+class SyncChange(BaseModel):
+    entity: str
+    id: int
+    version: int
+    op: str  # upsert/delete
+    data: Optional[Dict[str, Any]] = None
+
+class SyncPage(BaseModel):
+    """Страница /sync/changes; reset - перечитать все и продолжить с next_since"""
+    changes: List[SyncChange]
+    next_since: int
+    has_more: bool
+    reset: bool = False
+
 class StatusResponse(BaseModel):
     status: str
     app: str
@@ -107,6 +194,25 @@ class MessageResponse(BaseModel):
     message: str
     success: bool = True
 
+class JobResponse(BaseModel):
+    """Состояние фоновой задачи (/jobs/{id})"""
+    model_config = ConfigDict(from_attributes=True)
+    id: str
+    kind: str
+    status: str
+    progress: float
+    message: Optional[str] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_by: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class JobAccepted(MessageResponse):
+    """Ответ 202: операция поставлена в очередь, статус - GET /jobs/{job_id}"""
+    job_id: str
+
 # ==================== AUTHENTICATION SCHEMAS ====================
 
 class UserLogin(BaseModel):
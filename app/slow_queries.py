@@ -0,0 +1,285 @@
+import hashlib
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import event
+from core.logs import request_scope_var, route_template
+
+log = logging.getLogger(__name__)
+
+# ==================== CONFIG ====================
+
+# Порог медленного SQL-запроса в миллисекундах (0 - слушатели не подключаются)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+# Сколько разных отпечатков хранить; при переполнении вытесняется самый "дешевый"
+SLOW_QUERY_MAX_FINGERPRINTS = int(os.getenv("SLOW_QUERY_MAX_FINGERPRINTS", "500"))
+# Снимать план EXPLAIN (без ANALYZE) для новых отпечатков
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+# Через сколько секунд план отпечатка снимается заново
+SLOW_QUERY_PLAN_TTL = float(os.getenv("SLOW_QUERY_PLAN_TTL", "3600"))
+
+# Сколько разных маршрутов/вызывающих/форм параметров помнить на отпечаток
+_MAX_DISTINCT = 20
+# Пакеты, кадры которых считаются "вызывающим методом" (crud.py, analytics.py, security.py, ...)
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_CALLER_DIRS = tuple(os.path.join(_ROOT, name) + os.sep for name in ("app", "core", "auth_app"))
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+# ==================== NORMALIZATION ====================
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<![:\w]):[A-Za-z_]\w*")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \(\?(?:, \?)*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+def normalize_sql(statement: str) -> str:
+    """SQL без литералов и значений параметров: одинаковый для запросов одной формы"""
+    sql = _SPACES.sub(" ", statement).strip()
+    sql = _STRING.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    # IN (?, ?, ?) с любым числом элементов - один отпечаток
+    return _IN_LIST.sub("IN (...)", sql)
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+def _type_runs(values: Iterable) -> str:
+    """Типы значений подряд с повторами: "str, int x500" """
+    runs = []
+    for value in values:
+        name = type(value).__name__
+        if runs and runs[-1][0] == name:
+            runs[-1][1] += 1
+        else:
+            runs.append([name, 1])
+    return ", ".join(name if count == 1 else f"{name} x{count}" for name, count in runs)
+
+def param_shape(parameters, executemany: bool = False) -> str:
+    """Форма параметров (имена и типы) без самих значений"""
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = param_shape(parameters[0]) if parameters else ""
+        return f"{len(parameters)} rows x {first}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return f"({_type_runs(parameters)})"
+    return type(parameters).__name__
+
+def current_route() -> Tuple[Optional[str], Optional[str]]:
+    """(метод, шаблон маршрута) текущего HTTP-запроса или (None, None)"""
+    scope = request_scope_var.get()
+    if scope is None:
+        return None, None
+    return scope["method"], route_template(scope)
+
+def calling_method() -> Optional[str]:
+    """Ближайший по стеку метод приложения ("crud.CarCRUD.search_cars")"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_filename.startswith(_CALLER_DIRS) and frame.f_globals.get("__name__") != __name__:
+            code = frame.f_code
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+        frame = frame.f_back
+    return None
+
+# ==================== AGGREGATION ====================
+
+def _count(counter: Counter, key) -> None:
+    # Кардинальность ограничена: новые ключи сверх _MAX_DISTINCT не заводятся
+    if key in counter or len(counter) < _MAX_DISTINCT:
+        counter[key] += 1
+
+class SlowQueryLog:
+    """Медленные запросы, сгруппированные по отпечатку нормализованного SQL.
+
+    Хранится в памяти процесса (у каждого воркера свой), объем ограничен
+    max_fingerprints. Планы EXPLAIN снимает отдельный поток на своем
+    соединении, поток запроса только кладет задачу в очередь.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, max_fingerprints: int = SLOW_QUERY_MAX_FINGERPRINTS):
+        self.threshold_ms = threshold_ms
+        self.max_fingerprints = max_fingerprints
+        self._entries: dict = {}
+        self._lock = threading.Lock()
+        self._explain_queue: queue.Queue = queue.Queue(maxsize=100)
+        self._explain_thread: Optional[threading.Thread] = None
+
+    def record(self, conn, statement: str, parameters, executemany: bool, duration_ms: float) -> None:
+        normalized = normalize_sql(statement)
+        key = fingerprint(normalized)
+        method, template = current_route()
+        # Вне HTTP-запроса (фоновые задачи, старт) маршрута нет
+        route = f"{method} {template}" if method else "background"
+        caller = calling_method()
+        shape = param_shape(parameters, executemany)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    cheapest = min(self._entries, key=lambda k: self._entries[k]["total_ms"])
+                    del self._entries[cheapest]
+                entry = self._entries[key] = {
+                    "fingerprint": key,
+                    "sql": normalized,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "first_seen": now,
+                    "routes": Counter(),
+                    "callers": Counter(),
+                    "param_shapes": Counter(),
+                    "plan": None,
+                    "plan_at": None,
+                    "plan_error": None,
+                    "_explaining": False,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_ms"] = duration_ms
+            entry["last_seen"] = now
+            _count(entry["routes"], route)
+            _count(entry["callers"], caller or "unknown")
+            _count(entry["param_shapes"], shape)
+            need_plan = (
+                SLOW_QUERY_EXPLAIN
+                and not executemany
+                and not entry["_explaining"]
+                and (entry["plan_at"] is None or now - entry["plan_at"] > SLOW_QUERY_PLAN_TTL)
+                and normalized.lstrip("( ").upper().startswith(_EXPLAINABLE)
+            )
+            if need_plan:
+                entry["_explaining"] = True
+        log.warning(
+            "Slow query %.1fms [%s] %s via %s",
+            duration_ms, key, route, caller,
+            extra={"fingerprint": key, "method": method, "route": template, "caller": caller,
+                   "duration_ms": round(duration_ms, 2)},
+        )
+        if need_plan:
+            self._request_plan(key, conn.engine, statement, parameters)
+
+    def top(self, limit: int = 20, sort: str = "total_ms") -> List[dict]:
+        """Самые тяжелые отпечатки: total_ms, max_ms, mean_ms или count"""
+        with self._lock:
+            entries = [self._public(entry) for entry in self._entries.values()]
+        entries.sort(key=lambda e: e[sort], reverse=True)
+        return entries[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _public(entry: dict) -> dict:
+        return {
+            "fingerprint": entry["fingerprint"],
+            "sql": entry["sql"],
+            "count": entry["count"],
+            "total_ms": round(entry["total_ms"], 2),
+            "mean_ms": round(entry["total_ms"] / entry["count"], 2),
+            "max_ms": round(entry["max_ms"], 2),
+            "last_ms": round(entry["last_ms"], 2),
+            "first_seen": datetime.utcfromtimestamp(entry["first_seen"]).isoformat(),
+            "last_seen": datetime.utcfromtimestamp(entry["last_seen"]).isoformat(),
+            "routes": dict(entry["routes"].most_common()),
+            "callers": dict(entry["callers"].most_common()),
+            "param_shapes": dict(entry["param_shapes"].most_common()),
+            "plan": entry["plan"],
+            "plan_at": datetime.utcfromtimestamp(entry["plan_at"]).isoformat() if entry["plan_at"] else None,
+            "plan_error": entry["plan_error"],
+        }
+
+    # ==================== EXPLAIN ====================
+
+    def _request_plan(self, key: str, target, statement: str, parameters) -> None:
+        if self._explain_thread is None:
+            with self._lock:
+                if self._explain_thread is None:
+                    self._explain_thread = threading.Thread(target=self._explain_worker, name="slow-query-explain", daemon=True)
+                    self._explain_thread.start()
+        try:
+            self._explain_queue.put_nowait((key, target, statement, parameters))
+        except queue.Full:
+            with self._lock:
+                if key in self._entries:
+                    self._entries[key]["_explaining"] = False
+
+    def _explain_worker(self) -> None:
+        while True:
+            key, target, statement, parameters = self._explain_queue.get()
+            plan, error = None, None
+            try:
+                plan = explain(target, statement, parameters)
+            except Exception as e:
+                error = str(e).splitlines()[0] if str(e) else type(e).__name__
+                log.debug("EXPLAIN failed for %s: %s", key, error)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry["plan"], entry["plan_error"] = plan, error
+                    entry["plan_at"] = time.time()
+                    entry["_explaining"] = False
+
+def explain(target, statement: str, parameters) -> List[str]:
+    """План запроса без выполнения: EXPLAIN (ANALYZE off) на PostgreSQL,
+    EXPLAIN QUERY PLAN на SQLite. Выполняется на отдельном соединении."""
+    dialect = target.dialect.name
+    if dialect == "postgresql":
+        prefix = "EXPLAIN (ANALYZE off) "
+    elif dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        prefix = "EXPLAIN "
+    with target.connect() as conn:
+        # Собственные запросы EXPLAIN в журнал медленных не попадают
+        conn = conn.execution_options(slow_query_log=False)
+        rows = conn.exec_driver_sql(prefix + statement, parameters).all()
+    if dialect == "sqlite":
+        # (id, parent, notused, detail)
+        return [str(row[-1]) for row in rows]
+    return [" | ".join(str(value) for value in row) for row in rows]
+
+slow_queries = SlowQueryLog()
+
+# ==================== HOOKS ====================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._slow_query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slow_query_started", None)
+    if started is None:
+        return
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms < slow_queries.threshold_ms or not context.execution_options.get("slow_query_log", True):
+        return
+    try:
+        slow_queries.record(conn, statement, parameters, executemany, duration_ms)
+    except Exception as e:
+        # Журнал медленных запросов не должен ломать сам запрос
+        log.error("Slow query log failed: %s", e)
+
+def install_slow_query_log(engines: Iterable) -> None:
+    """Подключить замер длительности к engine (и репликам); при SLOW_QUERY_MS=0 - ничего"""
+    if slow_queries.threshold_ms <= 0:
+        return
+    for target in engines:
+        if not event.contains(target, "after_cursor_execute", _after_cursor_execute):
+            event.listen(target, "before_cursor_execute", _before_cursor_execute)
+            event.listen(target, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,11 @@
+# Журнал изменений (outbox) общий для app и auth_app и живет в core
+from core.sync import (
+    RESET_ENTITY, SYNC_LOCK_KEY, SYNC_MAX_PAGE_SIZE, SYNC_PAGE_SIZE, SYNC_TOMBSTONE_DAYS,
+    changes_since, compact_change_log, current_version, mark_reset, reset_horizon, track_change, track_deleted_where,
+)
+
+__all__ = [
+    "RESET_ENTITY", "SYNC_LOCK_KEY", "SYNC_MAX_PAGE_SIZE", "SYNC_PAGE_SIZE", "SYNC_TOMBSTONE_DAYS",
+    "changes_since", "compact_change_log", "current_version", "mark_reset", "reset_horizon", "track_change",
+    "track_deleted_where",
+]
@@ -0,0 +1,10 @@
+# Системные настройки общие для app и auth_app (лимит автомобилей на владельца) и живут в core
+from core.system_settings import (
+    DEFAULT_SETTINGS, MAINTENANCE_ALLOWED_PATHS, SETTINGS_CHANNEL, SETTINGS_POLL_INTERVAL,
+    MaintenanceModeMiddleware, SettingsCache, settings, validate_settings,
+)
+
+__all__ = [
+    "DEFAULT_SETTINGS", "MAINTENANCE_ALLOWED_PATHS", "SETTINGS_CHANNEL", "SETTINGS_POLL_INTERVAL",
+    "MaintenanceModeMiddleware", "SettingsCache", "settings", "validate_settings",
+]
@@ -0,0 +1,53 @@
+import os
+from typing import Optional
+from . import analytics, backup as backups, sync
+from .crud import CarCRUD, OwnerCRUD
+from .db import SessionLocal, engine
+from .jobs import JobContext, job_handler
+
+# ==================== BACKGROUND TASKS ====================
+# Обработчики задач из app/jobs.py: каждый открывает свою сессию и
+# отчитывается о прогрессе через ctx.progress()
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+@job_handler("backup")
+def backup(ctx: JobContext, backup_id: Optional[str] = None) -> dict:
+    """Потоковый бэкап всех таблиц (app/backup.py) в архив backup_id"""
+    manifest = backups.create_backup(engine, progress=ctx.progress, backup_id=backup_id)
+    return {key: manifest[key] for key in ("backup_id", "rows", "bytes", "seconds", "rows_per_sec", "peak_rss_mb")}
+
+@job_handler("restore")
+def restore(ctx: JobContext, backup_id: str) -> dict:
+    """Восстановить базу из архива (таблицы очищаются)"""
+    return backups.restore_backup(engine, backup_id, progress=ctx.progress)
+
+@job_handler("delete_owner")
+def delete_owner(ctx: JobContext, owner_id: int) -> dict:
+    """Удалить владельца; его автомобили удаляет БД (ON DELETE CASCADE)"""
+    with SessionLocal() as db:
+        cars = OwnerCRUD.count_cars(db, owner_id)
+        ctx.progress(0, message=f"Удаление владельца и {cars} автомобилей")
+        if not OwnerCRUD.delete(db, owner_id):
+            raise ValueError(f"Владелец с ID {owner_id} не найден")
+    return {"owner_id": owner_id, "cars_deleted": cars}
+
+@job_handler("import_cars")
+def import_cars(ctx: JobContext, cars: list) -> dict:
+    """Массовый импорт автомобилей"""
+    with SessionLocal() as db:
+        inserted = CarCRUD.bulk_create(db, cars, IMPORT_BATCH_SIZE, ctx.progress)
+    return {"inserted": inserted}
+
+@job_handler("analytics_rebuild")
+def analytics_rebuild(ctx: JobContext) -> dict:
+    """Пересчитать снимок аналитики"""
+    with SessionLocal() as db:
+        snapshot = analytics.rebuild(db, ctx.progress)
+    return {"sections": list(snapshot), "total_cars": snapshot["overview"]["total_cars"]}
+
+@job_handler("sync_compact")
+def sync_compact(ctx: JobContext) -> dict:
+    """Удалить перекрытые строки и старые надгробия журнала изменений"""
+    with SessionLocal() as db:
+        return sync.compact_change_log(db)
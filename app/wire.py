@@ -0,0 +1,143 @@
+import io
+from typing import Iterable, Iterator, List, Optional, Sequence
+from fastapi import Response
+from .read_models import CAR_FIELDS
+
+# Опциональные компактные форматы; без пакета клиент получает JSON
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover
+    pa = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+_MEDIA_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/vnd.apache.arrow.file": ARROW,
+}
+
+def negotiate(accept: Optional[str], allow_arrow: bool = False) -> str:
+    """Выбрать формат ответа по заголовку Accept (по умолчанию JSON)"""
+    if not accept:
+        return JSON
+    offers = []
+    for position, part in enumerate(accept.split(",")):
+        media, _, params = part.strip().partition(";")
+        media = _MEDIA_ALIASES.get(media.strip().lower(), media.strip().lower())
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        offers.append((-q, position, media))
+    for neg_q, _, media in sorted(offers):
+        if neg_q >= 0:
+            break
+        if media == MSGPACK and msgpack is not None:
+            return MSGPACK
+        if media == ARROW and allow_arrow and pa is not None:
+            return ARROW
+        if media in (JSON, "*/*", "application/*"):
+            return JSON
+    return JSON
+
+# ==================== ENCODERS ====================
+
+def car_dicts(cars: Iterable, fields: Sequence[str] = CAR_FIELDS) -> List[dict]:
+    """CarRow (или строки с частью полей) -> словари без pydantic"""
+    return [{field: getattr(car, field) for field in fields} for car in cars]
+
+def encode_msgpack(content) -> bytes:
+    return msgpack.packb(content, use_bin_type=True)
+
+def _arrow_schema(fields: Sequence[str] = CAR_FIELDS):
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("brand", pa.dictionary(pa.int32(), pa.string())),
+        ("model", pa.dictionary(pa.int32(), pa.string())),
+        ("color", pa.dictionary(pa.int32(), pa.string())),
+        ("registrationNumber", pa.string()),
+        ("modelYear", pa.int32()),
+        ("price", pa.int64()),
+        ("owner_id", pa.int64()),
+        ("owner", pa.string()),
+        ("owner_firstname", pa.string()),
+        ("owner_lastname", pa.string()),
+    ])
+    if tuple(fields) == CAR_FIELDS:
+        return schema
+    return pa.schema([schema.field(name) for name in fields])
+
+def cars_record_batch(cars: Sequence, fields: Sequence[str] = CAR_FIELDS):
+    """Колоночный RecordBatch из CarRow (строки словарно закодированы)"""
+    schema = _arrow_schema(fields)
+    columns = [[getattr(car, field) for car in cars] for field in fields]
+    arrays = [
+        pa.array(values, type=schema.field(i).type.value_type).dictionary_encode()
+        if pa.types.is_dictionary(schema.field(i).type)
+        else pa.array(values, type=schema.field(i).type)
+        for i, values in enumerate(columns)
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def encode_arrow(cars: Sequence, fields: Sequence[str] = CAR_FIELDS) -> bytes:
+    """Arrow IPC stream с одним RecordBatch"""
+    sink = pa.BufferOutputStream()
+    batch = cars_record_batch(cars, fields)
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+class _ChunkSink(io.RawIOBase):
+    """Файлоподобный приемник, который можно опустошать после каждого батча"""
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+def iter_arrow_stream(chunks: Iterable[Sequence], fields: Sequence[str] = CAR_FIELDS) -> Iterator[bytes]:
+    """Arrow IPC stream по чанкам (для потокового экспорта)"""
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, _arrow_schema(fields))
+    for chunk in chunks:
+        writer.write_batch(cars_record_batch(chunk, fields))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+def cars_response(
+    cars: Sequence, media_type: str, headers: Optional[dict] = None, fields: Sequence[str] = CAR_FIELDS
+) -> Response:
+    """Ответ со списком CarRow в формате MessagePack или Arrow"""
+    if media_type == ARROW:
+        body = encode_arrow(cars, fields)
+    else:
+        body = encode_msgpack(car_dicts(cars, fields))
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def msgpack_response(content, headers: Optional[dict] = None) -> Response:
+    """Произвольный JSON-совместимый ответ в MessagePack"""
+    return Response(content=encode_msgpack(content), media_type=MSGPACK, headers=headers)
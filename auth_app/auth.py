@@ -1,95 +1,25 @@
-import os
-from datetime import datetime, timedelta
-from typing import Optional
-import jwt
-from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
-from fastapi import HTTPException, status, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from .database import get_db
-from .models import AppUser
+# Authentication pipeline is shared with app (see core/security.py);
+# auth_app routes are async, so they use the AsyncSession based dependencies.
+from core.security import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    pwd_context,
+    security,
+    hash_password,
+    verify_password,
+    hash_password_async,
+    verify_password_async,
+    shutdown_hash_executor,
+    create_access_token,
+    decode_access_token,
+    get_current_user_async as get_current_user,
+    role_required_async as role_required,
+)
 from .schemas import TokenData
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# JWT Configuration
-SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key-change-in-production")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
-
-# Security scheme
-security = HTTPBearer()
-
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Create JWT access token"""
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
 
 def verify_token(token: str) -> TokenData:
     """Verify and decode JWT token"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        role: str = payload.get("role")
-        
-        if username is None:
-            raise credentials_exception
-            
-        token_data = TokenData(username=username, role=role)
-        return token_data
-    except InvalidTokenError:
-        raise credentials_exception
-
-def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> AppUser:
-    """Get current authenticated user"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
-    token = credentials.credentials
-    token_data = verify_token(token)
-    
-    user = db.query(AppUser).filter(AppUser.username == token_data.username).first()
-    if user is None:
-        raise credentials_exception
-    return user
-
-def role_required(required_role: str):
-    """Dependency to check user role"""
-    def role_checker(current_user: AppUser = Depends(get_current_user)):
-        if current_user.role != required_role:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
-        return current_user
-    return role_checker
-
+    payload = decode_access_token(token)
+    return TokenData(username=payload.get("sub"), role=payload.get("role"))
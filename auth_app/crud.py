@@ -1,71 +1,57 @@
-from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .models import AppUser, Car
 from .schemas import UserCreate, CarCreate
-from .auth import hash_password
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .auth import hash_password_async, verify_password_async
+# Записи автомобилей идут общим с app путем: проверки, лента изменений и журнал синхронизации
+from core import cars as car_writes
 
 # User CRUD operations
-def get_user_by_username(db: Session, username: str) -> AppUser:
+async def get_user_by_username(db: AsyncSession, username: str) -> AppUser:
     """Get user by username"""
-    return db.query(AppUser).filter(AppUser.username == username).first()
+    result = await db.execute(select(AppUser).where(AppUser.username == username))
+    return result.scalars().first()
 
-def create_user(db: Session, user: UserCreate) -> AppUser:
+async def create_user(db: AsyncSession, user: UserCreate) -> AppUser:
     """Create new user"""
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password_async(user.password)
     db_user = AppUser(
         username=user.username,
         password_hash=hashed_password,
         role=user.role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, username: str, password: str) -> AppUser:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> AppUser:
     """Authenticate user with username and password"""
-    user = get_user_by_username(db, username)
+    user = await get_user_by_username(db, username)
     if not user:
         return False
-    if not pwd_context.verify(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         return False
     return user
 
 # Car CRUD operations
-def get_cars(db: Session, skip: int = 0, limit: int = 100):
+async def get_cars(db: AsyncSession, skip: int = 0, limit: int = 100):
     """Get all cars with pagination"""
-    return db.query(Car).offset(skip).limit(limit).all()
+    result = await db.execute(select(Car).offset(skip).limit(limit))
+    return result.scalars().all()
 
-def get_car_by_id(db: Session, car_id: int) -> Car:
+async def get_car_by_id(db: AsyncSession, car_id: int) -> Car:
     """Get car by ID"""
-    return db.query(Car).filter(Car.id == car_id).first()
+    return await db.get(Car, car_id)
 
-def create_car(db: Session, car: CarCreate) -> Car:
-    """Create new car"""
-    db_car = Car(**car.dict())
-    db.add(db_car)
-    db.commit()
-    db.refresh(db_car)
-    return db_car
+async def create_car(db: AsyncSession, car: CarCreate) -> Car:
+    """Create new car (ValueError if the owner is missing, over the limit or the plate is taken)"""
+    return await db.run_sync(car_writes.create_car, car.model_dump())
 
-def update_car(db: Session, car_id: int, car_data: CarCreate) -> Car:
-    """Update car"""
-    db_car = get_car_by_id(db, car_id)
-    if db_car:
-        for key, value in car_data.dict().items():
-            setattr(db_car, key, value)
-        db.commit()
-        db.refresh(db_car)
-    return db_car
+async def update_car(db: AsyncSession, car_id: int, car_data: CarCreate) -> Car:
+    """Update car (None if it does not exist)"""
+    return await db.run_sync(car_writes.update_car, car_id, car_data.model_dump())
 
-def delete_car(db: Session, car_id: int) -> bool:
+async def delete_car(db: AsyncSession, car_id: int) -> bool:
     """Delete car"""
-    db_car = get_car_by_id(db, car_id)
-    if db_car:
-        db.delete(db_car)
-        db.commit()
-        return True
-    return False
-
+    return await db.run_sync(car_writes.delete_car, car_id)
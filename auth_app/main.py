@@ -1,14 +1,17 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
+import logging
 import os
 
-from .database import get_db, init_db
-from .models import AppUser, Car
+from .database import Base, AsyncSessionLocal, get_async_db, get_async_engine, dispose_engines
+from .models import AppUser, Owner
 from .schemas import UserCreate, UserResponse, CarCreate, CarResponse, UserLogin, Token
-from .auth import create_access_token, get_current_user, role_required, authenticate_user
-from .crud import get_cars, create_car, get_car_by_id, update_car, delete_car, create_user
+from .auth import create_access_token, get_current_user, role_required, shutdown_hash_executor
+from .crud import get_cars, create_car, get_car_by_id, update_car, delete_car, create_user, authenticate_user
+from core.system_settings import settings as system_settings
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -17,6 +20,12 @@ app = FastAPI(
     version="1.0.0"
 )
 
+log = logging.getLogger(__name__)
+
+# Demo data (users user/user and admin/admin) is created only on explicit request:
+# app_users is shared with app, so the seed must never run in production
+AUTH_SEED_DEMO = os.getenv("AUTH_SEED_DEMO", "false").lower() == "true"
+
 # CORS Configuration
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:8080").split(",")
 
@@ -32,18 +41,32 @@ app.add_middleware(
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
-    init_db()
-    # Seed database with initial data
-    await seed_database()
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    # Shared settings (max_cars_per_owner) are checked on every car write
+    system_settings.start()
+    # Seed database with demo data only when AUTH_SEED_DEMO=true
+    if AUTH_SEED_DEMO:
+        await seed_database()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_hash_executor()
+    system_settings.stop()
+    await dispose_engines()
 
 async def seed_database():
     """Seed database with initial users and cars"""
-    db = next(get_db())
-    
-    # Check if users already exist
-    if db.query(AppUser).first():
-        return
-    
+    async with AsyncSessionLocal() as db:
+        # Check if users already exist
+        result = await db.execute(select(AppUser).limit(1))
+        if result.scalars().first():
+            return
+        log.warning("AUTH_SEED_DEMO is on: creating demo users user/user and admin/admin")
+        await _seed(db)
+
+async def _seed(db: AsyncSession):
+    """Insert default users and sample cars"""
     # Create default users
     users_data = [
         {"username": "user", "password": "user", "role": "USER"},
@@ -52,28 +75,30 @@ async def seed_database():
     
     for user_data in users_data:
         user_create = UserCreate(**user_data)
-        create_user(db, user_create)
+        await create_user(db, user_create)
     
-    # Create sample cars
+    # Create sample owner and cars
+    owner = Owner(firstname="Demo", lastname="Owner")
+    db.add(owner)
+    await db.flush()
+
     cars_data = [
-        {"brand": "Toyota", "model": "Camry", "color": "Blue", "year": 2022, "price": 25000.0},
-        {"brand": "Honda", "model": "Civic", "color": "Red", "year": 2021, "price": 22000.0},
-        {"brand": "Ford", "model": "Mustang", "color": "Black", "year": 2023, "price": 45000.0},
-        {"brand": "BMW", "model": "X5", "color": "White", "year": 2022, "price": 60000.0},
-        {"brand": "Mercedes", "model": "C-Class", "color": "Silver", "year": 2023, "price": 55000.0}
+        {"brand": "Toyota", "model": "Camry", "color": "Blue", "registrationNumber": "AUT-0001", "modelYear": 2022, "price": 25000},
+        {"brand": "Honda", "model": "Civic", "color": "Red", "registrationNumber": "AUT-0002", "modelYear": 2021, "price": 22000},
+        {"brand": "Ford", "model": "Mustang", "color": "Black", "registrationNumber": "AUT-0003", "modelYear": 2023, "price": 45000},
+        {"brand": "BMW", "model": "X5", "color": "White", "registrationNumber": "AUT-0004", "modelYear": 2022, "price": 60000},
+        {"brand": "Mercedes", "model": "C-Class", "color": "Silver", "registrationNumber": "AUT-0005", "modelYear": 2023, "price": 55000}
     ]
     
     for car_data in cars_data:
-        car_create = CarCreate(**car_data)
-        create_car(db, car_create)
-    
-    db.close()
+        car_create = CarCreate(owner_id=owner.ownerid, **car_data)
+        await create_car(db, car_create)
 
 # Authentication endpoints
 @app.post("/login", response_model=Token)
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login endpoint - returns JWT token"""
-    user = authenticate_user(db, user_credentials.username, user_credentials.password)
+    user = await authenticate_user(db, user_credentials.username, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -99,30 +124,33 @@ async def read_users_me(current_user: AppUser = Depends(get_current_user)):
 async def read_cars(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: AppUser = Depends(get_current_user)
 ):
     """Get all cars - accessible to all authenticated users"""
-    cars = get_cars(db, skip=skip, limit=limit)
+    cars = await get_cars(db, skip=skip, limit=limit)
     return cars
 
 @app.post("/cars", response_model=CarResponse)
 async def create_car_endpoint(
     car: CarCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: AppUser = Depends(role_required("ADMIN"))
 ):
     """Create new car - only accessible to ADMIN users"""
-    return create_car(db, car)
+    try:
+        return await create_car(db, car)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/cars/{car_id}", response_model=CarResponse)
 async def read_car(
     car_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: AppUser = Depends(get_current_user)
 ):
     """Get car by ID - accessible to all authenticated users"""
-    car = get_car_by_id(db, car_id)
+    car = await get_car_by_id(db, car_id)
     if car is None:
         raise HTTPException(status_code=404, detail="Car not found")
     return car
@@ -131,23 +159,26 @@ async def read_car(
 async def update_car_endpoint(
     car_id: int,
     car: CarCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: AppUser = Depends(role_required("ADMIN"))
 ):
     """Update car - only accessible to ADMIN users"""
-    db_car = get_car_by_id(db, car_id)
+    try:
+        db_car = await update_car(db, car_id, car)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if db_car is None:
         raise HTTPException(status_code=404, detail="Car not found")
-    return update_car(db, car_id, car)
+    return db_car
 
 @app.delete("/cars/{car_id}")
 async def delete_car_endpoint(
     car_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: AppUser = Depends(role_required("ADMIN"))
 ):
     """Delete car - only accessible to ADMIN users"""
-    success = delete_car(db, car_id)
+    success = await delete_car(db, car_id)
     if not success:
         raise HTTPException(status_code=404, detail="Car not found")
     return {"message": "Car deleted successfully"}
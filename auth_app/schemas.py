@@ -20,21 +20,25 @@ class UserLogin(BaseModel):
     username: str
     password: str
 
-# Car schemas
+# Car schemas (same columns as the shared core.models.Car)
 class CarCreate(BaseModel):
     brand: str
     model: str
     color: str
-    year: int
-    price: float
+    registrationNumber: str
+    modelYear: int
+    price: int
+    owner_id: int
 
 class CarResponse(BaseModel):
     id: int
     brand: str
     model: str
     color: str
-    year: int
-    price: float
+    registrationNumber: str
+    modelYear: int
+    price: int
+    owner_id: int
     
     class Config:
         from_attributes = True
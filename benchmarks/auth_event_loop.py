@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: блокирует ли /login цикл событий auth_app.
+
+Запускает N параллельных логинов через ASGI-транспорт и одновременно
+измеряет задержку "сердцебиения" event loop (asyncio.sleep каждые 5 мс).
+Режим "inline" воспроизводит старое поведение (bcrypt прямо в корутине),
+режим "offload" - текущее (bcrypt в executor).
+
+Использование:
+    python benchmarks/auth_event_loop.py --requests 64 --concurrency 16
+
+По умолчанию используется временная SQLite база (нужен пакет aiosqlite);
+чтобы мерить на PostgreSQL, задайте DATABASE_URL.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.getenv("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="auth_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir}/auth_bench.db"
+# Логин бенчмарка - демо-пользователь admin/admin
+os.environ.setdefault("AUTH_SEED_DEMO", "true")
+
+import httpx  # noqa: E402
+
+from auth_app import crud  # noqa: E402
+from auth_app.auth import verify_password  # noqa: E402
+from auth_app.main import app, startup_event, shutdown_event  # noqa: E402
+
+HEARTBEAT_INTERVAL = 0.005
+
+
+async def heartbeat(stop: asyncio.Event, lags: list):
+    """Записывает, насколько позже положенного просыпается event loop"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(loop.time() - started - HEARTBEAT_INTERVAL)
+
+
+async def inline_verify(plain_password: str, hashed_password: str) -> bool:
+    """Старое поведение: bcrypt выполняется прямо в event loop"""
+    return verify_password(plain_password, hashed_password)
+
+
+async def run_mode(mode: str, total: int, concurrency: int) -> dict:
+    original = crud.verify_password_async
+    if mode == "inline":
+        crud.verify_password_async = inline_verify
+
+    lags: list = []
+    stop = asyncio.Event()
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one_login():
+            async with semaphore:
+                response = await client.post("/login", json={"username": "admin", "password": "admin"})
+                response.raise_for_status()
+
+        beat = asyncio.create_task(heartbeat(stop, lags))
+        started = time.perf_counter()
+        await asyncio.gather(*(one_login() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await beat
+
+    crud.verify_password_async = original
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    return {
+        "mode": mode,
+        "rps": total / elapsed,
+        "lag_p50_ms": statistics.median(lags_ms),
+        "lag_p99_ms": lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))],
+        "lag_max_ms": lags_ms[-1],
+        "beats": len(lags),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    await startup_event()
+    try:
+        print(f"{'mode':<8} {'req/s':>8} {'lag p50':>9} {'lag p99':>9} {'lag max':>9} {'beats':>6}")
+        for mode in ("inline", "offload"):
+            r = await run_mode(mode, args.requests, args.concurrency)
+            print(
+                f"{r['mode']:<8} {r['rps']:>8.1f} {r['lag_p50_ms']:>7.1f}ms "
+                f"{r['lag_p99_ms']:>7.1f}ms {r['lag_max_ms']:>7.1f}ms {r['beats']:>6}"
+            )
+    finally:
+        await shutdown_event()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: латентность подсказок /autocomplete (app/autocomplete.py).
+
+Строит PrefixIndex из --values случайных имен с частотами, затем замеряет
+top-k по префиксам длины 0..4 и вставку/удаление значений (путь записи CRUD).
+Без HTTP и БД - только сама структура данных.
+
+Использование:
+    python benchmarks/autocomplete.py --values 100000 --lookups 20000
+
+Завершается с кодом 1, если p99 поиска превышает --max-p99-us.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+# app.autocomplete импортирует app.db; сама БД бенчмарку не нужна
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/autocomplete.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.autocomplete import PrefixIndex  # noqa: E402
+
+def random_name(rng: random.Random) -> str:
+    letters = string.ascii_lowercase
+    return (rng.choice(string.ascii_uppercase) + "".join(rng.choice(letters) for _ in range(rng.randint(3, 9)))
+            + " " + rng.choice(string.ascii_uppercase) + "".join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+
+def percentile(samples: list, q: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--values", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--max-p99-us", type=float, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    counts = {random_name(rng): rng.randint(1, 1000) for _ in range(args.values)}
+    started = time.perf_counter()
+    index = PrefixIndex(counts)
+    print(f"build: {len(index)} values in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    names = list(counts)
+    worst = 0.0
+    for length in range(5):
+        samples = []
+        for _ in range(args.lookups // 5):
+            prefix = rng.choice(names)[:length]
+            started = time.perf_counter()
+            index.top(prefix, args.limit)
+            samples.append((time.perf_counter() - started) * 1e6)
+        samples.sort()
+        p99 = percentile(samples, 0.99)
+        worst = max(worst, p99)
+        print(f"prefix len {length}: p50={statistics.median(samples):7.1f} us  p99={p99:7.1f} us")
+
+    samples = []
+    for i in range(2000):
+        value = random_name(rng)
+        started = time.perf_counter()
+        index.add(value)
+        index.remove(value)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    print(f"add+remove new value: p50={statistics.median(samples):.1f} us  p99={percentile(samples, 0.99):.1f} us")
+
+    if worst > args.max_p99_us:
+        print(f"FAIL: lookup p99 {worst:.1f} us > {args.max_p99_us} us")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
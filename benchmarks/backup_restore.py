@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Проверка: потоковый бэкап и параллельное восстановление (app/backup.py).
+
+1. Наполняет базу N автомобилями, делает create_backup.
+2. Портит данные и восстанавливает архив через restore_backup.
+3. Сравнивает число строк и контрольную сумму до и после,
+   печатает строк/с, размер архива и пиковую память (tracemalloc + RSS).
+
+Использование:
+    python benchmarks/backup_restore.py --cars 200000 --chunk-size 50000
+
+Завершается с кодом 1, если восстановленные данные отличаются от исходных
+или пиковая память Python превышает --max-memory-mb.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/backup.db")
+os.environ.setdefault("BACKUP_DIR", os.path.join(_tmp, "backups"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, func, insert, select  # noqa: E402
+
+from app.backup import create_backup, peak_rss_mb, restore_backup  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.models import Base, Car, Owner  # noqa: E402
+
+def populate(cars: int, owners: int = 100) -> None:
+    with SessionLocal() as db:
+        db.execute(insert(Owner), [{"firstname": f"First{i}", "lastname": f"Last{i}"} for i in range(owners)])
+        owner_ids = db.execute(select(Owner.ownerid)).scalars().all()
+        batch = 10000
+        for start in range(0, cars, batch):
+            db.execute(insert(Car), [
+                {"brand": f"Brand{i % 20}", "model": f"Model{i % 300}", "color": "Red",
+                 "registrationNumber": f"R-{i:08d}", "registration_key": f"R{i:08d}", "modelYear": 1990 + i % 35,
+                 "price": 1000 + i % 90000, "owner_id": owner_ids[i % len(owner_ids)]}
+                for i in range(start, min(start + batch, cars))
+            ])
+        db.commit()
+
+def fingerprint() -> tuple:
+    with SessionLocal() as db:
+        return (
+            db.execute(select(func.count()).select_from(Owner)).scalar_one(),
+            db.execute(select(func.count(), func.sum(Car.price), func.sum(Car.owner_id), func.max(Car.id))).one(),
+        )
+
+def measure(label: str, fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_mb = peak / 1024 / 1024
+    print(f"{label:<8} rows={result['rows']:<8} time={elapsed:7.2f} s  rows/s={result['rows'] / elapsed:10.0f}  "
+          f"python peak={peak_mb:6.1f} MB  rss peak={peak_rss_mb()} MB")
+    return result, peak_mb
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cars", type=int, default=200000)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-memory-mb", type=float, default=256)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    populate(args.cars)
+    before = fingerprint()
+
+    manifest, backup_peak = measure("backup", lambda: create_backup(engine, chunk_size=args.chunk_size))
+    chunks = sum(len(t["chunks"]) for t in manifest["tables"])
+    print(f"archive  {manifest['backup_id']}: {manifest['bytes'] / 1024 / 1024:.1f} MB, "
+          f"{chunks} chunks, codec={manifest['codec']}")
+
+    with engine.begin() as conn:
+        conn.execute(delete(Car).where(Car.id % 2 == 0))
+    restored, restore_peak = measure(
+        "restore", lambda: restore_backup(engine, manifest["backup_id"], workers=args.workers)
+    )
+    print(f"restore workers={restored['workers']} tables={restored['tables']}")
+
+    after = fingerprint()
+    if after != before:
+        print(f"FAIL: restored data differs: {before} != {after}")
+        sys.exit(1)
+    if max(backup_peak, restore_peak) > args.max_memory_mb:
+        print(f"FAIL: peak memory above {args.max_memory_mb} MB")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Проверка: удаление владельца с большим парком - один DELETE (ON DELETE CASCADE)
+и постоянное число операторов независимо от числа автомобилей.
+
+1. Создает SQLite-базу со старой схемой (FK без каскада, без индекса owner_id),
+   досоздает остальные таблицы (change_log и т.п.), применяет
+   core.migrations.run_migrations и проверяет, что каскад включился.
+2. Считает SQL-операторы при OwnerCRUD.delete (парк из 1 и из --cars
+   автомобилей) и при старом ORM-каскаде (загрузка owner.cars +
+   session.delete), сравнивает время и число строк/параметров.
+
+OwnerCRUD.delete: имя владельца, сгруппированные значения автомобилей для
+индексов в памяти, надгробия автомобилей INSERT ... SELECT, DELETE owner
+(автомобили удаляет каскад), строка журнала для владельца.
+
+Использование:
+    python benchmarks/cascade_delete.py --cars 50000
+
+Завершается с кодом 1, если число операторов зависит от размера парка или
+превышает --max-statements, удаляется больше одного владельца одним DELETE
+или надгробий автомобилей меньше, чем удалено автомобилей.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/cascade.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, func, insert, inspect, select  # noqa: E402
+
+from app.crud import OwnerCRUD  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.models import Base, Car, ChangeLog, Owner  # noqa: E402
+from core.migrations import run_migrations  # noqa: E402
+
+LEGACY_SCHEMA = (
+    "CREATE TABLE owner (ownerid INTEGER PRIMARY KEY AUTOINCREMENT, firstname VARCHAR(100), lastname VARCHAR(100))",
+    "CREATE TABLE car (id INTEGER PRIMARY KEY AUTOINCREMENT, brand VARCHAR(100), model VARCHAR(100),"
+    " color VARCHAR(40), \"registrationNumber\" VARCHAR(40), \"modelYear\" INTEGER, price INTEGER,"
+    " owner_id INTEGER REFERENCES owner(ownerid))",
+)
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.deletes = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+        self.rows += len(parameters) if executemany else 1
+        self.deletes += statement.lstrip().upper().startswith("DELETE")
+
+def populate(cars: int) -> int:
+    with SessionLocal() as db:
+        owner = Owner(firstname="Fleet", lastname="Owner")
+        other = Owner(firstname="Other", lastname="Owner")
+        db.add_all([owner, other])
+        db.flush()
+        rows = [
+            {"brand": "B", "model": f"M{i % 50}", "color": "Red", "registrationNumber": f"F-{i}",
+             "modelYear": 2020, "price": 1000 + i, "owner_id": owner.ownerid}
+            for i in range(cars)
+        ]
+        rows.append({"brand": "K", "model": "Keep", "color": "Blue", "registrationNumber": "KEEP-1",
+                     "modelYear": 2021, "price": 1, "owner_id": other.ownerid})
+        db.execute(insert(Car), rows)
+        db.commit()
+        return owner.ownerid
+
+def remaining_cars() -> int:
+    with SessionLocal() as db:
+        return db.execute(select(func.count()).select_from(Car)).scalar_one()
+
+def car_tombstones() -> int:
+    with SessionLocal() as db:
+        return db.execute(
+            select(func.count()).select_from(ChangeLog).where(ChangeLog.entity == "car", ChangeLog.action == "delete")
+        ).scalar_one()
+
+def measure(label: str, delete_fn, owner_id: int) -> StatementCounter:
+    counter = StatementCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    started = time.perf_counter()
+    try:
+        delete_fn(owner_id)
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22} statements={counter.statements:<4} rows/params={counter.rows:<7} "
+          f"time={elapsed * 1000:8.1f} ms  cars left={remaining_cars()}")
+    return counter
+
+def cascade_delete(owner_id: int) -> None:
+    with SessionLocal() as db:
+        assert OwnerCRUD.delete(db, owner_id)
+
+def legacy_orm_delete(owner_id: int) -> None:
+    # Как было до ON DELETE CASCADE: коллекция загружается и удаляется по объекту
+    with SessionLocal() as db:
+        owner = db.get(Owner, owner_id)
+        list(owner.cars)
+        db.delete(owner)
+        db.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cars", type=int, default=50000)
+    parser.add_argument("--max-statements", type=int, default=5)
+    args = parser.parse_args()
+
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            for ddl in LEGACY_SCHEMA:
+                conn.exec_driver_sql(ddl)
+        # Остальные таблицы (change_log, app_users, ...) - как при старте приложения
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+        fk = inspect(engine).get_foreign_keys("car")[0]
+        indexes = [ix["column_names"] for ix in inspect(engine).get_indexes("car")]
+        print(f"migrated: ondelete={fk['options'].get('ondelete')} indexes={indexes}")
+    else:
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+
+    legacy = measure("legacy ORM cascade", legacy_orm_delete, populate(args.cars))
+    small = measure("ON DELETE CASCADE (1)", cascade_delete, populate(1))
+    tombstones = car_tombstones()
+    new = measure("ON DELETE CASCADE", cascade_delete, populate(args.cars))
+    tombstones = car_tombstones() - tombstones
+    print(f"statements: {legacy.statements} -> {new.statements}, car tombstones: {tombstones}")
+    if new.statements != small.statements or new.statements > args.max_statements:
+        print(f"FAIL: owner delete must take a constant number of statements (<= {args.max_statements}), "
+              f"got {small.statements} for 1 car and {new.statements} for {args.cars}")
+        sys.exit(1)
+    if new.deletes != 1 or remaining_cars() != 3 or tombstones != args.cars:
+        print("FAIL: owner delete must be a single DELETE whose cascade removes the cars, with a tombstone per car")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: "набег" одинаковых запросов на /analytics/overview и /cars/statistics
+(app/coalesce.py).
+
+Внутри процесса (httpx + ASGITransport) шлет --concurrency одинаковых запросов
+одновременно и считает SQL-запросы к БД: с объединением (single-flight) и без
+него (у каждого вызова свой ключ). Печатает время волны и SQL-запросов на волну.
+
+Использование:
+    python benchmarks/coalesce.py --concurrency 50 --waves 5
+
+Завершается с кодом 1, если с объединением SQL-запросов на волну больше,
+чем --max-queries-per-wave (без учета проверки токена).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/coalesce.db")
+os.environ.setdefault("LOG_SAMPLE_RATE", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from app import coalesce  # noqa: E402
+from app.db import engine  # noqa: E402
+from app.main import app, on_shutdown, on_startup  # noqa: E402
+
+PATHS = ("/analytics/overview", "/cars/statistics")
+
+async def run(args) -> int:
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *rest: statements.append(statement))
+    await on_startup()
+    worst = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        credentials = {"username": "bench", "password": "bench-secret"}
+        await client.post("/register/admin", json={**credentials, "confirm_password": credentials["password"]})
+        token = (await client.post("/login", json=credentials)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        # После регистрации клиент получил cookie read-your-writes - с ним объединение выключено
+        client.cookies.clear()
+        for enabled in (False, True):
+            original = coalesce.flights.do
+            if not enabled:
+                # Без объединения: у каждого вызова свой ключ
+                async def unique(key, compute, ttl=None, _do=original):
+                    return await _do(object(), compute, 0)
+                coalesce.flights.do = unique
+            try:
+                for path in PATHS:
+                    timings, queries = [], []
+                    for _ in range(args.waves):
+                        coalesce.flights.clear()
+                        statements.clear()
+                        started = time.perf_counter()
+                        responses = await asyncio.gather(*(client.get(path, headers=headers) for _ in range(args.concurrency)))
+                        timings.append((time.perf_counter() - started) * 1000)
+                        assert all(r.status_code == 200 for r in responses), {r.status_code for r in responses}
+                        # Проверка токена (SELECT app_users) - в каждом запросе, ее не считаем
+                        data_queries = sum(1 for s in statements if "app_users" not in s)
+                        queries.append(data_queries)
+                    label = "coalesced" if enabled else "plain    "
+                    print(f"{label} {path:22} wave={min(timings):7.1f} ms  sql/wave={max(queries)}")
+                    if enabled:
+                        worst = max(worst, max(queries))
+            finally:
+                coalesce.flights.do = original
+    await on_shutdown()
+    return worst
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--waves", type=int, default=5)
+    parser.add_argument("--max-queries-per-wave", type=int, default=10)
+    args = parser.parse_args()
+    worst = asyncio.run(run(args))
+    if worst > args.max_queries_per_wave:
+        print(f"FAIL: {worst} SQL queries per wave > {args.max_queries_per_wave}")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: накладные расходы логирования на запрос.
+
+Каждый режим запускается в отдельном процессе (конфигурация логов читается
+при импорте), вывод логов перехватывается и не печатается:
+
+    legacy   - прежняя настройка: basicConfig(DEBUG), синхронная запись в stderr
+    debug    - очередь + JSON, LOG_LEVEL=DEBUG, access-лог каждого запроса
+    info     - очередь + JSON, LOG_LEVEL=INFO (по умолчанию), выборка LOG_SAMPLE_RATE
+    off      - logging.disable(): нижняя граница
+
+Использование:
+    python benchmarks/logging_overhead.py --requests 2000 --sample-rate 0.1
+
+Печатает запросов/с и среднюю задержку для GET /cars и POST /cars/search, а также
+стоимость самих вызовов логирования в потоке запроса (стабильнее, чем req/s).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ("legacy", "debug", "info", "off")
+REQUESTS = (
+    ("GET", "/cars?limit=20", None),
+    ("POST", "/cars/search", {"brand": "Ford", "min_price": 1000}),
+)
+
+async def run_mode(mode: str, requests: int) -> dict:
+    import logging
+    import httpx
+    from app.main import app, on_shutdown, on_startup
+
+    if mode == "legacy":
+        logging.basicConfig(level=logging.DEBUG, format="%(levelname)s %(name)s: %(message)s", force=True)
+    elif mode == "off":
+        logging.disable(logging.CRITICAL)
+
+    await on_startup()
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        token = (await client.post("/login", json={"username": "bench", "password": "secret1"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for method, path, body in REQUESTS:
+            for _ in range(50):  # прогрев
+                await client.request(method, path, json=body, headers=headers)
+            started = time.perf_counter()
+            for _ in range(requests):
+                response = await client.request(method, path, json=body, headers=headers)
+                assert response.status_code == 200, response.text
+            elapsed = time.perf_counter() - started
+            results[f"{method} {path}"] = {"rps": requests / elapsed, "ms": elapsed / requests * 1000}
+    results["log calls"] = {"us": measure_log_calls()}
+    await on_shutdown()
+    return results
+
+def measure_log_calls(calls: int = 20000) -> float:
+    """Стоимость логирования в потоке запроса (мкс): отладочная запись + access-запись"""
+    import logging
+    from app.schemas import CarQuery
+    from core.logs import log_request
+
+    log = logging.getLogger("lab1")
+    query = CarQuery(brand="Ford", min_price=1000)
+    scope = {"method": "GET", "path": "/cars", "app": None}
+    started = time.perf_counter()
+    for _ in range(calls):
+        log.debug("Advanced car search: %s", query)
+        log_request(scope, 200, 3.5, "bench")
+    return (time.perf_counter() - started) / calls * 1e6
+
+def child(mode: str, requests: int) -> None:
+    sys.path.insert(0, ROOT)
+    print(json.dumps(asyncio.run(run_mode(mode, requests))), file=sys.__stdout__, flush=True)
+
+def prepare_database(url: str) -> None:
+    """Пользователь и немного данных, один раз для всех режимов"""
+    sys.path.insert(0, ROOT)
+    os.environ["DATABASE_URL"] = url
+    from sqlalchemy import insert
+    from app.db import SessionLocal, init_db_with_seed
+    from app.models import AppUser, Car
+    from core.security import hash_password
+
+    init_db_with_seed()
+    with SessionLocal() as db:
+        db.add(AppUser(username="bench", password_hash=hash_password("secret1"), role="ADMIN"))
+        db.execute(insert(Car), [
+            {"brand": "Ford" if i % 3 == 0 else "Nissan", "model": f"M{i}", "color": "Red",
+             "registrationNumber": f"B-{i}", "modelYear": 2000 + i % 20, "price": 1000 + i, "owner_id": 1}
+            for i in range(2000)
+        ])
+        db.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--sample-rate", type=float, default=1.0, help="LOG_SAMPLE_RATE для режима info")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        child(args.mode, args.requests)
+        return
+
+    url = os.getenv("DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/logging.db"
+    prepare_database(url)
+    baseline = None
+    for mode in MODES:
+        env = {**os.environ, "DATABASE_URL": url, "LOG_SAMPLE_RATE": str(args.sample_rate),
+               "LOG_LEVEL": "DEBUG" if mode == "debug" else "INFO"}
+        process = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--requests", str(args.requests)],
+            env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+        if process.returncode != 0:
+            print(f"{mode}: failed\n" + "\n".join(process.stderr.splitlines()[-20:]))
+            sys.exit(1)
+        results = json.loads(process.stdout.strip().splitlines()[-1])
+        baseline = baseline or results
+        calls = results.pop("log calls")["us"]
+        print(f"{mode:<7} {'log calls in request thread':<42} {calls:8.1f} us/request")
+        for path, r in results.items():
+            change = (r["ms"] / baseline[path]["ms"] - 1) * 100
+            print(f"{mode:<7} {path:<42} {r['rps']:8.0f} req/s  {r['ms']:6.2f} ms/req  ({change:+.0f}% vs legacy)")
+
+if __name__ == "__main__":
+    main()
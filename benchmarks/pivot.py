@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: сводные таблицы /analytics/pivot по колоночному снимку (app/pivot.py).
+
+1. Наполняет базу --cars автомобилями и строит снимок car JOIN owner
+   (Arrow при установленном pyarrow, иначе массивы кодов).
+2. Замеряет несколько сводных таблиц (brand x modelYear x color и т.п.)
+   по снимку и тот же GROUP BY в БД, сверяет итоги.
+
+Использование:
+    python benchmarks/pivot.py --cars 1000000 --repeat 5
+
+Завершается с кодом 1, если итоги снимка и БД расходятся или медиана
+самой медленной сводной таблицы превышает --max-ms.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/pivot.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from app.db import SessionLocal, engine  # noqa: E402
+from app.models import Base, Car, Owner  # noqa: E402
+from app.pivot import PivotEngine  # noqa: E402
+
+COLORS = ("Red", "Blue", "Black", "White", "Silver", "Green", "Yellow")
+
+PIVOTS = (
+    (("brand",), ("modelYear",), ("count", "avg")),
+    (("brand", "modelYear"), ("color",), ("count", "avg", "min", "max")),
+    (("model",), (), ("sum",)),
+    (("owner",), ("color",), ("count",)),
+)
+
+def populate(cars: int, owners: int = 1000) -> None:
+    with SessionLocal() as db:
+        db.execute(insert(Owner), [{"firstname": f"First{i}", "lastname": f"Last{i}"} for i in range(owners)])
+        owner_ids = db.execute(select(Owner.ownerid)).scalars().all()
+        batch = 20000
+        for start in range(0, cars, batch):
+            db.execute(insert(Car), [
+                {"brand": f"Brand{i % 40}", "model": f"Model{i % 700}", "color": COLORS[i % 7 * 3 % 7],
+                 "registrationNumber": f"R-{i:08d}", "registration_key": f"R{i:08d}", "modelYear": 1990 + i % 35,
+                 "price": 1000 + i * 7919 % 90000, "owner_id": owner_ids[i % len(owner_ids)]}
+                for i in range(start, min(start + batch, cars))
+            ])
+        db.commit()
+
+def sql_group(keys) -> tuple:
+    columns = [getattr(Car, key) for key in keys]
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        rows = db.execute(select(*columns, func.count(), func.sum(Car.price)).group_by(*columns)).all()
+    return (time.perf_counter() - started) * 1000, sum(row[-2] for row in rows), sum(row[-1] for row in rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cars", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=500)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    populate(args.cars)
+    print(f"populate: {args.cars} cars in {time.perf_counter() - started:.1f} s")
+
+    pivots = PivotEngine(refresh_interval=0)
+    snapshot = pivots.rebuild()
+    print(f"snapshot: engine={snapshot.engine} rows={snapshot.rows} build={snapshot.build_ms:.0f} ms")
+
+    ok, slowest = True, 0.0
+    for rows, cols, measures in PIVOTS:
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            table = pivots.pivot(rows, cols, measures, limit=100000)
+            timings.append((time.perf_counter() - started) * 1000)
+        median = statistics.median(timings)
+        slowest = max(slowest, median)
+        shape = f"{len(table['row_keys'])}x{len(table['col_keys'])}"
+        label = f"{','.join(rows) or '-'} x {','.join(cols) or '-'}"
+        line = f"{label:<28} {shape:>9} pivot p50={median:8.1f} ms"
+        if "owner" not in rows + cols:
+            sql_ms, count, price_sum = sql_group(rows + cols)
+            total = sum(value or 0 for row in table["cells"].get("count", ()) for value in row)
+            summed = sum(value or 0 for row in table["cells"].get("sum", ()) for value in row)
+            if ("count" in measures and total != count) or ("sum" in measures and summed != price_sum):
+                ok = False
+                line += "  MISMATCH"
+            line += f"  sql GROUP BY={sql_ms:8.1f} ms"
+        print(line)
+
+    if not ok:
+        print("FAIL: pivot totals differ from SQL GROUP BY")
+        sys.exit(1)
+    if slowest > args.max_ms:
+        print(f"FAIL: slowest pivot p50 {slowest:.1f} ms > {args.max_ms} ms")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: точность и скорость скетчей цен /analytics/price-distribution
+(app/distributions.py).
+
+Генерирует --rows цен (логнормальное распределение) по --groups группам
+(марка, год), строит скетчи как при перестройке, затем проверяет:
+ошибку квантилей по рангу для слитого по всем группам и для отдельных
+групп против точных значений (сортировка), время слияния на запрос и
+время добавления значений по одному (путь записи CRUD).
+Без HTTP и БД - только сами структуры данных.
+
+Использование:
+    python benchmarks/price_distribution.py --rows 200000 --groups 300
+
+Завершается с кодом 1, если ошибка по рангу превышает --max-rank-error.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+# app.distributions импортирует app.db; сама БД бенчмарку не нужна
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/distribution.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.distributions import DISTRIBUTION_BUCKET, PriceSketch  # noqa: E402
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+def rank_error(exact: list, estimate: float, q: float) -> float:
+    """Насколько ранг оценки отличается от q (для повторяющихся цен - ближайший ранг из диапазона)"""
+    low, high = bisect_left(exact, estimate) / len(exact), bisect_right(exact, estimate) / len(exact)
+    return 0.0 if low <= q <= high else min(abs(low - q), abs(high - q))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--groups", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-rank-error", type=float, default=0.01)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    prices = defaultdict(list)
+    for _ in range(args.rows):
+        # Неравные по размеру группы: популярные марки встречаются чаще
+        group = int(rng.paretovariate(1.2)) % args.groups
+        prices[group].append(int(rng.lognormvariate(10 + group % 5 * 0.2, 0.6)))
+
+    started = time.perf_counter()
+    sketches = {group: PriceSketch.from_prices(list(values), DISTRIBUTION_BUCKET) for group, values in prices.items()}
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    merged = PriceSketch()
+    for sketch in sketches.values():
+        merged.merge(sketch)
+    merge = time.perf_counter() - started
+
+    everything = sorted(price for values in prices.values() for price in values)
+    worst = 0.0
+    print(f"rows={args.rows} groups={len(sketches)} build={build * 1000:.0f} ms merge={merge * 1000:.1f} ms "
+          f"centroids={merged.digest.centroids}")
+    for q in QUANTILES:
+        estimate = merged.digest.quantile(q)
+        error = rank_error(everything, estimate, q)
+        worst = max(worst, error)
+        print(f"  all    p{q * 100:g}: exact={everything[int(q * (len(everything) - 1))]:>9} "
+              f"approx={estimate:>11.1f} rank error={error:.4%}")
+
+    # Самые большие группы - на них ошибка видна, в маленьких центроид на значение
+    largest = sorted(prices, key=lambda g: len(prices[g]), reverse=True)
+    for group in largest[:3]:
+        exact = sorted(prices[group])
+        errors = [rank_error(exact, sketches[group].digest.quantile(q), q) for q in QUANTILES]
+        worst = max(worst, *errors)
+        print(f"  group {group:<3} n={len(exact):<7} rank errors: " + " ".join(f"{e:.4%}" for e in errors))
+
+    sketch = PriceSketch()
+    started = time.perf_counter()
+    for price in prices[largest[0]]:
+        sketch.add(price, DISTRIBUTION_BUCKET)
+    per_add = (time.perf_counter() - started) / len(prices[largest[0]]) * 1e6
+    print(f"incremental add: {per_add:.2f} us/value")
+
+    if worst > args.max_rank_error:
+        print(f"FAIL: rank error {worst:.4%} > {args.max_rank_error:.4%}")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
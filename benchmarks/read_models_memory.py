@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: память и число аллокаций на страницу из 1000 автомобилей.
+
+Сравнивает старый путь (ORM Car + joinedload(Car.owner) -> CarWithOwner)
+с read-моделями (Core select() -> CarRow -> CarWithOwner) через tracemalloc.
+
+Использование:
+    python benchmarks/read_models_memory.py --cars 5000 --page 1000
+
+По умолчанию используется временная SQLite база; чтобы мерить на
+PostgreSQL, задайте DATABASE_URL (таблицы будут заполнены тестовыми данными).
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.getenv("DATABASE_URL"):
+    _tmpdir = tempfile.mkdtemp(prefix="read_models_bench_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir}/bench.db"
+
+from sqlalchemy import func, insert, select  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from app.crud import CarCRUD  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.models import Base, Car, Owner  # noqa: E402
+from app.schemas import CarWithOwner  # noqa: E402
+
+
+def seed(total_cars: int):
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        existing = db.execute(select(func.count(Car.id))).scalar_one()
+        if existing >= total_cars:
+            return
+        owners = [{"firstname": f"First{i}", "lastname": f"Last{i}"} for i in range(max(1, total_cars // 10))]
+        db.execute(insert(Owner), owners)
+        owner_ids = db.execute(select(Owner.ownerid)).scalars().all()
+        cars = [
+            {
+                "brand": f"Brand{i % 40}",
+                "model": f"Model{i % 300}",
+                "color": ("Red", "White", "Black", "Silver")[i % 4],
+                "registrationNumber": f"BEN-{i:06d}",
+                "modelYear": 2000 + i % 25,
+                "price": 10000 + (i * 37) % 90000,
+                "owner_id": owner_ids[i % len(owner_ids)],
+            }
+            for i in range(total_cars - existing)
+        ]
+        db.execute(insert(Car), cars)
+        db.commit()
+
+
+def orm_page(db, limit):
+    """Старый путь: ORM + joinedload + ручная сборка CarWithOwner"""
+    cars = db.query(Car).options(joinedload(Car.owner)).order_by(Car.id).offset(0).limit(limit).all()
+    return [
+        CarWithOwner(
+            id=car.id, brand=car.brand, model=car.model, color=car.color,
+            registrationNumber=car.registrationNumber, modelYear=car.modelYear,
+            price=car.price, owner_id=car.owner_id,
+            owner=f"{car.owner.firstname} {car.owner.lastname}" if car.owner else None,
+            owner_firstname=car.owner.firstname if car.owner else None,
+            owner_lastname=car.owner.lastname if car.owner else None
+        )
+        for car in cars
+    ]
+
+
+def read_model_page(db, limit):
+    """Новый путь: CarCRUD.get_all -> CarRow -> CarWithOwner"""
+    return [CarWithOwner.model_validate(car) for car in CarCRUD.get_all(db, skip=0, limit=limit)]
+
+
+def measure(fn, limit):
+    with SessionLocal() as db:
+        fn(db, limit)  # прогрев кэша компиляции SQL
+    gc.collect()
+    with SessionLocal() as db:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+        page = fn(db, limit)
+        elapsed = time.perf_counter() - started
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    retained = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    return len(page), blocks, retained, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cars", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=1000)
+    args = parser.parse_args()
+
+    seed(args.cars)
+    print(f"{'path':<12} {'rows':>6} {'alloc blocks':>13} {'retained KiB':>13} {'peak KiB':>10} {'time ms':>9}")
+    for name, fn in (("orm", orm_page), ("read-model", read_model_page)):
+        rows, blocks, retained, peak, elapsed = measure(fn, args.page)
+        print(f"{name:<12} {rows:>6} {blocks:>13} {retained / 1024:>13.1f} {peak / 1024:>10.1f} {elapsed * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
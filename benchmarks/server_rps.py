@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: RPS в зависимости от числа воркеров serve.py.
+
+Для каждого значения --workers поднимает `python serve.py` на свободном порту,
+нагружает его несколькими процессами-клиентами (httpx, keep-alive) и печатает
+запросов/с, p50/p99 и число ошибок. С --hup посреди прогона мастеру
+отправляется SIGHUP (плавный перезапуск воркеров) - ошибок быть не должно.
+
+Использование:
+    python benchmarks/server_rps.py --workers 1 2 4 --seconds 10 --concurrency 64
+    python benchmarks/server_rps.py --workers 2 --hup
+
+По умолчанию временная SQLite база; для PostgreSQL задайте DATABASE_URL.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ("/api/status", "/cars?limit=20")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(workers: int, port: int, env: dict) -> subprocess.Popen:
+    env = {**env, "WEB_CONCURRENCY": str(workers), "PORT": str(port), "HOST": "127.0.0.1",
+           "SERVER": "uvicorn", "LOG_SAMPLE_RATE": "0"}
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "serve.py")], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    import httpx
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/status", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("serve.py did not start")
+
+async def client_loop(port: int, token: str, seconds: float, concurrency: int) -> dict:
+    import httpx
+    latencies, errors = [], 0
+    deadline = time.monotonic() + seconds
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", headers=headers, limits=limits) as client:
+        async def worker(n: int):
+            nonlocal errors
+            i = n
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(PATHS[i % len(PATHS)], timeout=10)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+                i += 1
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return {"latencies": latencies, "errors": errors}
+
+def client_process(args) -> dict:
+    return asyncio.run(client_loop(*args))
+
+def login(port: int) -> str:
+    import httpx
+    base = f"http://127.0.0.1:{port}"
+    httpx.post(f"{base}/register/admin", json={"username": "bench", "password": "secret1", "confirm_password": "secret1"})
+    return httpx.post(f"{base}/login", json={"username": "bench", "password": "secret1"}).json()["access_token"]
+
+def run(workers: int, args, env: dict) -> None:
+    port = free_port()
+    server = start_server(workers, port, env)
+    try:
+        token = login(port)
+        per_client = max(1, args.concurrency // args.clients)
+        jobs = [(port, token, args.seconds, per_client)] * args.clients
+        with multiprocessing.Pool(args.clients) as pool:
+            pending = pool.map_async(client_process, jobs)
+            if args.hup:
+                time.sleep(args.seconds / 2)
+                server.send_signal(signal.SIGHUP)
+            results = pending.get()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+    latencies = sorted(l for r in results for l in r["latencies"])
+    errors = sum(r["errors"] for r in results)
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+    print(f"workers={workers:<3} {len(latencies) / args.seconds:8.0f} req/s  "
+          f"p50={statistics.median(latencies) * 1000:6.1f} ms  p99={p99 * 1000:6.1f} ms  errors={errors}"
+          + ("  (SIGHUP mid-run)" if args.hup else ""))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=2, help="процессов-клиентов (генератор нагрузки тоже ест CPU)")
+    parser.add_argument("--hup", action="store_true", help="SIGHUP мастеру посреди прогона")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/rps.db")
+    print(f"cores available: {len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}")
+    for workers in args.workers:
+        run(workers, args, env)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: размер на проводе и CPU кодирования/декодирования страницы /cars.
+
+Для страницы из N CarRow сравнивает форматы JSON (как отдает FastAPI через
+CarWithOwner), MessagePack и Arrow IPC в сочетании с gzip / br / zstd.
+
+Использование:
+    python benchmarks/wire_formats.py --rows 1000 --repeat 20
+
+Базы данных не требует; форматы и кодеки без установленных пакетов пропускаются.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter  # noqa: E402
+from typing import List  # noqa: E402
+
+from app import compression, wire  # noqa: E402
+from app.read_models import CarRow  # noqa: E402
+from app.schemas import CarWithOwner  # noqa: E402
+
+BRANDS = ["Toyota", "Ford", "Nissan", "BMW", "Audi", "Kia", "Hyundai", "Lada"]
+COLORS = ["Red", "White", "Black", "Silver", "Blue"]
+
+
+def make_rows(n: int) -> List[CarRow]:
+    return [
+        CarRow(
+            id=i, brand=BRANDS[i % len(BRANDS)], model=f"Model{i % 40}", color=COLORS[i % len(COLORS)],
+            registrationNumber=f"KZ-{i:06d}", modelYear=2000 + i % 25, price=5_000_000 + (i * 7919) % 20_000_000,
+            owner_id=1 + i % 200, owner_firstname=f"Name{i % 200}", owner_lastname=f"Surname{i % 200}",
+        )
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat: int):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return result, statistics.median(samples) * 1000
+
+
+def formats(rows):
+    adapter = TypeAdapter(List[CarWithOwner])
+    yield "json", lambda: adapter.dump_json([CarWithOwner.model_validate(r) for r in rows]), json.loads
+    if wire.msgpack is not None:
+        yield "msgpack", lambda: wire.encode_msgpack(wire.car_dicts(rows)), lambda b: wire.msgpack.unpackb(b)
+    if wire.pa is not None:
+        yield "arrow", lambda: wire.encode_arrow(rows), lambda b: wire.pa.ipc.open_stream(b).read_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    encodings = ["identity"] + compression.available_encodings()
+    print(f"{'format':<8} {'encoding':<9} {'bytes':>9} {'encode ms':>10} {'compress ms':>12} {'decode ms':>10}")
+    for name, encode, decode in formats(rows):
+        body, encode_ms = timed(encode, args.repeat)
+        _, decode_ms = timed(lambda: decode(body), args.repeat)
+        for encoding in encodings:
+            if encoding == "identity":
+                size, compress_ms = len(body), 0.0
+            else:
+                compressed, compress_ms = timed(lambda: compression.compress_body(body, encoding), args.repeat)
+                size = len(compressed)
+            print(f"{name:<8} {encoding:<9} {size:>9} {encode_ms:>10.2f} {compress_ms:>12.2f} {decode_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Shared core for app and auth_app: engine/session factory, models, auth pipeline
@@ -0,0 +1,112 @@
+"""
+Запись автомобилей - один путь для app (CarCRUD) и auth_app (/cars).
+
+Проверки (владелец существует, лимит автомобилей на владельца, свободный
+номер), событие ленты и строка журнала синхронизации - в одной транзакции.
+После COMMIT вызываются подписчики on_car_write: app обновляет свои кэши
+и индексы в памяти; в процессе без подписчиков (auth_app) их догоняют
+воркеры app по версии журнала изменений.
+"""
+
+import logging
+from typing import Callable, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .change_feed import ENTITY_FIELDS, record_change
+from .models import Car, Owner, normalize_plate
+from .sync import track_change
+from .system_settings import settings as system_settings
+
+log = logging.getLogger(__name__)
+
+# callback(old, new): old - значения полей до записи (None для создания), new - автомобиль (None для удаления)
+_listeners: List[Callable] = []
+
+def on_car_write(callback: Callable) -> Callable:
+    """Подписаться на записи автомобилей (вызывается после COMMIT)"""
+    _listeners.append(callback)
+    return callback
+
+def _notify(old: Optional[dict], new: Optional[Car]) -> None:
+    for callback in _listeners:
+        try:
+            callback(old, new)
+        except Exception as e:
+            log.warning("Car write listener %s failed: %s", getattr(callback, "__name__", callback), e)
+
+def _values(car: Car) -> dict:
+    return {field: getattr(car, field) for field in ENTITY_FIELDS["car"]}
+
+# ==================== CHECKS ====================
+
+def check_owner_exists(db: Session, owner_id: int) -> None:
+    """ValueError, если владельца нет"""
+    if db.query(Owner).filter(Owner.ownerid == owner_id).first() is None:
+        raise ValueError(f"Владелец с ID {owner_id} не найден")
+
+def check_owner_limit(db: Session, owner_id: int) -> None:
+    """ValueError, если у владельца уже max_cars_per_owner автомобилей (0 - без ограничения)"""
+    limit = system_settings.get("max_cars_per_owner")
+    if limit and db.execute(select(func.count()).select_from(Car).where(Car.owner_id == owner_id)).scalar_one() >= limit:
+        raise ValueError(f"У владельца {owner_id} уже максимальное число автомобилей ({limit})")
+
+def check_registration_free(db: Session, plate: Optional[str], exclude_id: Optional[int] = None) -> None:
+    """ValueError, если номер (после нормализации) уже у другого автомобиля"""
+    key = normalize_plate(plate)
+    if key is None:
+        return
+    stmt = select(Car.id).where(Car.registration_key == key)
+    if exclude_id is not None:
+        stmt = stmt.where(Car.id != exclude_id)
+    if db.execute(stmt).first() is not None:
+        raise ValueError(f"Автомобиль с номером {plate} уже существует")
+
+# ==================== WRITES ====================
+
+def create_car(db: Session, data: dict) -> Car:
+    """Создать автомобиль; ValueError, если проверки не прошли"""
+    check_owner_exists(db, data["owner_id"])
+    check_owner_limit(db, data["owner_id"])
+    check_registration_free(db, data.get("registrationNumber"))
+    db_car = Car(**data)
+    db.add(db_car)
+    record_change(db, "car", "created", db_car)
+    track_change(db, "car", db_car)
+    db.commit()
+    db.refresh(db_car)
+    _notify(None, db_car)
+    return db_car
+
+def update_car(db: Session, car_id: int, changes: dict) -> Optional[Car]:
+    """Изменить поля автомобиля; None - автомобиля нет, ValueError - проверки не прошли"""
+    db_car = db.query(Car).filter(Car.id == car_id).first()
+    if db_car is None:
+        return None
+    if changes.get("owner_id", db_car.owner_id) != db_car.owner_id:
+        check_owner_exists(db, changes["owner_id"])
+        check_owner_limit(db, changes["owner_id"])
+    if "registrationNumber" in changes:
+        check_registration_free(db, changes["registrationNumber"], exclude_id=car_id)
+    old = _values(db_car)
+    for field, value in changes.items():
+        setattr(db_car, field, value)
+    record_change(db, "car", "updated", db_car)
+    track_change(db, "car", db_car)
+    db.commit()
+    db.refresh(db_car)
+    _notify(old, db_car)
+    return db_car
+
+def delete_car(db: Session, car_id: int) -> bool:
+    """Удалить автомобиль; False - автомобиля нет"""
+    db_car = db.query(Car).filter(Car.id == car_id).first()
+    if db_car is None:
+        return False
+    # После COMMIT атрибуты удаленного объекта уже не загрузить
+    old = _values(db_car)
+    db.delete(db_car)
+    record_change(db, "car", "deleted", {"id": car_id})
+    track_change(db, "car", car_id, deleted=True)
+    db.commit()
+    _notify(old, None)
+    return True
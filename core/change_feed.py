@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session
+from .db import AsyncSyncSession, SessionLocal, engine
+from .models import ChangeLog
+
+log = logging.getLogger(__name__)
+
+# ==================== CONFIG ====================
+
+# Последних событий в памяти воркера для возобновления по Last-Event-ID
+CHANGE_FEED_BUFFER = int(os.getenv("CHANGE_FEED_BUFFER", "1000"))
+# Интервал heartbeat для SSE/WebSocket (держит соединение за прокси и выявляет отключения)
+CHANGE_FEED_HEARTBEAT = float(os.getenv("CHANGE_FEED_HEARTBEAT", "15"))
+CHANGE_FEED_CHANNEL = "change_feed"
+
+ENTITIES = ("car", "owner")
+# Поля сущностей в событиях (как в CarResponse / OwnerResponse без вложенных автомобилей)
+ENTITY_FIELDS = {
+    "car": ("id", "brand", "model", "color", "registrationNumber", "modelYear", "price", "owner_id"),
+    "owner": ("ownerid", "firstname", "lastname"),
+}
+_ENTITY_ID = {"car": "id", "owner": "ownerid"}
+
+# Маркер для подписчика: его позиция потеряна, клиент должен перечитать данные целиком
+RESET = {"type": "reset"}
+
+def _last_version(db) -> int:
+    return db.scalar(select(func.max(ChangeLog.version))) or 0
+
+# ==================== BROADCASTER ====================
+
+class ChangeFeed:
+    """Рассылка событий изменений подписчикам одного воркера.
+
+    id события - версия change_log, записанная той же транзакцией: она
+    общая для всех воркеров, поэтому Last-Event-ID, полученный от одного
+    воркера, годится для переподключения к любому другому. Последние
+    capacity событий хранятся в кольце; feed знает все события с версией
+    больше floor (версия на момент reset() или вытесненное из кольца
+    событие). Подписчик с Last-Event-ID от floor до последней известной
+    версии получает пропущенные события, иначе - RESET. publish()
+    потокобезопасен: будит event loop одним call_soon_threadsafe.
+    """
+
+    def __init__(self, capacity: int = CHANGE_FEED_BUFFER):
+        self._events: deque = deque(maxlen=capacity)
+        self._floor = 0
+        self._version = 0
+        # Счетчик reset(): подписчик, заставший сброс, получает RESET
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._subscribers: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def last_event_id(self) -> str:
+        return str(self._version)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, change: dict) -> None:
+        version = int(change["id"])
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self._floor = self._events[0][0]
+            self._events.append((version, change))
+            self._version = max(self._version, version)
+        self._notify()
+
+    def reset(self, version: int) -> None:
+        """Забыть историю: полной считается лента только после version,
+        подписчики и более старые Last-Event-ID получат RESET"""
+        with self._lock:
+            self._events.clear()
+            self._floor = self._version = version
+            self._generation += 1
+        self._notify()
+
+    def _notify(self) -> None:
+        loop = self._loop
+        if loop is not None and self._subscribers:
+            try:
+                loop.call_soon_threadsafe(self._wake)
+            except RuntimeError:
+                # Цикл уже закрыт (остановка процесса)
+                pass
+
+    def _wake(self) -> None:
+        for wake in self._subscribers:
+            wake.set()
+
+    def _after(self, version: int, generation: int) -> Tuple[List[dict], int, int, bool]:
+        """События после позиции: (события, новая позиция, новое поколение, позиция потеряна)"""
+        with self._lock:
+            lost = generation != self._generation or not self._floor <= version <= self._version
+            if lost:
+                return [], self._version, self._generation, True
+            return [change for number, change in self._events if number > version], self._version, generation, False
+
+    async def subscribe(
+        self, last_event_id: Optional[str] = None, entities: Iterable[str] = ENTITIES,
+        heartbeat: float = CHANGE_FEED_HEARTBEAT,
+    ) -> AsyncIterator[Optional[dict]]:
+        """События по мере поступления; None - пора отправить heartbeat"""
+        self._loop = asyncio.get_running_loop()
+        entities = set(entities)
+        wake = asyncio.Event()
+        self._subscribers.add(wake)
+        try:
+            generation = self._generation
+            if last_event_id and last_event_id.isdigit():
+                version = int(last_event_id)
+            else:
+                if last_event_id:
+                    yield RESET
+                version = self._version
+            while True:
+                changes, version, generation, lost = self._after(version, generation)
+                if lost:
+                    yield RESET
+                for change in changes:
+                    if change["entity"] in entities:
+                        yield change
+                try:
+                    await asyncio.wait_for(wake.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                wake.clear()
+        finally:
+            self._subscribers.discard(wake)
+
+feed = ChangeFeed()
+
+# ==================== RECORDING ====================
+# CRUD регистрирует изменения в сессии до COMMIT; id события - версия
+# change_log этой транзакции (журнал пишется раньше, см. core/sync.py;
+# без строк журнала - последняя версия). С
+# PostgreSQL + psycopg 3 события уходят через pg_notify в той же транзакции
+# (доставляются только после COMMIT, всем воркерам, в порядке коммитов).
+# Процесс, в котором слушатель не запущен (SQLite, psycopg2, скрипты), кладет
+# события в свой feed после COMMIT. При ROLLBACK события отбрасываются.
+# Хуки висят и на SessionLocal (app), и на сессиях под AsyncSession (auth_app).
+
+def record_change(db: Session, entity: str, action: str, target) -> None:
+    """Запомнить изменение: target - ORM-объект (created/updated) или dict с id (deleted и т.п.)"""
+    db.info.setdefault("change_events", []).append((entity, action, target))
+
+def _serialize(entity: str, action: str, target) -> dict:
+    key = _ENTITY_ID[entity]
+    if isinstance(target, dict):
+        data = dict(target)
+    else:
+        data = {field: getattr(target, field) for field in ENTITY_FIELDS[entity]}
+    entity_id = data.get(key)
+    if action not in ("created", "updated"):
+        # deleted, imported: только дополнительные сведения без самой записи
+        data.pop(key, None)
+    return {
+        "entity": entity,
+        "action": action,
+        "entity_id": entity_id,
+        "data": data or None,
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+    }
+
+def _can_notify(bind) -> bool:
+    # LISTEN умеет только ChangeFeedListener на psycopg 3: с другими драйверами NOTIFY никто не слушает
+    return bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg"
+
+def _notify(conn, payload: dict) -> None:
+    conn.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": CHANGE_FEED_CHANNEL, "payload": json.dumps(payload, default=str)},
+    )
+
+def _before_commit(session: Session) -> None:
+    pending = session.info.pop("change_events", None)
+    if not pending:
+        return
+    # Новые объекты получают id при flush
+    session.flush()
+    # Версию своих строк журнала записал хук core/sync.py (он выполняется раньше)
+    version = session.info.pop("change_log_version", None)
+    event_id = str(version if version is not None else _last_version(session))
+    changes = [{"id": event_id, **_serialize(*item)} for item in pending]
+    if _can_notify(session.get_bind()):
+        for change in changes:
+            _notify(session, change)
+    if not listener.running:
+        session.info["change_feed_outgoing"] = changes
+
+def _after_commit(session: Session) -> None:
+    for change in session.info.pop("change_feed_outgoing", ()):
+        feed.publish(change)
+
+def _after_rollback(session: Session) -> None:
+    session.info.pop("change_events", None)
+    session.info.pop("change_feed_outgoing", None)
+
+for _target in (SessionLocal, AsyncSyncSession):
+    event.listen(_target, "before_commit", _before_commit)
+    event.listen(_target, "after_commit", _after_commit)
+    event.listen(_target, "after_rollback", _after_rollback)
+
+def broadcast_reset() -> None:
+    """Сбросить ленту во всех воркерах (после восстановления бэкапа и т.п.)"""
+    with engine.begin() as conn:
+        version = _last_version(conn)
+        if _can_notify(engine):
+            _notify(conn, {**RESET, "version": version})
+    if not listener.running:
+        feed.reset(version)
+
+# ==================== CROSS-WORKER FAN-OUT ====================
+
+class ChangeFeedListener:
+    """LISTEN change_feed на отдельном соединении (PostgreSQL + psycopg 3).
+
+    Каждый воркер, включая записавший, получает события из NOTIFY в одном
+    и том же порядке и кладет их в свой feed. Без psycopg 3 слушатель не
+    запускается, и каждый воркер видит только свои записи.
+    """
+
+    def __init__(self, target: ChangeFeed = feed, reconnect_interval: float = 5):
+        self.feed = target
+        self.reconnect_interval = reconnect_interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._connection = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        if not _can_notify(engine):
+            if engine.dialect.name == "postgresql":
+                log.warning("Change feed needs psycopg 3 for cross-worker delivery: each worker streams only its own writes")
+            try:
+                with engine.connect() as conn:
+                    self.feed.reset(_last_version(conn))
+            except Exception as e:
+                # Таблицы может еще не быть (БД недоступна при старте)
+                log.warning("Could not read change log version: %s", e)
+            return
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="change-feed-listen", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.reconnect_interval + 1)
+            self._thread = None
+        self._close()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self._connection is None:
+                    raw = engine.raw_connection()
+                    # Соединение забирается из пула насовсем
+                    raw.detach()
+                    self._connection = raw.driver_connection
+                    self._connection.autocommit = True
+                    self._connection.execute(f"LISTEN {CHANGE_FEED_CHANNEL}")
+                    # Все, что закоммичено после LISTEN, придет уведомлением; более
+                    # ранние события (в том числе за время переподключения) не восстановить
+                    version = self._connection.execute(f"SELECT max(version) FROM {ChangeLog.__tablename__}").fetchone()[0]
+                    self.feed.reset(version or 0)
+                for notify in self._connection.notifies(timeout=self.reconnect_interval):
+                    change = json.loads(notify.payload)
+                    if change.get("type") == RESET["type"]:
+                        self.feed.reset(change["version"])
+                    else:
+                        self.feed.publish(change)
+            except Exception as e:
+                log.warning("Change feed listener failed: %s", e)
+                self._close()
+                self._stop.wait(self.reconnect_interval)
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+listener = ChangeFeedListener()
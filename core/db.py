@@ -0,0 +1,230 @@
+import os
+import logging
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+# Единая фабрика engine/сессий для app и auth_app
+log = logging.getLogger(__name__)
+
+# В production (Railway/Render) используем ТОЛЬКО переменные окружения
+# Проверяем, не в production ли мы
+is_production = os.getenv("PORT") or os.getenv("RAILWAY_ENVIRONMENT") or os.getenv("RENDER")
+
+# Загружаем config.env ТОЛЬКО для локальной разработки (если DATABASE_URL не установлен и не production)
+database_url_from_env = os.getenv("DATABASE_URL")
+if not database_url_from_env and not is_production:
+    try:
+        load_dotenv("config.env", override=True)
+        log.info("Loaded config.env for local development")
+    except Exception as e:
+        log.warning("Could not load config.env: %s", e)
+
+# Перезагружаем переменные окружения с приоритетом
+load_dotenv(override=True)
+
+# Логируем статус DATABASE_URL (без полного URL для безопасности)
+database_url_status = "SET" if os.getenv("DATABASE_URL") else "NOT SET"
+log.info("=" * 80)
+log.info("Database configuration: DATABASE_URL=%s", database_url_status)
+log.info("=" * 80)
+
+# Настройки пула (переопределяются переменными окружения)
+DB_ECHO = os.getenv("DB_ECHO", "False").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))  # Переподключение каждый час
+# Общий лимит соединений всех воркеров к одной БД (меньше max_connections сервера);
+# делится на WEB_CONCURRENCY процессов, см. pool_limits()
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# psycopg 3 готовит запрос на сервере после N выполнений одного и того же текста SQL;
+# "none" отключает (нужно для pgbouncer в режиме transaction pooling)
+DB_PREPARE_THRESHOLD = os.getenv("DB_PREPARE_THRESHOLD", "2")
+
+def get_db_url():
+    """Получить URL подключения к БД ТОЛЬКО из DATABASE_URL"""
+    database_url = os.getenv("DATABASE_URL")
+
+    if database_url is None:
+        log.error("=" * 80)
+        log.error("CRITICAL ERROR: DATABASE_URL is not set!")
+        log.error("=" * 80)
+        log.error("The application requires DATABASE_URL environment variable to be set.")
+        log.error("On Railway:")
+        log.error("1. Go to Railway Dashboard → Your Backend Service")
+        log.error("2. Variables → New Variable")
+        log.error("3. KEY: DATABASE_URL")
+        log.error("4. VALUE: ${{ Postgres.DATABASE_URL }}")
+        log.error("5. Save and redeploy")
+        log.error("=" * 80)
+        raise RuntimeError(
+            "DATABASE_URL is not set. Configure it in Railway Variables."
+        )
+
+    database_url = normalize_db_url(database_url)
+    log.info("Using DATABASE_URL: %s", mask_db_url(database_url))
+
+    return database_url
+
+def normalize_db_url(database_url: str) -> str:
+    """Привести URL к драйверу psycopg 3"""
+    # Railway/Render могут использовать postgres:// вместо postgresql://
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql+psycopg://", 1)
+    # Также проверяем postgresql:// без psycopg
+    elif database_url.startswith("postgresql://") and "+psycopg" not in database_url:
+        database_url = database_url.replace("postgresql://", "postgresql+psycopg://", 1)
+    return database_url
+
+def mask_db_url(database_url: str) -> str:
+    """Маскируем пароль для логирования"""
+    return database_url.split("@")[0].split(":")[0] + "://***:***@" + "@".join(database_url.split("@")[1:]) if "@" in database_url else "***"
+
+def get_async_url(url: str) -> str:
+    """Сопоставить синхронный URL с asyncio-драйвером"""
+    if url.startswith("postgresql+psycopg2://"):
+        return url.replace("postgresql+psycopg2://", "postgresql+psycopg://", 1)
+    if url.startswith("mysql+pymysql://") or url.startswith("mysql://"):
+        return "mysql+aiomysql://" + url.split("://", 1)[1]
+    if url.startswith("sqlite://") and "+aiosqlite" not in url:
+        # Нужен опциональный пакет aiosqlite (только для локальной разработки)
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    # psycopg 3 сам поддерживает asyncio
+    return url
+
+def build_connect_args(url: str) -> dict:
+    """Параметры подключения DBAPI для конкретного диалекта"""
+    if url.startswith("sqlite"):
+        # Сессии FastAPI живут в пуле потоков
+        return {"check_same_thread": False}
+
+    # Подготовка connect_args с поддержкой SSL для облачных PostgreSQL
+    connect_args = {
+        "connect_timeout": 10,
+    }
+
+    # Для PostgreSQL добавляем SSL если не указан в URL
+    # Railway использует внутренний URL (postgres.railway.internal), который не требует SSL
+    # Но если используется внешний URL, может потребоваться SSL
+    if "postgresql" in url or "postgres" in url:
+        # Проверяем, не указан ли уже sslmode в URL
+        if "sslmode" not in url.lower():
+            # Для внешних подключений (не internal) может потребоваться SSL
+            # Railway обычно использует внутренний URL (postgres.railway.internal), который не требует SSL
+            # Локальный PostgreSQL (localhost) обычно работает без SSL
+            if "railway.internal" not in url.lower() and "localhost" not in url and "127.0.0.1" not in url:
+                connect_args["sslmode"] = "require"
+                log.info("Added SSL mode 'require' for PostgreSQL connection (external URL)")
+            else:
+                log.info("Using internal PostgreSQL URL (SSL not required)")
+        else:
+            log.info("SSL mode already specified in DATABASE_URL")
+        if "+psycopg" in url and "+psycopg2" not in url:
+            if DB_PREPARE_THRESHOLD.lower() == "none":
+                connect_args["prepare_threshold"] = None
+            else:
+                connect_args["prepare_threshold"] = int(DB_PREPARE_THRESHOLD)
+    elif "mysql" in url:
+        # Для MySQL используем charset
+        connect_args["charset"] = "utf8mb4"
+    return connect_args
+
+def pool_limits(workers: int = WEB_CONCURRENCY, max_connections: int = DB_MAX_CONNECTIONS) -> tuple:
+    """(pool_size, max_overflow) одного процесса.
+
+    Без DB_MAX_CONNECTIONS - DB_POOL_SIZE/DB_MAX_OVERFLOW как есть. С ним бюджет
+    процесса = DB_MAX_CONNECTIONS // workers минус два соединения вне пула
+    (LISTEN настроек и ленты изменений), и pool_size + max_overflow в него укладываются.
+    """
+    if max_connections <= 0:
+        return DB_POOL_SIZE, DB_MAX_OVERFLOW
+    budget = max(1, max_connections // max(1, workers) - 2)
+    pool_size = min(DB_POOL_SIZE, budget)
+    return pool_size, min(DB_MAX_OVERFLOW, budget - pool_size)
+
+def engine_options(url: str) -> dict:
+    """Параметры пула для create_engine / create_async_engine"""
+    options = {"echo": DB_ECHO}
+    if not url.startswith("sqlite"):
+        pool_size, max_overflow = pool_limits()
+        options.update(
+            pool_pre_ping=True,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return options
+
+def enable_sqlite_foreign_keys(sync_engine) -> None:
+    """SQLite по умолчанию не проверяет внешние ключи (и не выполняет ON DELETE CASCADE)"""
+    if sync_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+# Получаем DATABASE_URL - если не установлен, будет RuntimeError
+DB_URL = get_db_url()
+connect_args = build_connect_args(DB_URL)
+
+# Создаем engine с правильными параметрами
+engine = create_engine(DB_URL, connect_args=connect_args, **engine_options(DB_URL))
+enable_sqlite_foreign_keys(engine)
+
+# Создаем SessionLocal для работы с БД
+SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+class AsyncSyncSession(Session):
+    """Синхронная сессия под AsyncSession: отдельный класс, чтобы события сессии
+    (before_commit и т.п.) вешались на async-сессии, не затрагивая любую Session"""
+
+# Асинхронный engine создается лениво, чтобы импорт пакета
+# не требовал async-драйвер, пока async-маршрут не вызван
+_async_engine = None
+_async_session_factory = None
+
+def get_async_engine():
+    """Вернуть общий AsyncEngine, создав его при первом обращении"""
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        async_url = get_async_url(DB_URL)
+        _async_engine = create_async_engine(
+            async_url, connect_args=build_connect_args(async_url), **engine_options(async_url)
+        )
+        enable_sqlite_foreign_keys(_async_engine.sync_engine)
+        _async_session_factory = async_sessionmaker(
+            _async_engine, class_=AsyncSession, sync_session_class=AsyncSyncSession,
+            autoflush=False, expire_on_commit=False,
+        )
+    return _async_engine
+
+def AsyncSessionLocal() -> AsyncSession:
+    """Создать AsyncSession на общем async engine"""
+    get_async_engine()
+    return _async_session_factory()
+
+# Dependency для получения сессии БД
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    """Dependency для получения асинхронной сессии БД"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_engines():
+    """Закрыть соединения пулов при остановке"""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    engine.dispose()
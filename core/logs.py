@@ -0,0 +1,322 @@
+"""
+Структурированное логирование: очередь + фоновый поток записи, JSON-записи,
+access-лог с выборкой по маршрутам, кольцевой буфер последних записей.
+
+Поток запроса только кладет LogRecord в очередь; форматирование сообщения
+(%-аргументы), сериализация в JSON и запись в поток вывода выполняются
+в потоке QueueListener. Отладочные вызовы log.debug("...%s", x) ниже
+LOG_LEVEL стоят одну проверку isEnabledFor.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+
+# ==================== CONFIG ====================
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json - одна запись на строку (production), text - прежний человекочитаемый формат
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Записей в очереди; при переполнении новые записи отбрасываются, а не блокируют запрос
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Доля успешных запросов, попадающих в access-лог
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+# Переопределения по маршрутам: "GET /cars=0.01,/api/status=0"
+LOG_ROUTE_SAMPLE_RATES = os.getenv("LOG_ROUTE_SAMPLE_RATES", "")
+# Медленные запросы логируются всегда (WARNING), независимо от выборки
+LOG_SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", "1000"))
+# Записей в кольцевом буфере для /settings/logs (0 - выключен)
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "2000"))
+
+TEXT_FORMAT = "%(levelname)s %(name)s: %(message)s"
+REQUEST_ID_HEADER = b"x-request-id"
+
+access_log = logging.getLogger("access")
+
+# Идентификатор текущего запроса (виден и в sync-эндпоинтах из пула потоков)
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+# ASGI scope текущего запроса: роутер дописывает в него endpoint на месте
+request_scope_var: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+# Стандартные атрибуты LogRecord; все остальное - поля из extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+# ==================== FORMATTING ====================
+
+class JsonFormatter(logging.Formatter):
+    """Запись в одну JSON-строку: ts, level, logger, msg + поля из extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+class _ContextFilter(logging.Filter):
+    """Добавляет request_id текущего запроса к каждой записи"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        return True
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в потоке запроса и без блокировки"""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Стандартный prepare() форматирует сообщение здесь же; откладываем его
+        # до потока записи. Traceback рендерится сразу: кадры стека не живут долго.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Стандартный put_nowait падает на полной очереди - ждем, пока поток записи ее разберет
+        self.queue.put(self._sentinel)
+
+# ==================== RING BUFFER ====================
+
+class LogRingBuffer(logging.Handler):
+    """Последние capacity записей в памяти процесса (фиксированный объем).
+
+    Пишет только поток QueueListener - один писатель, слот перезаписывается
+    без блокировок читателей. Читатель сверяет id в слоте и пропускает
+    записи, перезаписанные во время чтения. Буфер свой у каждого воркера.
+    """
+
+    def __init__(self, capacity: int):
+        super().__init__()
+        self.capacity = capacity
+        self._slots: List[Optional[Tuple[int, float, dict]]] = [None] * capacity
+        self._next_id = 1
+
+    def emit(self, record: logging.LogRecord) -> None:
+        entry_id = self._next_id
+        entry = {
+            "id": entry_id,
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key in ("method", "route", "status", "duration_ms"):
+            if hasattr(record, key):
+                entry[key] = getattr(record, key)
+        self._slots[entry_id % self.capacity] = (entry_id, record.created, entry)
+        self._next_id = entry_id + 1
+
+    @property
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+    def query(
+        self,
+        after: Optional[int] = None,
+        level: int = logging.NOTSET,
+        route: Optional[str] = None,
+        request_id: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        min_duration_ms: Optional[float] = None,
+        limit: int = 100,
+    ) -> dict:
+        """Записи по фильтрам в порядке поступления.
+
+        after=None - последние limit записей; after=id - следующие за ним
+        (tailing). next_id - курсор для следующего вызова; truncated=True,
+        если записи после after уже вытеснены из буфера.
+        """
+        last = self.last_id
+        first = max(1, last - self.capacity + 1)
+        start = first if after is None else max(after + 1, first)
+        items = []
+        for entry_id in range(start, last + 1):
+            slot = self._slots[entry_id % self.capacity]
+            if slot is None or slot[0] != entry_id:
+                continue
+            _, created, entry = slot
+            if logging.getLevelName(entry["level"]) < level:
+                continue
+            if route is not None and entry.get("route") != route:
+                continue
+            if request_id is not None and entry["request_id"] != request_id:
+                continue
+            if (since is not None and created < since) or (until is not None and created > until):
+                continue
+            if min_duration_ms is not None and entry.get("duration_ms", -1) < min_duration_ms:
+                continue
+            items.append(entry)
+            if after is not None and len(items) == limit:
+                # Следующий вызов продолжит с этой записи
+                return {"items": items, "next_id": entry_id, "truncated": after + 1 < first}
+        if after is None:
+            items = items[-limit:]
+        return {"items": items, "next_id": last, "truncated": after is not None and after + 1 < first}
+
+log_buffer: Optional[LogRingBuffer] = LogRingBuffer(LOG_BUFFER_SIZE) if LOG_BUFFER_SIZE > 0 else None
+
+# ==================== SETUP ====================
+
+_listener: Optional[_Listener] = None
+_queue_handler: Optional[_NonBlockingQueueHandler] = None
+
+def output_handler() -> logging.Handler:
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+def setup_logging(level: str = LOG_LEVEL) -> None:
+    """Перевести корневой логгер на очередь с фоновой записью (идемпотентно)"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    _queue_handler = _NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(_ContextFilter())
+    root.addHandler(_queue_handler)
+    handlers = [output_handler()] + ([log_buffer] if log_buffer is not None else [])
+    _listener = _Listener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging() -> None:
+    """Дописать очередь и остановить поток записи"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def dropped_records() -> int:
+    """Сколько записей отброшено из-за переполненной очереди"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+# ==================== ACCESS LOG ====================
+
+def _parse_rates(raw: str) -> Dict[str, float]:
+    rates = {}
+    for item in raw.split(","):
+        if "=" in item:
+            key, value = item.rsplit("=", 1)
+            rates[key.strip()] = float(value)
+    return rates
+
+_route_rates = _parse_rates(LOG_ROUTE_SAMPLE_RATES)
+
+def sample_rate(method: str, route: str) -> float:
+    """Доля логируемых запросов: "METHOD /route", затем "/route", затем LOG_SAMPLE_RATE"""
+    rate = _route_rates.get(f"{method} {route}")
+    if rate is None:
+        rate = _route_rates.get(route, LOG_SAMPLE_RATE)
+    return rate
+
+_route_paths: Dict[object, str] = {}
+
+def route_template(scope) -> str:
+    """Шаблон маршрута ("/cars/{car_id}") вместо сырого пути - ограниченная кардинальность"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        for route in getattr(scope.get("app"), "routes", []):
+            if getattr(route, "endpoint", None) is not None:
+                _route_paths[route.endpoint] = route.path
+        path = _route_paths.get(endpoint, scope.get("path", "unmatched"))
+    return path
+
+def _request_id(scope) -> str:
+    for name, value in scope.get("headers", []):
+        if name == REQUEST_ID_HEADER:
+            # Чужой идентификатор принимается, только если он короткий и печатный
+            if 0 < len(value) <= 64 and value.isascii() and value.decode("latin-1").isprintable():
+                return value.decode("latin-1")
+            break
+    return uuid.uuid4().hex
+
+class AccessLogMiddleware:
+    """Access-лог с латентностью и X-Request-ID.
+
+    Ошибки 5xx и запросы дольше LOG_SLOW_REQUEST_MS пишутся всегда,
+    остальные - с вероятностью sample_rate(method, route).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = _request_id(scope)
+        token = request_id_var.set(request_id)
+        scope_token = request_scope_var.set(scope)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(REQUEST_ID_HEADER, request_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_scope_var.reset(scope_token)
+            request_id_var.reset(token)
+            log_request(scope, status, (time.perf_counter() - started) * 1000, request_id)
+
+def log_request(scope, status: int, duration_ms: float, request_id: str) -> None:
+    method = scope["method"]
+    route = route_template(scope)
+    if status >= 500:
+        level = logging.ERROR
+    elif duration_ms >= LOG_SLOW_REQUEST_MS:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+        if not access_log.isEnabledFor(level):
+            return
+        rate = sample_rate(method, route)
+        if rate < 1 and random.random() >= rate:
+            return
+    access_log.log(
+        level, "%s %s %s %.1fms", method, route, status, duration_ms,
+        extra={"request_id": request_id, "method": method, "route": route,
+               "status": status, "duration_ms": round(duration_ms, 2)},
+    )
@@ -0,0 +1,199 @@
+"""
+Миграции схемы для уже существующих баз (create_all не меняет готовые таблицы).
+
+Использование:
+    python -m core.migrations
+"""
+
+import logging
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from .models import Car, ChangeLog, Job, normalize_plate
+
+log = logging.getLogger(__name__)
+
+CAR_OWNER_FK = "car_owner_id_fkey"
+CAR_REGISTRATION_INDEX = "ix_car_registration_key"
+BACKFILL_BATCH = 1000
+
+def _owner_fk(conn: Connection):
+    for fk in inspect(conn).get_foreign_keys("car"):
+        if fk["referred_table"] == "owner" and fk["constrained_columns"] == ["owner_id"]:
+            return fk
+    return None
+
+def _has_owner_index(conn: Connection) -> bool:
+    return any(ix["column_names"] == ["owner_id"] for ix in inspect(conn).get_indexes("car"))
+
+def ensure_car_owner_cascade(engine: Engine) -> bool:
+    """car.owner_id -> owner.ownerid с ON DELETE CASCADE и индексом.
+
+    Идемпотентна: ничего не делает, если схема уже в нужном виде.
+    Возвращает True, если что-то было изменено.
+    """
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("car"):
+            return False
+        fk = _owner_fk(conn)
+        cascade = fk is not None and (fk.get("options") or {}).get("ondelete", "").upper() == "CASCADE"
+        indexed = _has_owner_index(conn)
+    if cascade and indexed:
+        return False
+
+    dialect = engine.dialect.name
+    log.info("Migrating car.owner_id to ON DELETE CASCADE (%s)", dialect)
+    if dialect == "sqlite":
+        _rebuild_sqlite_car(engine)
+        return True
+
+    with engine.begin() as conn:
+        if not cascade:
+            if dialect == "postgresql":
+                if fk is not None and fk.get("name"):
+                    conn.execute(text(f'ALTER TABLE car DROP CONSTRAINT "{fk["name"]}"'))
+                # NOT VALID + VALIDATE: проверка существующих строк без долгой блокировки записи
+                conn.execute(text(
+                    f"ALTER TABLE car ADD CONSTRAINT {CAR_OWNER_FK} FOREIGN KEY (owner_id) "
+                    "REFERENCES owner(ownerid) ON DELETE CASCADE NOT VALID"
+                ))
+                conn.execute(text(f"ALTER TABLE car VALIDATE CONSTRAINT {CAR_OWNER_FK}"))
+            elif dialect == "mysql":
+                if fk is not None and fk.get("name"):
+                    conn.execute(text(f"ALTER TABLE car DROP FOREIGN KEY `{fk['name']}`"))
+                conn.execute(text(
+                    f"ALTER TABLE car ADD CONSTRAINT {CAR_OWNER_FK} FOREIGN KEY (owner_id) "
+                    "REFERENCES owner(ownerid) ON DELETE CASCADE"
+                ))
+            else:
+                raise RuntimeError(f"Миграция ON DELETE CASCADE не поддерживается для {dialect}")
+        if not indexed:
+            conn.execute(text("CREATE INDEX ix_car_owner_id ON car (owner_id)"))
+    return True
+
+def _rebuild_sqlite_car(engine: Engine) -> None:
+    """SQLite не умеет ALTER CONSTRAINT - пересоздаем таблицу car с копированием строк"""
+    with engine.connect() as conn:
+        # Только колонки, которые уже есть в старой таблице (новые заполнят следующие миграции)
+        existing = {c["name"] for c in inspect(conn).get_columns("car")}
+        columns = ", ".join(f'"{c.name}"' for c in Car.__table__.columns if c.name in existing)
+        # Внешние ключи выключаются только вне транзакции
+        conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        conn.commit()
+        try:
+            with conn.begin():
+                for ix in inspect(conn).get_indexes("car"):
+                    conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{ix["name"]}"')
+                conn.exec_driver_sql("ALTER TABLE car RENAME TO car_old")
+                Car.__table__.create(conn)
+                conn.exec_driver_sql(f"INSERT INTO car ({columns}) SELECT {columns} FROM car_old")
+                conn.exec_driver_sql("DROP TABLE car_old")
+        finally:
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+            conn.commit()
+
+def backfill_registration_keys(engine: Engine) -> int:
+    """Заполнить car.registration_key там, где он NULL (строки, вставленные мимо ORM).
+
+    Номер, нормализованный ключ которого уже занят, остается с NULL и пишется
+    в лог - уникальный индекс не дает завести дубликат. Возвращает число
+    заполненных строк.
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(Car.id, Car.registrationNumber).where(Car.registration_key.is_(None)).order_by(Car.id)
+        ).all()
+        if not rows:
+            return 0
+        taken = set(conn.execute(select(Car.registration_key).where(Car.registration_key.is_not(None))).scalars())
+    updates, duplicates = [], []
+    for car_id, plate in rows:
+        key = normalize_plate(plate)
+        if key is None:
+            continue
+        if key in taken:
+            duplicates.append(car_id)
+            continue
+        taken.add(key)
+        updates.append({"car_id": car_id, "key": key})
+    stmt = update(Car.__table__).where(Car.__table__.c.id == bindparam("car_id")).values(registration_key=bindparam("key"))
+    for start in range(0, len(updates), BACKFILL_BATCH):
+        with engine.begin() as conn:
+            conn.execute(stmt, updates[start:start + BACKFILL_BATCH])
+    if duplicates:
+        log.warning("Duplicate registration numbers left without registration_key: car ids %s", duplicates[:50])
+    return len(updates)
+
+def ensure_car_registration_key(engine: Engine) -> bool:
+    """Колонка car.registration_key, ее заполнение и уникальный индекс.
+
+    Идемпотентна. Возвращает True, если что-то было изменено.
+    """
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("car"):
+            return False
+        has_column = any(c["name"] == "registration_key" for c in inspect(conn).get_columns("car"))
+        indexed = any(ix["column_names"] == ["registration_key"] for ix in inspect(conn).get_indexes("car"))
+    changed = False
+    if not has_column:
+        log.info("Adding car.registration_key")
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE car ADD COLUMN registration_key VARCHAR(40)"))
+        changed = True
+    # Индекс создается после заполнения: дубликаты к этому моменту уже отсеяны
+    changed = backfill_registration_keys(engine) > 0 or changed
+    if not indexed:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE UNIQUE INDEX {CAR_REGISTRATION_INDEX} ON car (registration_key)"))
+        changed = True
+    return changed
+
+def ensure_change_log_origin(engine: Engine) -> bool:
+    """Начальный маркер сброса в пустом change_log.
+
+    Данные, появившиеся до журнала, в нем не описаны: первая синхронизация
+    (since=0) - всегда полное чтение, и ей нужна ненулевая версия для продолжения.
+    """
+    with engine.begin() as conn:
+        if not inspect(conn).has_table(ChangeLog.__tablename__):
+            return False
+        if conn.execute(select(ChangeLog.version).limit(1)).first() is not None:
+            return False
+        conn.execute(ChangeLog.__table__.insert().values(entity="*", action="reset"))
+    return True
+
+def ensure_job_owner(engine: Engine) -> bool:
+    """Колонки jobs.owner и jobs.heartbeat_at (владелец задачи и его пульс).
+
+    Идемпотентна. Возвращает True, если что-то было изменено.
+    """
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(Job.__tablename__):
+            return False
+        existing = {c["name"] for c in inspect(conn).get_columns(Job.__tablename__)}
+    timestamp = "DATETIME" if engine.dialect.name in ("sqlite", "mysql") else "TIMESTAMP"
+    missing = [
+        (name, ddl) for name, ddl in (("owner", "VARCHAR(100)"), ("heartbeat_at", timestamp))
+        if name not in existing
+    ]
+    if not missing:
+        return False
+    with engine.begin() as conn:
+        for name, ddl in missing:
+            conn.execute(text(f"ALTER TABLE {Job.__tablename__} ADD COLUMN {name} {ddl}"))
+    return True
+
+def run_migrations(engine: Engine) -> None:
+    """Все миграции по порядку"""
+    if ensure_car_owner_cascade(engine):
+        log.info("Migration applied: car.owner_id ON DELETE CASCADE")
+    if ensure_car_registration_key(engine):
+        log.info("Migration applied: car.registration_key")
+    if ensure_change_log_origin(engine):
+        log.info("Migration applied: change_log origin marker")
+    if ensure_job_owner(engine):
+        log.info("Migration applied: jobs.owner, jobs.heartbeat_at")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    from .db import engine
+    run_migrations(engine)
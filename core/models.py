@@ -0,0 +1,116 @@
+import re
+from datetime import datetime
+from typing import Any, Optional
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, validates
+from sqlalchemy import JSON, BigInteger, DateTime, Float, Index, String, Integer, ForeignKey, Text
+
+class Base(DeclarativeBase):
+    pass
+
+# ==================== USER MODEL ====================
+
+class AppUser(Base):
+    __tablename__ = "app_users"
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    username: Mapped[str] = mapped_column(String(50), unique=True, index=True)
+    password_hash: Mapped[str] = mapped_column(String(255))
+    role: Mapped[str] = mapped_column(String(20), default="USER")  # USER or ADMIN
+
+class Owner(Base):
+    __tablename__ = "owner"
+    ownerid: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    firstname: Mapped[str] = mapped_column(String(100))
+    lastname:  Mapped[str] = mapped_column(String(100))
+    # Автомобили удаляет сама БД (ON DELETE CASCADE): passive_deletes не дает
+    # ORM загружать и удалять каждый автомобиль по отдельности
+    cars: Mapped[list["Car"]] = relationship(
+        back_populates="owner",
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
+
+_PLATE_SEPARATORS = re.compile(r"[\s\-]+")
+
+def normalize_plate(plate: Optional[str]) -> Optional[str]:
+    """Ключ номера для поиска и уникальности: без регистра, пробелов и дефисов ("adf 1121" -> "ADF1121")"""
+    if plate is None:
+        return None
+    return _PLATE_SEPARATORS.sub("", plate).upper() or None
+
+class Car(Base):
+    __tablename__ = "car"
+    id:   Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    brand: Mapped[str] = mapped_column(String(100))
+    model: Mapped[str] = mapped_column(String(100))
+    color: Mapped[str] = mapped_column(String(40))
+    registrationNumber: Mapped[str] = mapped_column(String(40))
+    # Нормализованный номер (normalize_plate), заполняется при присвоении registrationNumber
+    registration_key: Mapped[Optional[str]] = mapped_column(String(40), unique=True, index=True)
+    modelYear: Mapped[int] = mapped_column(Integer)
+    price: Mapped[int] = mapped_column(Integer)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("owner.ownerid", ondelete="CASCADE"), index=True)
+    owner: Mapped["Owner"] = relationship(back_populates="cars")
+
+    @validates("registrationNumber")
+    def _set_registration_key(self, key, value):
+        self.registration_key = normalize_plate(value)
+        return value
+
+
+# ==================== BACKGROUND JOBS ====================
+
+class Job(Base):
+    """Запись фоновой задачи (бэкап, массовый импорт, удаление и т.п.)"""
+    __tablename__ = "jobs"
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50), index=True)
+    status: Mapped[str] = mapped_column(String(20), default="queued", index=True)  # queued/running/succeeded/failed
+    progress: Mapped[float] = mapped_column(Float, default=0.0)  # 0..1
+    message: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    params: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    result: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_by: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Воркер, который поставил задачу в свою очередь или выполняет ее, и его последний пульс
+    owner: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+# ==================== SYSTEM SETTINGS ====================
+
+class SystemSetting(Base):
+    """Системная настройка: значение хранится как JSON"""
+    __tablename__ = "system_settings"
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    value: Mapped[Optional[Any]] = mapped_column(JSON, nullable=True)
+    updated_by: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class SettingsVersion(Base):
+    """Единственная строка-счетчик изменений настроек: воркеры опрашивают его, а не всю таблицу"""
+    __tablename__ = "settings_version"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+# ==================== CHANGE LOG ====================
+
+class ChangeLog(Base):
+    """Журнал изменений (outbox) для /sync/changes: строка на каждую запись в car/owner.
+
+    version монотонна и выдается в порядке COMMIT; entity "*" - маркер сброса
+    истории (entity_id - версия, до которой история неполна, NULL - сама строка).
+    """
+    __tablename__ = "change_log"
+    __table_args__ = (
+        Index("ix_change_log_entity", "entity", "entity_id", "version"),
+        # Без AUTOINCREMENT SQLite может повторно выдать номер удаленной последней строки
+        {"sqlite_autoincrement": True},
+    )
+    version: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    entity: Mapped[str] = mapped_column(String(20))
+    entity_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    action: Mapped[str] = mapped_column(String(10))  # upsert/delete/reset
+    changed_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
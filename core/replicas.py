@@ -0,0 +1,253 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from .db import (
+    SessionLocal, build_connect_args, enable_sqlite_foreign_keys, engine, engine_options, mask_db_url, normalize_db_url
+)
+
+# Маршрутизация чтения на реплики: primary (DATABASE_URL) + реплики из
+# DATABASE_REPLICA_URLS. Без реплик все сессии идут в primary, как раньше.
+log = logging.getLogger(__name__)
+
+# Список URL реплик через запятую
+DATABASE_REPLICA_URLS = os.getenv("DATABASE_REPLICA_URLS", "")
+# round_robin | least_connections
+REPLICA_BALANCE = os.getenv("REPLICA_BALANCE", "round_robin").lower()
+# На сколько секунд реплика исключается из ротации после ошибки подключения
+REPLICA_RETRY_INTERVAL = float(os.getenv("REPLICA_RETRY_INTERVAL", "30"))
+# Сколько секунд после записи клиент читает из primary (0 - выключено)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+PRIMARY_COOKIE = "db_primary_until"
+PRIMARY_HEADER = "x-read-primary"
+
+class ReplicaSet:
+    """Пул реплик с балансировкой и простым circuit breaker"""
+
+    def __init__(self, engines: List[Engine], strategy: str = "round_robin", retry_interval: float = 30):
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Неизвестная стратегия балансировки: {strategy}")
+        self.engines = engines
+        self.strategy = strategy
+        self.retry_interval = retry_interval
+        self._down_until = [0.0] * len(engines)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        for index, replica in enumerate(engines):
+            event.listen(replica, "handle_error", self._error_listener(index))
+
+    def _error_listener(self, index: int):
+        def on_error(context):
+            # Разрыв соединения или отказ в подключении - выводим реплику из ротации
+            if context.is_disconnect or context.connection is None:
+                self.mark_down(index)
+        return on_error
+
+    def mark_down(self, index: int) -> None:
+        with self._lock:
+            self._down_until[index] = time.monotonic() + self.retry_interval
+        log.warning("Replica #%s marked down for %.0fs", index, self.retry_interval)
+
+    def probe(self, index: int) -> bool:
+        """SELECT 1 на реплике; при успехе возвращает ее в ротацию"""
+        try:
+            with self.engines[index].connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception as e:
+            log.warning("Replica #%s health check failed: %s", index, e)
+            self.mark_down(index)
+            return False
+        with self._lock:
+            self._down_until[index] = 0.0
+        return True
+
+    def _candidates(self) -> List[int]:
+        now = time.monotonic()
+        with self._lock:
+            return [i for i, until in enumerate(self._down_until) if until <= now]
+
+    def pick(self) -> Optional[int]:
+        """Индекс реплики для следующей сессии или None, если живых нет"""
+        candidates = self._candidates()
+        if not candidates:
+            return None
+        turn = next(self._counter)
+        if self.strategy == "least_connections":
+            # При равной загрузке - по кругу, чтобы не греть всегда первую
+            index = min(
+                candidates,
+                key=lambda i: (_checked_out(self.engines[i]), (i - turn) % len(self.engines)),
+            )
+        else:
+            index = candidates[turn % len(candidates)]
+        # Реплика после паузы (half-open) сначала проверяется
+        if self._down_until[index] and not self.probe(index):
+            return self.pick()
+        return index
+
+    def session(self) -> "ReplicaSession":
+        """Сессия чтения; реплика выбирается при первом запросе к БД"""
+        return ReplicaSession(self)
+
+    def connect(self) -> Optional[Connection]:
+        """Соединение с живой репликой; реплика, к которой не удалось
+        подключиться, выводится из ротации и пробуется следующая"""
+        while True:
+            index = self.pick()
+            if index is None:
+                return None
+            try:
+                return self.engines[index].connect()
+            except DBAPIError:
+                self.mark_down(index)
+
+    def status(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "replica": i,
+                "healthy": self._down_until[i] <= now,
+                "checked_out": _checked_out(e),
+            }
+            for i, e in enumerate(self.engines)
+        ]
+
+    def dispose(self) -> None:
+        for replica in self.engines:
+            replica.dispose()
+
+class ReplicaSession(Session):
+    """Сессия на реплике. Соединение берется лениво - при первом запросе
+    (get_bind), а не при создании сессии: маршруты, которым хватило кэша,
+    не занимают соединение. Отказ подключения переключает на другую
+    реплику, если живых нет - на primary."""
+
+    def __init__(self, replica_set: ReplicaSet):
+        super().__init__(autoflush=False, autocommit=False)
+        self._replicas = replica_set
+        self._replica_connection: Optional[Connection] = None
+        self._replica_bind = None
+
+    def get_bind(self, mapper=None, **kw):
+        if self._replica_bind is None:
+            self._replica_connection = self._replicas.connect()
+            self._replica_bind = self._replica_connection if self._replica_connection is not None else engine
+        return self._replica_bind
+
+    def close(self) -> None:
+        super().close()
+        if self._replica_connection is not None:
+            self._replica_connection.close()
+        self._replica_connection = None
+        self._replica_bind = None
+
+def _checked_out(replica: Engine) -> int:
+    checkedout = getattr(replica.pool, "checkedout", None)
+    return checkedout() if checkedout else 0
+
+def build_replica_set() -> Optional[ReplicaSet]:
+    urls = [normalize_db_url(u.strip()) for u in DATABASE_REPLICA_URLS.split(",") if u.strip()]
+    if not urls:
+        return None
+    engines = [
+        create_engine(url, connect_args=build_connect_args(url), **engine_options(url))
+        for url in urls
+    ]
+    for replica in engines:
+        enable_sqlite_foreign_keys(replica)
+    for url in urls:
+        log.info("Read replica: %s", mask_db_url(url))
+    return ReplicaSet(engines, REPLICA_BALANCE, REPLICA_RETRY_INTERVAL)
+
+replicas = build_replica_set()
+
+def all_engines() -> List[Engine]:
+    """Primary и все реплики - для слушателей, которые должны видеть каждый SQL-запрос"""
+    return [engine] + (replicas.engines if replicas is not None else [])
+
+# ==================== READ-YOUR-WRITES ====================
+
+# Флаг "в этом запросе были записи": ставится из after_flush сессий primary.
+# Список, а не bool - sync-эндпоинты работают в копии контекста (пул потоков),
+# а изменение общего объекта видно middleware.
+_request_writes: ContextVar[Optional[list]] = ContextVar("db_request_writes", default=None)
+
+def _mark_write() -> None:
+    writes = _request_writes.get()
+    if writes is not None and not writes:
+        writes.append(True)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _remember_write(session, flush_context):
+    _mark_write()
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _remember_statement_write(orm_execute_state):
+    # insert()/update()/delete() через session.execute идут мимо flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write()
+
+def wants_primary(request: Request) -> bool:
+    """Клиент недавно писал или явно просит primary"""
+    if request.headers.get(PRIMARY_HEADER, "").lower() in ("1", "true"):
+        return True
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, "0")) > time.time()
+    except ValueError:
+        return False
+
+def read_session(prefer_primary: bool = False) -> Session:
+    """Сессия для чтения: реплика, если есть живая, иначе primary"""
+    if replicas is not None and not prefer_primary:
+        return replicas.session()
+    return SessionLocal()
+
+def get_read_db(request: Request):
+    """Dependency для read-only маршрутов (списки, поиск, аналитика)"""
+    db = read_session(wants_primary(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+class ReadYourWritesMiddleware:
+    """После запроса с записью в primary ставит cookie, по которой чтения
+    клиента следующие READ_YOUR_WRITES_SECONDS идут в primary и мимо
+    объединения запросов (app/coalesce.py) - поэтому и без реплик."""
+
+    def __init__(self, app, window: float = READ_YOUR_WRITES_SECONDS):
+        self.app = app
+        self.window = window
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.window <= 0:
+            await self.app(scope, receive, send)
+            return
+        writes: list = []
+        token = _request_writes.set(writes)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and writes:
+                until = time.time() + self.window
+                cookie = f"{PRIMARY_COOKIE}={until:.3f}; Max-Age={int(self.window) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_writes.reset(token)
+
+async def dispose_replicas():
+    """Закрыть пулы реплик при остановке"""
+    if replicas is not None:
+        replicas.dispose()
@@ -0,0 +1,176 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+import jwt
+from jwt.exceptions import InvalidTokenError
+from passlib.context import CryptContext
+from fastapi import HTTPException, Depends
+from fastapi.requests import HTTPConnection
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from .db import get_db, get_async_db
+from .models import AppUser
+
+# JWT Configuration
+SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key-change-in-production")
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
+
+# Password hashing - pbkdf2_sha256 для новых паролей (поддерживает любые символы и длину),
+# bcrypt оставлен для проверки хэшей, созданных старым auth_app
+pwd_context = CryptContext(schemes=["pbkdf2_sha256", "bcrypt"], deprecated="auto")
+
+# Хэширование - CPU-нагрузка, async-маршруты отдают его в executor.
+# "thread" достаточно (pbkdf2/bcrypt отпускают GIL), "process" изолирует полностью
+AUTH_HASH_EXECUTOR = os.getenv("AUTH_HASH_EXECUTOR", "thread").lower()
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(os.cpu_count() or 4)))
+
+# Security scheme
+security = HTTPBearer()
+
+_hash_executor: Optional[Executor] = None
+
+def hash_password(password: str) -> str:
+    """Hash password using pbkdf2_sha256 - поддерживает любые символы и длину"""
+    return pwd_context.hash(password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify password against hash - поддерживает pbkdf2_sha256 и bcrypt"""
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_hash_executor() -> Executor:
+    """Executor для хэширования паролей, создается при первом обращении"""
+    global _hash_executor
+    if _hash_executor is None:
+        if AUTH_HASH_EXECUTOR == "process":
+            _hash_executor = ProcessPoolExecutor(max_workers=AUTH_HASH_WORKERS)
+        else:
+            _hash_executor = ThreadPoolExecutor(
+                max_workers=AUTH_HASH_WORKERS, thread_name_prefix="auth-hash"
+            )
+    return _hash_executor
+
+def shutdown_hash_executor():
+    """Остановить executor хэширования паролей"""
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+async def hash_password_async(password: str) -> str:
+    """Hash password without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify password without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_hash_executor(), verify_password, plain_password, hashed_password
+    )
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """Create JWT access token"""
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+    to_encode.update({"exp": expire})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=401,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def decode_access_token(token: str) -> dict:
+    """Decode JWT token, payload гарантированно содержит sub"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except InvalidTokenError:
+        raise credentials_exception()
+    if payload.get("sub") is None:
+        raise credentials_exception()
+    return payload
+
+def is_admin_scope(scope) -> bool:
+    """ADMIN role from the Bearer token of an ASGI scope, without a DB lookup"""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return False
+            try:
+                return decode_access_token(token).get("role") == "ADMIN"
+            except HTTPException:
+                return False
+    return False
+
+def connection_token(connection: HTTPConnection) -> Optional[str]:
+    """Bearer token from the header or ?access_token= (EventSource and browser WebSocket cannot set headers)"""
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token
+    return connection.query_params.get("access_token")
+
+def get_token_payload(connection: HTTPConnection) -> dict:
+    """JWT payload for long-lived streams, without a DB lookup"""
+    token = connection_token(connection)
+    if not token:
+        raise credentials_exception()
+    return decode_access_token(token)
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+) -> AppUser:
+    """Get current authenticated user"""
+    payload = decode_access_token(credentials.credentials)
+    user = db.query(AppUser).filter(AppUser.username == payload["sub"]).first()
+    if user is None:
+        raise credentials_exception()
+    # Return the connection to the pool right away: otherwise it stays checked out
+    # for the whole request (and for requests waiting on a coalesced computation)
+    db.expunge(user)
+    db.rollback()
+    return user
+
+async def get_current_user_async(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+) -> AppUser:
+    """Get current authenticated user (AsyncSession)"""
+    payload = decode_access_token(credentials.credentials)
+    result = await db.execute(select(AppUser).where(AppUser.username == payload["sub"]))
+    user = result.scalars().first()
+    if user is None:
+        raise credentials_exception()
+    return user
+
+def _role_checker(required_role: str, user_dependency):
+    # async: проверка без I/O, не нужно занимать поток из threadpool
+    async def role_checker(current_user: AppUser = Depends(user_dependency)):
+        if current_user.role != required_role:
+            raise HTTPException(
+                status_code=403,
+                detail="Not enough permissions"
+            )
+        return current_user
+    return role_checker
+
+def role_required(required_role: str):
+    """Dependency to check user role"""
+    return _role_checker(required_role, get_current_user)
+
+def role_required_async(required_role: str):
+    """Dependency to check user role (AsyncSession)"""
+    return _role_checker(required_role, get_current_user_async)
@@ -0,0 +1,194 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Union
+from sqlalchemy import and_, delete, event, func, insert, literal, select, text
+from sqlalchemy.orm import Session, aliased
+from .change_feed import ENTITIES, ENTITY_FIELDS
+from .db import AsyncSyncSession, SessionLocal
+from .models import Car, ChangeLog, Owner
+
+log = logging.getLogger(__name__)
+
+# ==================== CONFIG ====================
+
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+SYNC_MAX_PAGE_SIZE = int(os.getenv("SYNC_MAX_PAGE_SIZE", "5000"))
+# Через сколько дней надгробия удаленных записей вычищаются из журнала (клиентам старше - reset)
+SYNC_TOMBSTONE_DAYS = float(os.getenv("SYNC_TOMBSTONE_DAYS", "30"))
+
+# Ключ транзакционной advisory-блокировки: запись в журнал сериализована до COMMIT,
+# поэтому версии выдаются в порядке коммитов и клиент не пропустит "запоздавшую" версию
+SYNC_LOCK_KEY = 0x73796E63
+RESET_ENTITY = "*"
+
+_MODELS = {"car": Car, "owner": Owner}
+_PRIMARY_KEYS = {"car": Car.id, "owner": Owner.ownerid}
+
+# ==================== OUTBOX ====================
+# CRUD отмечает измененные записи в сессии; перед COMMIT строки журнала
+# вставляются в ту же транзакцию (откат записи откатывает и журнал).
+# Хуки висят и на SessionLocal (app), и на сессиях под AsyncSession (auth_app)
+
+def track_change(db: Session, entity: str, target: Union[object, int, Iterable[int]], deleted: bool = False) -> None:
+    """Отметить запись (ORM-объект, id или список id) как измененную или удаленную"""
+    db.info.setdefault("sync_changes", []).append((entity, target, deleted))
+
+def _lock(db: Session) -> None:
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SYNC_LOCK_KEY})
+
+def track_deleted_where(db: Session, entity: str, *criteria) -> int:
+    """Надгробия для всех строк entity, подходящих под criteria, одним INSERT ... SELECT
+    (в текущей транзакции, до их удаления); id в Python не выбираются. Возвращает число строк"""
+    _lock(db)
+    rows = select(
+        literal(entity), _PRIMARY_KEYS[entity], literal("delete"), literal(datetime.utcnow())
+    ).where(*criteria)
+    return db.execute(
+        insert(ChangeLog).from_select(["entity", "entity_id", "action", "changed_at"], rows)
+    ).rowcount
+
+def _entity_ids(entity: str, target) -> List[int]:
+    if isinstance(target, int):
+        return [target]
+    if isinstance(target, (list, tuple, set)):
+        return list(target)
+    return [getattr(target, _PRIMARY_KEYS[entity].key)]
+
+def _write_change_log(session: Session) -> None:
+    pending = session.info.pop("sync_changes", None)
+    if not pending:
+        return
+    # id новых объектов появляются при flush
+    session.flush()
+    now = datetime.utcnow()
+    rows = [
+        {"entity": entity, "entity_id": entity_id, "action": "delete" if deleted else "upsert", "changed_at": now}
+        for entity, target, deleted in pending
+        for entity_id in _entity_ids(entity, target)
+    ]
+    _lock(session)
+    # Версия транзакции - для id событий ленты изменений (хук ленты идет следом)
+    versions = session.execute(insert(ChangeLog).returning(ChangeLog.version), rows).scalars().all()
+    session.info["change_log_version"] = max(versions)
+
+def _discard_change_log(session: Session) -> None:
+    session.info.pop("sync_changes", None)
+    session.info.pop("change_log_version", None)
+
+def _forget_version(session: Session) -> None:
+    session.info.pop("change_log_version", None)
+
+for _target in (SessionLocal, AsyncSyncSession):
+    # insert=True: журнал пишется раньше хука ленты изменений, id события - версия журнала
+    event.listen(_target, "before_commit", _write_change_log, insert=True)
+    event.listen(_target, "after_commit", _forget_version)
+    event.listen(_target, "after_rollback", _discard_change_log)
+
+def mark_reset(db: Session, horizon: Optional[int] = None) -> None:
+    """Маркер сброса (в текущей транзакции): клиенты с since меньше horizon
+    (или версии самого маркера) перечитывают данные целиком"""
+    _lock(db)
+    db.add(ChangeLog(entity=RESET_ENTITY, entity_id=horizon, action="reset"))
+
+# ==================== READ ====================
+
+def current_version(db: Session) -> int:
+    return db.scalar(select(func.max(ChangeLog.version))) or 0
+
+def reset_horizon(db: Session) -> int:
+    """Минимальный since, с которого журнал полон"""
+    return db.scalar(
+        select(func.max(func.coalesce(ChangeLog.entity_id, ChangeLog.version))).where(ChangeLog.entity == RESET_ENTITY)
+    ) or 0
+
+def _current_rows(db: Session, entity: str, ids: List[int]) -> Dict[int, dict]:
+    model = _MODELS[entity]
+    columns = [getattr(model, field) for field in ENTITY_FIELDS[entity]]
+    rows = db.execute(select(*columns).where(_PRIMARY_KEYS[entity].in_(ids))).all()
+    return {row[0]: row._asdict() for row in rows}
+
+def changes_since(db: Session, since: int, limit: int = SYNC_PAGE_SIZE, entities: Iterable[str] = ENTITIES) -> dict:
+    """Сжатые изменения после версии since: по одной записи на сущность, в порядке
+    ее последнего изменения; upsert - текущее состояние, delete - надгробие.
+
+    since=0 или старше горизонта сброса - reset: клиент перечитывает данные
+    целиком и продолжает с next_since (версия до начала перечитывания).
+    """
+    # Версия читается до изменений: все, что <= ее, уже видно следующему запросу
+    version = current_version(db)
+    if since <= 0 or since < reset_horizon(db):
+        return {"changes": [], "next_since": version, "has_more": False, "reset": True}
+
+    last = func.max(ChangeLog.version).label("version")
+    latest = db.execute(
+        select(ChangeLog.entity, ChangeLog.entity_id, last)
+        .where(ChangeLog.version > since, ChangeLog.entity.in_(tuple(entities)))
+        .group_by(ChangeLog.entity, ChangeLog.entity_id)
+        .order_by(last)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(latest) > limit
+    latest = latest[:limit]
+
+    actions = dict(db.execute(
+        select(ChangeLog.version, ChangeLog.action).where(ChangeLog.version.in_([row.version for row in latest]))
+    ).all()) if latest else {}
+    current: Dict[str, Dict[int, dict]] = {}
+    for entity in _MODELS:
+        ids = [row.entity_id for row in latest if row.entity == entity and actions[row.version] == "upsert"]
+        current[entity] = _current_rows(db, entity, ids) if ids else {}
+
+    changes = []
+    for row in latest:
+        data = current[row.entity].get(row.entity_id)
+        # Строка могла быть удалена после чтения журнала - ее надгробие придет следующей страницей
+        changes.append({
+            "entity": row.entity,
+            "id": row.entity_id,
+            "version": row.version,
+            "op": "upsert" if data is not None else "delete",
+            "data": data,
+        })
+    if has_more:
+        next_since = latest[-1].version
+    else:
+        next_since = max([since, version] + [row.version for row in latest])
+    return {"changes": changes, "next_since": next_since, "has_more": has_more, "reset": False}
+
+# ==================== COMPACTION ====================
+
+def compact_change_log(db: Session, tombstone_days: float = SYNC_TOMBSTONE_DAYS) -> dict:
+    """Удалить строки, перекрытые более поздней версией той же записи, и старые надгробия.
+
+    Первое на ответы /sync/changes не влияет (они и так сжаты); после второго
+    клиенты, не синхронизировавшиеся дольше tombstone_days, получают reset.
+    """
+    newer = aliased(ChangeLog)
+    superseded = db.execute(
+        delete(ChangeLog)
+        .where(
+            ChangeLog.entity != RESET_ENTITY,
+            select(newer.version).where(
+                and_(newer.entity == ChangeLog.entity, newer.entity_id == ChangeLog.entity_id,
+                     newer.version > ChangeLog.version)
+            ).exists(),
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+
+    cutoff = datetime.utcnow() - timedelta(days=tombstone_days)
+    expired = (ChangeLog.action == "delete", ChangeLog.changed_at < cutoff)
+    horizon = db.scalar(select(func.max(ChangeLog.version)).where(*expired))
+    tombstones = 0
+    if horizon is not None:
+        # Надгробия и маркер сброса - одной транзакцией
+        tombstones = db.execute(
+            delete(ChangeLog).where(*expired, ChangeLog.version <= horizon).execution_options(synchronize_session=False)
+        ).rowcount
+        mark_reset(db, horizon)
+        db.commit()
+    log.info("Change log compacted: %s superseded, %s tombstones", superseded, tombstones)
+    return {"superseded": superseded, "tombstones": tombstones, "version": current_version(db)}
@@ -0,0 +1,205 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import select, text
+from .db import SessionLocal, engine
+from .models import SettingsVersion, SystemSetting
+from .security import is_admin_scope
+
+log = logging.getLogger(__name__)
+
+# ==================== CONFIG ====================
+
+# Как часто воркер сверяет версию настроек (с LISTEN/NOTIFY - только страховка)
+SETTINGS_POLL_INTERVAL = float(os.getenv("SETTINGS_POLL_INTERVAL", "5"))
+SETTINGS_CHANNEL = "settings_changed"
+
+# Значения по умолчанию задают и набор допустимых ключей, и их типы
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "system_name": "Car Management System",
+    "version": "1.0.0",
+    "max_cars_per_owner": 10,  # 0 - без ограничения
+    "max_users": 1000,
+    "maintenance_mode": False,
+    "registration_enabled": True,
+    "admin_notifications": True,
+}
+
+# Доступны и в режиме обслуживания: вход, статус, документация и сами настройки
+MAINTENANCE_ALLOWED_PATHS = ("/login", "/api/status", "/docs", "/openapi.json", "/settings")
+
+def validate_settings(changes: dict) -> dict:
+    """Проверить ключи и типы по DEFAULT_SETTINGS, ValueError при ошибке"""
+    unknown = sorted(set(changes) - set(DEFAULT_SETTINGS))
+    if unknown:
+        raise ValueError(f"Неизвестные настройки: {', '.join(unknown)}")
+    for key, value in changes.items():
+        expected = type(DEFAULT_SETTINGS[key])
+        # bool - подкласс int, поэтому сравниваем тип точно
+        if type(value) is not expected:
+            raise ValueError(f"{key}: ожидается {expected.__name__}")
+        if expected is int and value < 0:
+            raise ValueError(f"{key}: значение не может быть отрицательным")
+    return changes
+
+# ==================== CACHE ====================
+
+class SettingsCache:
+    """Настройки в памяти процесса с версией.
+
+    Чтения (get/snapshot) не обращаются к БД. Фоновый поток обновляет
+    снимок, когда меняется строка settings_version: на PostgreSQL его
+    будит NOTIFY, иначе он сверяет версию раз в SETTINGS_POLL_INTERVAL.
+    """
+
+    def __init__(self, poll_interval: float = SETTINGS_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        # (версия, значения) заменяются одним присваиванием - читателям не нужна блокировка
+        self._state: Tuple[int, Dict[str, Any]] = (-1, dict(DEFAULT_SETTINGS))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._listener = None
+
+    @property
+    def version(self) -> int:
+        return self._state[0]
+
+    def get(self, key: str) -> Any:
+        return self._state[1][key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self._state[1])
+
+    def refresh(self, force: bool = False) -> bool:
+        """Перечитать таблицу, если версия изменилась. True - снимок обновлен"""
+        with SessionLocal() as db:
+            version = db.scalar(select(SettingsVersion.version).where(SettingsVersion.id == 1)) or 0
+            if not force and version == self.version:
+                return False
+            rows = db.execute(select(SystemSetting.key, SystemSetting.value)).all()
+        values = dict(DEFAULT_SETTINGS)
+        values.update((key, value) for key, value in rows if key in DEFAULT_SETTINGS)
+        self._state = (version, values)
+        log.info("System settings loaded (version %s)", version)
+        return True
+
+    def update(self, changes: dict, updated_by: Optional[str] = None) -> Dict[str, Any]:
+        """Сохранить изменения, поднять версию и оповестить остальные воркеры"""
+        validate_settings(changes)
+        with SessionLocal() as db:
+            # Блокировка строки версии упорядочивает конкурентные изменения
+            counter = db.get(SettingsVersion, 1, with_for_update=True)
+            if counter is None:
+                counter = SettingsVersion(id=1, version=0)
+                db.add(counter)
+            for key, value in changes.items():
+                setting = db.get(SystemSetting, key)
+                if setting is None:
+                    setting = SystemSetting(key=key)
+                    db.add(setting)
+                setting.value = value
+                setting.updated_by = updated_by
+                setting.updated_at = datetime.utcnow()
+            counter.version += 1
+            if db.get_bind().dialect.name == "postgresql":
+                # Доставляется слушателям только после COMMIT
+                db.execute(text("SELECT pg_notify(:channel, :payload)"),
+                           {"channel": SETTINGS_CHANNEL, "payload": json.dumps({"version": counter.version})})
+            db.commit()
+        self.refresh(force=True)
+        return self.snapshot()
+
+    # ==================== REFRESHER ====================
+
+    def start(self) -> None:
+        """Загрузить настройки и запустить фоновое обновление"""
+        try:
+            self.refresh(force=True)
+        except Exception as e:
+            log.error("Could not load system settings, using defaults: %s", e)
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="settings-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+        self._close_listener()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self._listener is None:
+                    self._listener = self._listen()
+                if self._listener is not None:
+                    # Просыпаемся по NOTIFY или по таймауту
+                    for _ in self._listener.notifies(timeout=self.poll_interval, stop_after=1):
+                        pass
+                else:
+                    self._stop.wait(self.poll_interval)
+                if not self._stop.is_set():
+                    self.refresh()
+            except Exception as e:
+                log.warning("Settings refresh failed: %s", e)
+                self._close_listener()
+                self._stop.wait(self.poll_interval)
+
+    def _listen(self):
+        """Отдельное соединение с LISTEN (только PostgreSQL + psycopg 3), иначе None"""
+        if engine.dialect.name != "postgresql" or engine.dialect.driver != "psycopg":
+            return None
+        raw = engine.raw_connection()
+        # Соединение забирается из пула насовсем и не занимает место для запросов
+        raw.detach()
+        connection = raw.driver_connection
+        connection.autocommit = True
+        connection.execute(f"LISTEN {SETTINGS_CHANNEL}")
+        # Изменения, сделанные до LISTEN, подхватит ближайший refresh()
+        return connection
+
+    def _close_listener(self) -> None:
+        if self._listener is not None:
+            try:
+                self._listener.close()
+            except Exception:
+                pass
+            self._listener = None
+
+settings = SettingsCache()
+
+# ==================== MAINTENANCE MODE ====================
+
+class MaintenanceModeMiddleware:
+    """При maintenance_mode отвечает 503 всем, кроме администраторов
+    и путей из MAINTENANCE_ALLOWED_PATHS. Флаг читается из кэша настроек."""
+
+    def __init__(self, app, cache: SettingsCache = settings):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.cache.get("maintenance_mode")
+            or scope["path"].startswith(MAINTENANCE_ALLOWED_PATHS)
+            or is_admin_scope(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+        body = json.dumps({"detail": "Система на обслуживании, попробуйте позже"}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", b"60"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
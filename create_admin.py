@@ -13,12 +13,10 @@ sys.path.append(str(Path(__file__).parent))
 
 from app.db import SessionLocal
 from app.models import AppUser
-from passlib.context import CryptContext
+from core.security import hash_password
 
 def create_admin():
     """Создает первого администратора"""
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    
     with SessionLocal() as db:
         # Проверяем, есть ли уже администраторы
         existing_admin = db.query(AppUser).filter(AppUser.role == "ADMIN").first()
@@ -49,7 +47,7 @@ def create_admin():
             return
         
         # Создаем администратора
-        hashed_password = pwd_context.hash(password)
+        hashed_password = hash_password(password)
         admin = AppUser(
             username=username,
             password_hash=hashed_password,
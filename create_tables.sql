@@ -28,6 +28,7 @@ CREATE TABLE IF NOT EXISTS car (
     model VARCHAR(100) NOT NULL,
     color VARCHAR(40) NOT NULL,
     "registrationNumber" VARCHAR(40) NOT NULL,
+    registration_key VARCHAR(40),
     "modelYear" INTEGER NOT NULL,
     price INTEGER NOT NULL,
     owner_id INTEGER NOT NULL,
@@ -37,6 +38,55 @@ CREATE TABLE IF NOT EXISTS car (
 -- Создаем индекс для быстрого поиска по owner_id
 CREATE INDEX IF NOT EXISTS ix_car_owner_id ON car(owner_id);
 
+-- Нормализованный номер (верхний регистр, без пробелов и дефисов): уникален, поиск /cars/by-registration
+CREATE UNIQUE INDEX IF NOT EXISTS ix_car_registration_key ON car(registration_key);
+
+-- Таблица фоновых задач (бэкапы, импорт, удаление больших владельцев)
+CREATE TABLE IF NOT EXISTS jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    status VARCHAR(20) DEFAULT 'queued' NOT NULL,
+    progress DOUBLE PRECISION DEFAULT 0 NOT NULL,
+    message VARCHAR(255),
+    params JSON,
+    result JSON,
+    error TEXT,
+    created_by VARCHAR(50),
+    created_at TIMESTAMP DEFAULT now() NOT NULL,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    -- Воркер-владелец задачи и его пульс: задачи пропавшего воркера подхватывают другие
+    owner VARCHAR(100),
+    heartbeat_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_jobs_kind ON jobs(kind);
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs(status);
+
+-- Системные настройки (/settings) и счетчик их версий для кэша воркеров
+CREATE TABLE IF NOT EXISTS system_settings (
+    key VARCHAR(100) PRIMARY KEY,
+    value JSON,
+    updated_by VARCHAR(50),
+    updated_at TIMESTAMP DEFAULT now() NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS settings_version (
+    id INTEGER PRIMARY KEY,
+    version INTEGER DEFAULT 0 NOT NULL
+);
+
+-- Журнал изменений car/owner для /sync/changes (версии выдаются в порядке COMMIT)
+CREATE TABLE IF NOT EXISTS change_log (
+    version BIGSERIAL PRIMARY KEY,
+    entity VARCHAR(20) NOT NULL,
+    entity_id BIGINT,
+    action VARCHAR(10) NOT NULL,
+    changed_at TIMESTAMP DEFAULT now() NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_change_log_entity ON change_log(entity, entity_id, version);
+
 -- ============================================
 -- Опционально: Вставка тестовых данных
 -- ============================================
@@ -51,20 +101,20 @@ SELECT 'Mary', 'Robinson'
 WHERE NOT EXISTS (SELECT 1 FROM owner WHERE firstname = 'Mary' AND lastname = 'Robinson');
 
 -- Вставляем тестовые автомобили (только если таблица пустая)
-INSERT INTO car (brand, model, color, "registrationNumber", "modelYear", price, owner_id)
-SELECT 'Ford', 'Mustang', 'Red', 'ADF-1121', 2023, 59000, 
+INSERT INTO car (brand, model, color, "registrationNumber", registration_key, "modelYear", price, owner_id)
+SELECT 'Ford', 'Mustang', 'Red', 'ADF-1121', 'ADF1121', 2023, 59000, 
        (SELECT ownerid FROM owner WHERE firstname = 'John' AND lastname = 'Johnson' LIMIT 1)
-WHERE NOT EXISTS (SELECT 1 FROM car WHERE "registrationNumber" = 'ADF-1121');
+WHERE NOT EXISTS (SELECT 1 FROM car WHERE registration_key = 'ADF1121');
 
-INSERT INTO car (brand, model, color, "registrationNumber", "modelYear", price, owner_id)
-SELECT 'Nissan', 'Leaf', 'White', 'SSJ-3002', 2020, 29000,
+INSERT INTO car (brand, model, color, "registrationNumber", registration_key, "modelYear", price, owner_id)
+SELECT 'Nissan', 'Leaf', 'White', 'SSJ-3002', 'SSJ3002', 2020, 29000,
        (SELECT ownerid FROM owner WHERE firstname = 'Mary' AND lastname = 'Robinson' LIMIT 1)
-WHERE NOT EXISTS (SELECT 1 FROM car WHERE "registrationNumber" = 'SSJ-3002');
+WHERE NOT EXISTS (SELECT 1 FROM car WHERE registration_key = 'SSJ3002');
 
-INSERT INTO car (brand, model, color, "registrationNumber", "modelYear", price, owner_id)
-SELECT 'Toyota', 'Prius', 'Silver', 'KKO-0212', 2022, 39000,
+INSERT INTO car (brand, model, color, "registrationNumber", registration_key, "modelYear", price, owner_id)
+SELECT 'Toyota', 'Prius', 'Silver', 'KKO-0212', 'KKO0212', 2022, 39000,
        (SELECT ownerid FROM owner WHERE firstname = 'Mary' AND lastname = 'Robinson' LIMIT 1)
-WHERE NOT EXISTS (SELECT 1 FROM car WHERE "registrationNumber" = 'KKO-0212');
+WHERE NOT EXISTS (SELECT 1 FROM car WHERE registration_key = 'KKO0212');
 
 -- ============================================
 -- Проверка созданных таблиц
@@ -86,7 +136,7 @@ SELECT
     column_default
 FROM information_schema.columns
 WHERE table_schema = 'public'
-  AND table_name IN ('app_users', 'owner', 'car')
+  AND table_name IN ('app_users', 'owner', 'car', 'jobs')
 ORDER BY table_name, ordinal_position;
 
 
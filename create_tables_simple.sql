@@ -27,6 +27,7 @@ CREATE TABLE IF NOT EXISTS car (
     model VARCHAR(100) NOT NULL,
     color VARCHAR(40) NOT NULL,
     "registrationNumber" VARCHAR(40) NOT NULL,
+    registration_key VARCHAR(40),
     "modelYear" INTEGER NOT NULL,
     price INTEGER NOT NULL,
     owner_id INTEGER NOT NULL,
@@ -34,5 +35,38 @@ CREATE TABLE IF NOT EXISTS car (
 );
 
 CREATE INDEX IF NOT EXISTS ix_car_owner_id ON car(owner_id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_car_registration_key ON car(registration_key);
+
+-- 4. Таблица фоновых задач (бэкапы, импорт, удаление больших владельцев)
+CREATE TABLE IF NOT EXISTS jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    status VARCHAR(20) DEFAULT 'queued' NOT NULL,
+    progress DOUBLE PRECISION DEFAULT 0 NOT NULL,
+    message VARCHAR(255),
+    params JSON,
+    result JSON,
+    error TEXT,
+    created_by VARCHAR(50),
+    created_at TIMESTAMP DEFAULT now() NOT NULL,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_jobs_kind ON jobs(kind);
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs(status);
+
+-- Системные настройки (/settings) и счетчик их версий для кэша воркеров
+CREATE TABLE IF NOT EXISTS system_settings (
+    key VARCHAR(100) PRIMARY KEY,
+    value JSON,
+    updated_by VARCHAR(50),
+    updated_at TIMESTAMP DEFAULT now() NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS settings_version (
+    id INTEGER PRIMARY KEY,
+    version INTEGER DEFAULT 0 NOT NULL
+);
 
 
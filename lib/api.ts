@@ -5,6 +5,9 @@ import {
   CarResponse,
   CarWithOwner,
   CarQuery,
+  CarFacets,
+  ChangeEvent,
+  PlateLookupResult,
   OwnerCreate,
   OwnerUpdate,
   OwnerResponse,
@@ -14,11 +17,29 @@ import {
   CarStatistics,
   OwnerStatistics,
   UserResponse,
+  Page,
+  JobAccepted,
+  JobResponse,
+  LogFilters,
+  LogsPage,
+  SlowQueriesReport,
+  SyncPage,
+  PriceDistribution,
+  PivotDimension,
+  PivotMeasure,
+  PivotTable,
 } from '@/types/api';
 import { User, LoginRequest, RegisterRequest, LoginResponse } from '@/types/auth';
 
+// Сколько после записи читать из primary - как READ_YOUR_WRITES_SECONDS на сервере.
+// Cookie db_primary_until между Vercel и Railway не доходит (cross-site, SameSite=Lax),
+// поэтому клиент сам шлет X-Read-Primary: 1 в этом окне.
+const READ_YOUR_WRITES_MS = Number(process.env.NEXT_PUBLIC_READ_YOUR_WRITES_SECONDS ?? '5') * 1000;
+const WRITE_METHODS = ['post', 'put', 'patch', 'delete'];
+
 class ApiClient {
   private client: AxiosInstance;
+  private primaryUntil = 0;
 
   constructor() {
     // Use NEXT_PUBLIC_API_URL for production, fallback to localhost for development
@@ -43,6 +64,9 @@ class ApiClient {
     this.client.interceptors.request.use(
       (config) => {
         console.log(`🚀 API Request: ${config.method?.toUpperCase()} ${config.url}`);
+        if (Date.now() < this.primaryUntil) {
+          config.headers['X-Read-Primary'] = '1';
+        }
         return config;
       },
       (error) => {
@@ -55,15 +79,26 @@ class ApiClient {
     this.client.interceptors.response.use(
       (response) => {
         console.log(`✅ API Response: ${response.status} ${response.config.url}`);
+        this.rememberWrite(response.config.method);
         return response;
       },
       (error) => {
         console.error('❌ Response Error:', error.response?.data || error.message);
+        // Ответ с ошибкой не гарантирует, что записи не было
+        if (error.response) {
+          this.rememberWrite(error.config?.method);
+        }
         return Promise.reject(error);
       }
     );
   }
 
+  private rememberWrite(method?: string) {
+    if (READ_YOUR_WRITES_MS > 0 && method && WRITE_METHODS.includes(method.toLowerCase())) {
+      this.primaryUntil = Date.now() + READ_YOUR_WRITES_MS;
+    }
+  }
+
   // ==================== BASIC ENDPOINTS ====================
 
   async getHello(): Promise<string> {
@@ -85,6 +120,13 @@ class ApiClient {
     return response.data;
   }
 
+  async getCarsPage(limit: number = 100, cursor?: string | null): Promise<Page<CarWithOwner>> {
+    const response = await this.client.get('/cars', {
+      params: { limit, envelope: true, cursor: cursor || undefined },
+    });
+    return response.data;
+  }
+
   async getCar(id: number): Promise<CarWithOwner> {
     const response = await this.client.get(`/cars/${id}`);
     return response.data;
@@ -144,6 +186,59 @@ class ApiClient {
     return response.data;
   }
 
+  async searchCarsPage(query: CarQuery, cursor?: string | null): Promise<Page<CarWithOwner>> {
+    const response = await this.client.post('/cars/search', query, {
+      params: { envelope: true, cursor: cursor || undefined },
+    });
+    return response.data;
+  }
+
+  async getCarByRegistration(plate: string): Promise<CarWithOwner> {
+    const response = await this.client.get(`/cars/by-registration/${encodeURIComponent(plate)}`);
+    return response.data;
+  }
+
+  async findCarsByRegistration(plates: string[]): Promise<PlateLookupResult> {
+    const response = await this.client.post('/cars/by-registration', { plates });
+    return response.data;
+  }
+
+  async autocomplete(
+    field: 'brand' | 'model' | 'color' | 'owner',
+    prefix: string,
+    limit = 10
+  ): Promise<{ field: string; prefix: string; items: { value: string; count: number }[] }> {
+    const response = await this.client.get('/autocomplete', { params: { field, prefix, limit } });
+    return response.data;
+  }
+
+  async getCarFacets(query: CarQuery = {}): Promise<CarFacets> {
+    const response = await this.client.post('/cars/facets', query);
+    return response.data;
+  }
+
+  // EventSource не умеет заголовки - токен передается в ?access_token=.
+  // Переподключение с Last-Event-ID браузер делает сам; onReset - данные нужно перечитать
+  subscribeChanges(
+    token: string,
+    onChange: (event: ChangeEvent) => void,
+    onReset: () => void,
+    entities: ('car' | 'owner')[] = ['car', 'owner']
+  ): EventSource {
+    const url = new URL('/changes/stream', this.client.defaults.baseURL);
+    url.searchParams.set('access_token', token);
+    url.searchParams.set('entities', entities.join(','));
+    const source = new EventSource(url.toString());
+    const actions = ['created', 'updated', 'deleted', 'imported'];
+    for (const entity of entities) {
+      for (const action of actions) {
+        source.addEventListener(`${entity}.${action}`, (e) => onChange(JSON.parse((e as MessageEvent).data)));
+      }
+    }
+    source.addEventListener('reset', () => onReset());
+    return source;
+  }
+
   // ==================== OWNER ENDPOINTS ====================
 
   async getOwners(skip: number = 0, limit: number = 100): Promise<OwnerResponse[]> {
@@ -153,6 +248,13 @@ class ApiClient {
     return response.data;
   }
 
+  async getOwnersPage(limit: number = 100, cursor?: string | null): Promise<Page<OwnerResponse>> {
+    const response = await this.client.get('/owners', {
+      params: { limit, envelope: true, cursor: cursor || undefined },
+    });
+    return response.data;
+  }
+
   async getOwner(id: number): Promise<OwnerResponse> {
     const response = await this.client.get(`/owners/${id}`);
     return response.data;
@@ -168,7 +270,8 @@ class ApiClient {
     return response.data;
   }
 
-  async deleteOwner(id: number): Promise<MessageResponse> {
+  // Владельцы большого парка удаляются фоновой задачей (202 + job_id)
+  async deleteOwner(id: number): Promise<MessageResponse | JobAccepted> {
     const response = await this.client.delete(`/owners/${id}`);
     return response.data;
   }
@@ -190,6 +293,13 @@ class ApiClient {
     return response.data;
   }
 
+  async searchOwnersPage(query: OwnerQuery, cursor?: string | null): Promise<Page<OwnerResponse>> {
+    const response = await this.client.post('/owners/search', query, {
+      params: { envelope: true, cursor: cursor || undefined },
+    });
+    return response.data;
+  }
+
   // ==================== AUTHENTICATION ENDPOINTS ====================
 
   async login(username: string, password: string): Promise<LoginResponse> {
@@ -275,6 +385,31 @@ class ApiClient {
     return response.data;
   }
 
+  async getPriceDistribution(params: {
+    group_by?: 'brand' | 'modelYear' | 'brand,modelYear' | 'none';
+    brand?: string;
+    modelYear?: number;
+    quantiles?: number[];
+    limit?: number;
+  } = {}): Promise<PriceDistribution> {
+    const response = await this.client.get('/analytics/price-distribution', {
+      params: { ...params, quantiles: params.quantiles?.join(',') },
+    });
+    return response.data;
+  }
+
+  async getPivot(
+    rows: PivotDimension[],
+    cols: PivotDimension[] = [],
+    measures: PivotMeasure[] = ['count'],
+    limit = 1000,
+  ): Promise<PivotTable> {
+    const response = await this.client.get('/analytics/pivot', {
+      params: { rows: rows.join(','), cols: cols.join(','), measure: measures.join(','), limit },
+    });
+    return response.data;
+  }
+
   // ==================== SYSTEM SETTINGS ENDPOINTS ====================
 
   async getSystemSettings(): Promise<any> {
@@ -287,17 +422,67 @@ class ApiClient {
     return response.data;
   }
 
-  async createSystemBackup(): Promise<any> {
+  async createSystemBackup(): Promise<JobAccepted & { backup_id: string }> {
     const response = await this.client.get('/settings/backup');
     return response.data;
   }
 
-  async getSystemLogs(limit = 100): Promise<any> {
+  async getSystemBackups(): Promise<any[]> {
+    const response = await this.client.get('/settings/backups');
+    return response.data;
+  }
+
+  async restoreSystemBackup(backupId: string): Promise<JobAccepted> {
+    const response = await this.client.post(`/settings/restore/${encodeURIComponent(backupId)}`);
+    return response.data;
+  }
+
+  async importCars(cars: CarCreate[]): Promise<JobAccepted> {
+    const response = await this.client.post('/cars/import', cars);
+    return response.data;
+  }
+
+  async rebuildAnalytics(): Promise<JobAccepted> {
+    const response = await this.client.post('/analytics/rebuild');
+    return response.data;
+  }
+
+  async getJob(jobId: string): Promise<JobResponse> {
+    const response = await this.client.get(`/jobs/${jobId}`);
+    return response.data;
+  }
+
+  async getSystemLogs(limit = 100, filters: LogFilters = {}): Promise<LogsPage> {
     const response = await this.client.get('/settings/logs', {
-      params: { limit },
+      params: { limit, ...filters },
+    });
+    return response.data;
+  }
+
+  async getSyncChanges(since: number, limit = 500, entities?: ('car' | 'owner')[]): Promise<SyncPage> {
+    const response = await this.client.get('/sync/changes', {
+      params: { since, limit, entities: entities?.join(',') },
     });
     return response.data;
   }
+
+  async compactSyncLog(): Promise<JobAccepted> {
+    const response = await this.client.post('/sync/compact');
+    return response.data;
+  }
+
+  async getSlowQueries(
+    limit = 20,
+    sort: 'total_ms' | 'mean_ms' | 'max_ms' | 'count' = 'total_ms'
+  ): Promise<SlowQueriesReport> {
+    const response = await this.client.get('/settings/slow-queries', { params: { limit, sort } });
+    return response.data;
+  }
+
+  async resetSlowQueries(): Promise<{ message: string }> {
+    const response = await this.client.delete('/settings/slow-queries');
+    return response.data;
+  }
 }
 
 // Create singleton instance
@@ -9,6 +9,7 @@ if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
         host=host,
-        port=port
+        port=port,
+        access_log=False,  # access-лог с выборкой пишет core/logs.py
     )
 
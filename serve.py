@@ -0,0 +1,95 @@
+"""
+Production-запуск: несколько воркеров (uvicorn --workers или gunicorn + UvicornWorker),
+uvloop + httptools, настройка keep-alive, backlog и плавный перезапуск.
+
+Использование:
+    python serve.py                     # воркеров = число доступных ядер
+    WEB_CONCURRENCY=4 python serve.py
+    SERVER=gunicorn python serve.py     # если установлен gunicorn
+
+Перезапуск воркеров без остановки сокета: kill -HUP <pid мастера>.
+Пул соединений каждого воркера делится из DB_MAX_CONNECTIONS (core/db.py).
+"""
+
+import importlib.util
+import os
+import shutil
+import sys
+
+APP_MODULE = os.getenv("APP_MODULE", "app.main:app")
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# auto - gunicorn, если установлен, иначе менеджер процессов uvicorn
+SERVER = os.getenv("SERVER", "auto").lower()
+# Секунды простоя keep-alive соединения; за балансировщиком - больше его idle timeout
+KEEP_ALIVE = int(os.getenv("KEEP_ALIVE", "5"))
+# Очередь входящих соединений в listen() (ограничена net.core.somaxconn)
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+# Сколько секунд воркер дорабатывает начатые запросы при остановке/перезапуске
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Перезапуск воркера после N запросов (0 - никогда), страховка от утечек памяти
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "0"))
+
+def cpu_count() -> int:
+    """Ядра, доступные процессу (учитывает taskset/cgroup cpuset)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+def worker_count() -> int:
+    return int(os.getenv("WEB_CONCURRENCY", "0")) or cpu_count()
+
+def run_gunicorn(workers: int) -> None:
+    args = [
+        "gunicorn", APP_MODULE,
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+        "--workers", str(workers),
+        "--bind", f"{HOST}:{PORT}",
+        "--backlog", str(BACKLOG),
+        "--keep-alive", str(KEEP_ALIVE),
+        "--graceful-timeout", str(GRACEFUL_TIMEOUT),
+        "--timeout", str(GRACEFUL_TIMEOUT * 2),
+    ]
+    if MAX_REQUESTS:
+        args += ["--max-requests", str(MAX_REQUESTS), "--max-requests-jitter", str(max(1, MAX_REQUESTS // 10))]
+    # Без --preload: каждый воркер сам создает engine и пул после fork
+    os.execvp(shutil.which("gunicorn") or "gunicorn", args)
+
+def run_uvicorn(workers: int) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        APP_MODULE,
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop="uvloop" if has_module("uvloop") else "asyncio",
+        http="httptools" if has_module("httptools") else "h11",
+        backlog=BACKLOG,
+        timeout_keep_alive=KEEP_ALIVE,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        limit_max_requests=MAX_REQUESTS or None,
+        access_log=False,  # access-лог с выборкой пишет core/logs.py
+    )
+
+def main() -> None:
+    workers = worker_count()
+    # Воркеры читают это значение в core/db.pool_limits() при импорте
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    use_gunicorn = SERVER == "gunicorn" or (SERVER == "auto" and has_module("gunicorn"))
+    print(
+        f"Starting {APP_MODULE} on {HOST}:{PORT}: {workers} workers via {'gunicorn' if use_gunicorn else 'uvicorn'}, "
+        f"uvloop={has_module('uvloop')}, httptools={has_module('httptools')}, "
+        f"DB_MAX_CONNECTIONS={os.getenv('DB_MAX_CONNECTIONS', 'not set')}",
+        file=sys.stderr, flush=True,
+    )
+    if use_gunicorn:
+        run_gunicorn(workers)
+    else:
+        run_uvicorn(workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+-- ============================================
+-- Миграция: car.owner_id -> owner.ownerid ON DELETE CASCADE
+-- Для PostgreSQL / Supabase (то же делает python -m core.migrations)
+-- Удаление владельца становится одним DELETE: автомобили удаляет БД
+-- ============================================
+
+DO $$
+DECLARE
+    fk_name text;
+BEGIN
+    -- Снимаем существующий внешний ключ car.owner_id без каскада (имя могло быть любым)
+    FOR fk_name IN
+        SELECT con.conname
+        FROM pg_constraint con
+        JOIN pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = ANY (con.conkey)
+        WHERE con.conrelid = 'car'::regclass
+          AND con.contype = 'f'
+          AND att.attname = 'owner_id'
+          AND con.confdeltype <> 'c'
+    LOOP
+        EXECUTE format('ALTER TABLE car DROP CONSTRAINT %I', fk_name);
+    END LOOP;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'car'::regclass AND contype = 'f' AND confdeltype = 'c'
+    ) THEN
+        -- NOT VALID + VALIDATE: проверка существующих строк без долгой блокировки записи
+        ALTER TABLE car ADD CONSTRAINT car_owner_id_fkey
+            FOREIGN KEY (owner_id) REFERENCES owner(ownerid) ON DELETE CASCADE NOT VALID;
+        ALTER TABLE car VALIDATE CONSTRAINT car_owner_id_fkey;
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS ix_car_owner_id ON car(owner_id);
@@ -13,6 +13,6 @@ echo "DB_URL: ${DB_URL:+SET}"
 echo "PORT: $PORT"
 echo "=========================================="
 
-# Запускаем uvicorn
-exec uvicorn app.main:app --host 0.0.0.0 --port "$PORT" --log-level info
+# Запускаем воркеры (число - WEB_CONCURRENCY или по ядрам, см. serve.py)
+exec python serve.py
 
@@ -0,0 +1,79 @@
+"""
+Удаление владельца: постоянное число SQL-операторов независимо от размера парка.
+
+Та же проверка, что benchmarks/cascade_delete.py, но на маленьких данных -
+чтобы лишний запрос в OwnerCRUD.delete (или в хуках коммита: лента
+изменений, журнал синхронизации) ронял CI. Запуск: python -m pytest -q
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/owner_delete.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, func, insert, select  # noqa: E402
+
+from app.crud import OwnerCRUD  # noqa: E402
+from app.db import SessionLocal, engine  # noqa: E402
+from app.models import Base, Car, ChangeLog, Owner  # noqa: E402
+from core.migrations import run_migrations  # noqa: E402
+
+# Имя владельца, значения автомобилей для индексов, надгробия автомобилей,
+# DELETE owner (автомобили удаляет каскад), строка журнала для владельца
+MAX_STATEMENTS = 5
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    yield
+    engine.dispose()
+
+def populate(cars: int) -> int:
+    with SessionLocal() as db:
+        owner = Owner(firstname="Fleet", lastname="Owner")
+        db.add(owner)
+        db.flush()
+        db.execute(insert(Car), [
+            {"brand": "B", "model": f"M{i % 5}", "color": "Red", "registrationNumber": f"T-{owner.ownerid}-{i}",
+             "modelYear": 2020, "price": 1000 + i, "owner_id": owner.ownerid}
+            for i in range(cars)
+        ])
+        db.commit()
+        return owner.ownerid
+
+def count_statements(owner_id: int) -> list:
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        with SessionLocal() as db:
+            assert OwnerCRUD.delete(db, owner_id)
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+    return statements
+
+def scalar(stmt) -> int:
+    with SessionLocal() as db:
+        return db.execute(stmt).scalar_one()
+
+def test_owner_delete_statement_count_does_not_depend_on_fleet_size():
+    small = count_statements(populate(1))
+    owner_id = populate(200)
+    tombstones = scalar(select(func.count()).select_from(ChangeLog).where(ChangeLog.action == "delete", ChangeLog.entity == "car"))
+    large = count_statements(owner_id)
+
+    assert len(large) == len(small), "\n".join(large)
+    assert len(large) <= MAX_STATEMENTS, "\n".join(large)
+    assert sum(s.lstrip().upper().startswith("DELETE") for s in large) == 1
+    assert scalar(select(func.count()).select_from(Car).where(Car.owner_id == owner_id)) == 0
+    assert scalar(
+        select(func.count()).select_from(ChangeLog).where(ChangeLog.action == "delete", ChangeLog.entity == "car")
+    ) - tombstones == 200
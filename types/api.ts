@@ -97,6 +97,13 @@ export interface OwnerQuery {
 
 // ==================== RESPONSE TYPES ====================
 
+export interface Page<T> {
+  items: T[];
+  next_cursor: string | null;
+  total: number;
+  total_is_estimate: boolean;
+}
+
 export interface StatusResponse {
   status: string;
   app: string;
@@ -109,6 +116,161 @@ export interface MessageResponse {
   success: boolean;
 }
 
+export interface JobAccepted extends MessageResponse {
+  job_id: string;
+}
+
+export interface JobResponse {
+  id: string;
+  kind: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  progress: number;
+  message?: string;
+  result?: Record<string, any>;
+  error?: string;
+  created_by?: string;
+  created_at: string;
+  started_at?: string;
+  finished_at?: string;
+}
+
+export interface LogEntry {
+  id: number;
+  timestamp: string;
+  level: string;
+  logger: string;
+  message: string;
+  request_id?: string;
+  method?: string;
+  route?: string;
+  status?: number;
+  duration_ms?: number;
+}
+
+export interface LogFilters {
+  level?: string;
+  route?: string;
+  request_id?: string;
+  since?: string;
+  until?: string;
+  min_duration_ms?: number;
+  cursor?: string;
+}
+
+export interface LogsPage {
+  message: string;
+  logs: LogEntry[];
+  next_cursor: string;
+  truncated: boolean;
+  buffer_size: number;
+  dropped: number;
+}
+
+export interface PlateLookupResult {
+  found: Record<string, CarWithOwner>;
+  missing: string[];
+}
+
+export interface FacetCount {
+  value: string | number | null;
+  count: number;
+}
+
+export interface CarFacets {
+  total: number;
+  brand: FacetCount[];
+  color: FacetCount[];
+  modelYear: FacetCount[];
+  price: { min: number; max: number; count: number }[];
+  price_bucket: number;
+  cached: boolean;
+}
+
+export interface PriceDistributionGroup {
+  brand?: string;
+  modelYear?: number;
+  count: number;
+  mean: number | null;
+  min: number | null;
+  max: number | null;
+  quantiles: Record<string, number | null>;
+  histogram: { min: number; max: number; count: number }[];
+  stale: number;
+}
+
+export interface PriceDistribution {
+  group_by: ('brand' | 'modelYear')[];
+  bucket: number;
+  compression: number;
+  built_at: string | null;
+  version: number | null;
+  groups: PriceDistributionGroup[];
+}
+
+export type PivotDimension = 'brand' | 'model' | 'color' | 'modelYear' | 'owner';
+export type PivotMeasure = 'count' | 'sum' | 'avg' | 'min' | 'max';
+
+export interface PivotTable {
+  rows: PivotDimension[];
+  cols: PivotDimension[];
+  measures: PivotMeasure[];
+  row_keys: (string | number | null)[][];
+  col_keys: (string | number | null)[][];
+  cells: Partial<Record<PivotMeasure, (number | null)[][]>>;
+  truncated: boolean;
+  snapshot: { engine: 'arrow' | 'python'; rows: number; version: number; built_at: string; build_ms: number };
+}
+
+export interface ChangeEvent {
+  // Версия журнала изменений (как SyncChange.version): годится для Last-Event-ID на любом воркере
+  id: string;
+  entity: 'car' | 'owner';
+  action: 'created' | 'updated' | 'deleted' | 'imported';
+  entity_id: number | null;
+  data: Record<string, unknown> | null;
+  ts: string;
+}
+
+export interface SyncChange {
+  entity: 'car' | 'owner';
+  id: number;
+  version: number;
+  op: 'upsert' | 'delete';
+  data: Record<string, unknown> | null;
+}
+
+export interface SyncPage {
+  changes: SyncChange[];
+  next_since: number;
+  has_more: boolean;
+  reset: boolean;
+}
+
+export interface SlowQuery {
+  fingerprint: string;
+  sql: string;
+  count: number;
+  total_ms: number;
+  mean_ms: number;
+  max_ms: number;
+  last_ms: number;
+  first_seen: string;
+  last_seen: string;
+  routes: Record<string, number>;
+  callers: Record<string, number>;
+  param_shapes: Record<string, number>;
+  plan: string[] | null;
+  plan_at: string | null;
+  plan_error: string | null;
+}
+
+export interface SlowQueriesReport {
+  message: string;
+  threshold_ms: number;
+  fingerprints: number;
+  queries: SlowQuery[];
+}
+
 export interface CarStatistics {
   total_cars: number;
   total_owners: number;